@@ -1,10 +1,21 @@
 #importing libraries and setting up API
 from openai import OpenAI
+import argparse
+import hashlib
 import pandas as pd
 import json
 import os
+import sys
+from collections import Counter
 from tqdm import tqdm
 
+# Shared helpers live in the "Shared code" folder at the top of the repository
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Shared code'))
+from paper_store import PaperStore
+from budget import Budget, prior
+import rate_limit
+import tracing
+
 
 ### Code to get Oscar's key
 client = OpenAI()
@@ -12,8 +23,32 @@ client.api_key = os.getenv("OPENAI_API_KEY")
 
 #Importing the CSV and adding the titles and abstracts to lists to subsequently use in the API function
 
+parser = argparse.ArgumentParser(description="Categorize papers with the OpenAI API.")
+parser.add_argument('--input', default='all_papers_with_abstracts.csv')
+parser.add_argument('--from-store', action='store_true',
+                    help="Read the papers from the shared paper store (the 'categorize' view) instead of --input")
+parser.add_argument('--output', default='final_output.csv')
+parser.add_argument('--budget-tokens', type=int, help="Stop after this many tokens; run again to continue")
+parser.add_argument('--budget-dollars', type=float, help="Stop after spending this much; run again to continue")
+parser.add_argument('--restart', action='store_true', help="Analyze every paper again, ignoring the results in --output")
+parser.add_argument('--samples', type=int, default=1,
+                    help="Most answers to draw per paper; the category is the one most of them agree on")
+parser.add_argument('--agreement', type=float, default=0.75,
+                    help="With --samples above 1, stop drawing once at least two answers are in and this "
+                         "share of them agree")
+args = parser.parse_args()
+budget = Budget(tokens=args.budget_tokens, dollars=args.budget_dollars)
+
+# Results are saved to the shared paper store as they come in, under the same key collecting_abstracts.py
+# used: the arXiv ID where the company page linked to arXiv, otherwise the company URL
+store = PaperStore()
+
 # Load the CSV file. The all_papers file includes some more papers added manually.
-df = pd.read_csv('all_papers_with_abstracts.csv')
+# With --from-store, the papers come from the store instead, as the earlier stages left them.
+if args.from_store:
+    df = pd.DataFrame(store.rows('categorize'), columns=['Company', 'Title', 'Date', 'URL', 'Safety_category', 'Abstract'])
+else:
+    df = pd.read_csv(args.input)
 df['Abstract'] = df['Abstract'].fillna("Abstract not found")  # Replace NULL values
 
 
@@ -32,26 +67,32 @@ with open('prompt.txt', 'r', encoding='utf-8') as file:
 
 #Function that is designed to take the content list from above
 #The function should output a judgement on what the focus of each paper is and an explanation for that
+@tracing.traced()
 def analyze_paper(item,prompt,version):
-    response = client.chat.completions.create(
-      model=version,
-      messages=[
-        {
-          "role": "system",
-          "content": prompt
-        },
-        {
-          "role": "user",
-          "content": item
-        }
-      ],
-      temperature=1,
-      max_tokens=256,
-      top_p=1,
-      frequency_penalty=0,
-      presence_penalty=0,
-    )
+    # Waits for room under the limits shared with any other process using the OpenAI API
+    with rate_limit.limited('openai', rate_limit.estimate_tokens(prompt, item, max_tokens=256)) as usage:
+        response = client.chat.completions.create(
+          model=version,
+          messages=[
+            {
+              "role": "system",
+              "content": prompt
+            },
+            {
+              "role": "user",
+              "content": item
+            }
+          ],
+          temperature=1,
+          max_tokens=256,
+          top_p=1,
+          frequency_penalty=0,
+          presence_penalty=0,
+        )
+        usage['tokens'] = response.usage.total_tokens
     
+    tracing.annotate(input_tokens=response.usage.prompt_tokens, output_tokens=response.usage.completion_tokens)
+    budget.record(version, response.usage.prompt_tokens, response.usage.completion_tokens)
     APIoutput = response.choices[0].message.content
     response_dict = json.loads(APIoutput)
     focus = response_dict['categorization']
@@ -59,20 +100,145 @@ def analyze_paper(item,prompt,version):
     
     return(focus, explanation)
 
-#Runs the function and adds the two outputs to separate lists
-focuses = []
-explanations = []
-for item in tqdm(content, desc="Analyzing papers"):
-    try:
-        value1, value2 = analyze_paper(item, prompt, "gpt-4o-mini")
-    except Exception as e:
-        print(f"Error processing {item[:30]}...: {e}")
-        value1, value2 = "error", "error"
-    focuses.append(value1)
-    explanations.append(value2)
-    
-df["GPT4o_Safety_focus"] = focuses
-df["GPT4o_Explanation"] = explanations
+def settled(votes, remaining, agreement):
+    """Whether the votes so far are enough: the leader has the agreement share, or can't be caught any more."""
+    counts = [count for _, count in votes.most_common(2)] + [0, 0]
+    if counts[0] - counts[1] > remaining:
+        return True
+    total = sum(votes.values())
+    return total >= 2 and counts[0] >= agreement * total
+
+def consensus(item, prompt, version, max_samples, agreement):
+    """
+    Asks for the category up to max_samples times, one answer at a time, and stops as soon as they agree.
+
+    Papers that are clearly one thing settle after two answers; only contested papers get the rest.
+
+    Parameters:
+        item (str): Title and abstract.
+        prompt (str): System prompt.
+        version (str): Model.
+        max_samples (int): Most answers to draw. With 1 this is the same as a single analyze_paper call.
+        agreement (float): Share of the answers the leading category needs to stop early.
+
+    Returns:
+        tuple: (category, explanation of the first answer with that category, Counter of votes, calls made).
+            Ties go to the category that came up first.
+    """
+    votes = Counter()
+    explanations = {}
+    error = None
+    drawn = 0
+    while drawn < max_samples:
+        drawn += 1
+        try:
+            focus, explanation = analyze_paper(item, prompt, version)
+        except Exception as e:
+            error = e
+            continue
+        votes[focus] += 1
+        explanations.setdefault(focus, explanation)
+        if settled(votes, max_samples - drawn, agreement):
+            break
+        if budget.exhausted():
+            break  # Go with the votes we have rather than leave the paper half done
+    if not votes:
+        raise error
+    focus = votes.most_common(1)[0][0]
+    return focus, explanations[focus], votes, drawn
+
+def label(category):
+    # The human categories sometimes have trailing spaces ("Model organisms of misalignment ")
+    return str(category).strip().lower()
+
+def report_consensus(df, calls, analyzed, max_samples):
+    """Prints what the early stopping saved compared with always drawing max_samples, and agreement with the human labels."""
+    print(f"{calls} calls for {analyzed} papers ({calls / max(analyzed, 1):.2f} per paper); "
+          f"always drawing {max_samples} would have taken {analyzed * max_samples}.")
+    done = df[df['GPT4o_Votes'].notna()]
+    if done.empty:
+        return
+    votes = done['GPT4o_Votes'].map(json.loads)
+    unanimous = votes.map(len) == 1
+    print(f"Unanimous: {unanimous.sum()} of {len(done)} papers. Votes per paper:")
+    print(votes.map(lambda v: sum(v.values())).value_counts().sort_index().to_string())
+    if 'Safety_category' not in done.columns:
+        return
+    human = done['Safety_category'].notna() & (done['Safety_category'].astype(str).str.strip() != '')
+    if not human.any():
+        return
+    matches = done['GPT4o_Safety_focus'].map(label) == done['Safety_category'].map(label)
+    print(f"Agreement with Safety_category: {matches[human].mean():.1%} of {human.sum()} papers "
+          f"({matches[human & unanimous].mean():.1%} when unanimous, "
+          f"{matches[human & ~unanimous].mean():.1%} when contested).")
+
+#Runs the function and adds the two outputs to the dataframe
+#Each result is also saved to the shared paper store straight away
+paper_columns = [column for column in ['Company', 'Title', 'Date', 'URL', 'Safety_category', 'Abstract'] if column in df.columns]
+
+# Keep the results of an earlier run that stopped at its budget, and only analyze the rest
+df["GPT4o_Safety_focus"] = None
+df["GPT4o_Explanation"] = None
+consensus_mode = args.samples > 1
+if consensus_mode:
+    df["GPT4o_Votes"] = None
+# What each answer was given, so that editing the prompt or an abstract means asking again
+df["GPT4o_Input_hash"] = [hashlib.sha256((prompt + '\0' + item).encode('utf-8')).hexdigest()[:16] for item in content]
+key = 'URL' if 'URL' in df.columns else 'Title'
+if os.path.exists(args.output) and not args.restart:
+    previous = pd.read_csv(args.output)
+    if 'GPT4o_Safety_focus' in previous.columns and key in previous.columns:
+        previous = previous[previous['GPT4o_Safety_focus'].notna() & (previous['GPT4o_Safety_focus'] != "error")]
+        previous = previous.drop_duplicates(subset=[key]).set_index(key)
+        # Only reuse answers to the same prompt, title and abstract. Files from before the hash was kept have
+        # no way to tell, so everything in them is asked again.
+        if 'GPT4o_Input_hash' in previous.columns:
+            same_input = df[key].map(previous['GPT4o_Input_hash']) == df["GPT4o_Input_hash"]
+        else:
+            same_input = pd.Series(False, index=df.index)
+        stale = df[key].isin(previous.index) & ~same_input
+        if stale.any():
+            print(f"{stale.sum()} earlier answers are for a different prompt or abstract and will be redone.")
+        df["GPT4o_Safety_focus"] = df[key].map(previous['GPT4o_Safety_focus']).where(same_input)
+        df["GPT4o_Explanation"] = df[key].map(previous['GPT4o_Explanation']).where(same_input)
+        if consensus_mode and 'GPT4o_Votes' in previous.columns:
+            df["GPT4o_Votes"] = df[key].map(previous['GPT4o_Votes']).where(same_input)
+
+# Papers that look most likely to be from the companies go first, in case the budget runs out
+todo = [i for i in range(len(df)) if pd.isna(df.iloc[i]["GPT4o_Safety_focus"])]
+todo.sort(key=lambda i: -prior(df.iloc[i].to_dict()))
+print(f"{len(df) - len(todo)} papers already analyzed; {len(todo)} to go.")
+analyzed = 0
+calls = 0
+for i in tqdm(todo, desc="Analyzing papers"):
+    if budget.exhausted():
+        break
+    votes = None
+    with tracing.span('categorize_paper', paper=df.iloc[i]['Title']):
+        try:
+            value1, value2, votes, drawn = consensus(content[i], prompt, "gpt-4o-mini", args.samples, args.agreement)
+            calls += drawn
+        except Exception as e:
+            print(f"Error processing {content[i][:30]}...: {e}")
+            value1, value2 = "error", "error"
+            calls += args.samples
+    analyzed += 1
+    df.iat[i, df.columns.get_loc("GPT4o_Safety_focus")] = value1
+    df.iat[i, df.columns.get_loc("GPT4o_Explanation")] = value2
+    result = {'GPT4o_Safety_focus': value1, 'GPT4o_Explanation': value2}
+    if consensus_mode and votes is not None:
+        result['GPT4o_Votes'] = json.dumps(dict(votes))
+        df.iat[i, df.columns.get_loc("GPT4o_Votes")] = result['GPT4o_Votes']
+    row = df.iloc[i][paper_columns].to_dict()
+    store.upsert({**row, **result})
+
+if analyzed < len(todo):
+    print(f"Budget spent. {len(todo) - analyzed} papers left; run again with the same --output to continue.")
+print(budget.summary())
+if consensus_mode:
+    report_consensus(df, calls, analyzed, args.samples)
+
 df.drop("Concatenated", axis=1, inplace=True)
 
-df.to_csv('final_output.csv', index=False)
\ No newline at end of file
+df.to_csv(args.output, index=False)
+tracing.print_summary()
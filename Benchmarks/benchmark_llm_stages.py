@@ -0,0 +1,221 @@
+"""
+Offline throughput benchmark for the two LLM stages, against mock_api_server.py.
+
+For each setting it runs the real code on synthetic papers and reports papers per
+second, per-paper latency percentiles, and how many extra requests the 429s caused:
+
+    affiliation  - process_queue() from Find affiliation thread.py (download of the arXiv
+                   HTML author block, company filter, Sonnet then Haiku), in this process,
+                   for each combination of --workers (papers in progress) and --llm-max
+                   (most LLM requests in flight the AIMD controller may allow; with --fixed,
+                   exactly that many).
+    categorize   - categorizing_papers.py as a subprocess, for each --samples setting. That
+                   script analyzes one paper at a time, so its setting to compare is how
+                   many samples it draws per paper.
+
+Nothing leaves the machine: the SDKs, the arXiv pages, the rate limits, the paper store
+and the traces all point at the mock server or temporary files. Run it before a change
+and after, with the same --seed:
+    python benchmark_llm_stages.py --papers 200 --workers 16,64 --llm-max 8,32 --capacity 24
+    python benchmark_llm_stages.py --stage categorize --papers 100 --samples 1,3,5 --latency 0.3
+"""
+
+import argparse
+import contextlib
+import importlib.util
+import io
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.parse import urlparse
+
+import pandas as pd
+import requests
+from anthropic import Anthropic
+from requests.adapters import HTTPAdapter
+
+import mock_api_server
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+AFFILIATION_DIR = os.path.join(ROOT, 'Papers from arXiv', '2 Find affiliation on arXiv')
+CATEGORIZATION_DIR = os.path.join(ROOT, 'Automated categorization')
+
+# Everything the stages write goes to a temporary directory. This has to happen before the
+# shared modules are imported, as they read these when they are imported.
+WORK_DIR = tempfile.mkdtemp(prefix='llm_benchmark_')
+os.environ['RATE_LIMIT_DB'] = os.path.join(WORK_DIR, 'rate_limits.sqlite')
+os.environ['PAPER_STORE_DB'] = os.path.join(WORK_DIR, 'papers.sqlite')
+os.environ['TRACE_FILE'] = os.path.join(WORK_DIR, 'trace.jsonl')
+
+sys.path.append(os.path.join(ROOT, 'Shared code'))
+import rate_limit
+import tracing
+from aimd import AIMDController
+from budget import Budget
+from paper_store import PaperStore
+
+# High enough that the shared rate limiter doesn't hold anything back, unless --rpm/--tpm say otherwise
+UNLIMITED = 1e9
+
+TITLES = ['Scalable oversight with debate', 'Robust reward models', 'Interpretability of attention heads',
+          'Aligning language models with human feedback', 'Safe exploration in reinforcement learning']
+
+def synthetic_papers(count):
+    return [{
+        'Title': f"{TITLES[i % len(TITLES)]} ({i})",
+        'Authors': f"Author {i}, Author {i + 1}",
+        'Abstract': "We study how to make AI systems safer. " * 20,
+        'arXiv ID': f"2401.{i:05d}v1",
+        'PDF_Link': f"https://arxiv.org/pdf/2401.{i:05d}v1",
+        'Submitted': '2024-01-15',
+    } for i in range(count)]
+
+def latency_summary(durations):
+    durations = sorted(durations)
+    if not durations:
+        return [float('nan')] * 3
+    return [tracing.percentile(durations, p) for p in (50, 95, 99)]
+
+def overhead(stats, api):
+    api_stats = stats.get(api, {'requests': 0, 'throttled': 0})
+    answered = api_stats['requests'] - api_stats['throttled']
+    return api_stats['requests'], api_stats['throttled'], 100 * api_stats['throttled'] / max(answered, 1)
+
+class LocalArxiv(HTTPAdapter):
+    """Transport adapter that sends the requests for arxiv.org to the mock server instead."""
+
+    def __init__(self, base_url):
+        super().__init__()
+        self.base_url = base_url
+
+    def send(self, request, **kwargs):
+        parsed = urlparse(request.url)
+        request.url = self.base_url + parsed.path + (f"?{parsed.query}" if parsed.query else '')
+        return super().send(request, **kwargs)
+
+def load_affiliation_stage():
+    # The script's name has spaces, so it can't be imported the usual way
+    sys.path.append(AFFILIATION_DIR)
+    spec = importlib.util.spec_from_file_location(
+        'find_affiliation_thread', os.path.join(AFFILIATION_DIR, 'Find affiliation thread.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def benchmark_affiliation(server, args):
+    """Runs process_queue on synthetic papers for each setting. Returns a list of result rows."""
+    stage = load_affiliation_stage()
+    stage.client = Anthropic(base_url=server.url, api_key='mock', max_retries=0)
+    rate_limit.set_limits('anthropic', requests=args.rpm or UNLIMITED, tokens=args.tpm or UNLIMITED)
+    session = requests.Session()
+    session.mount('https://arxiv.org/', LocalArxiv(server.url))
+
+    results = []
+    for workers in args.workers:
+        for llm_max in args.llm_max:
+            stage.MAX_WORKERS = workers
+            stage.budget = Budget()
+            stage.download_controller = AIMDController('download', initial=4, maximum=32,
+                                                       is_overload=stage.download_overloaded)
+            if args.fixed:
+                stage.llm_controller = AIMDController('llm', initial=llm_max, minimum=llm_max, maximum=llm_max,
+                                                      is_overload=stage.llm_overloaded)
+            else:
+                stage.llm_controller = AIMDController('llm', initial=min(4, llm_max), maximum=llm_max,
+                                                      is_overload=stage.llm_overloaded)
+            df = stage.prepare(pd.DataFrame(synthetic_papers(args.papers)))
+            store = PaperStore(os.path.join(WORK_DIR, f"affiliation_{workers}_{llm_max}.sqlite"))
+            output = os.path.join(WORK_DIR, 'affiliation.csv')
+
+            server.reset_stats()
+            del tracing.finished_spans[:]
+            started = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):  # process_paper prints a line per paper
+                stage.process_queue(df, stage.to_process(df), session, store, output)
+            elapsed = time.perf_counter() - started
+
+            durations = [span['duration'] for span in tracing.finished_spans if span['name'] == 'process_paper']
+            requests_made, throttled, retry_overhead = overhead(server.stats, 'anthropic')
+            setting = f"workers={workers} llm_max={llm_max}" + (' fixed' if args.fixed else '')
+            results.append(['affiliation', setting, len(durations), elapsed, *latency_summary(durations),
+                            requests_made, throttled, retry_overhead])
+            print(f"  {setting}: {len(durations) / elapsed:.1f} papers/s; {stage.llm_controller.summary()}")
+            print(f"      {df['Affiliation_status'].value_counts().to_dict()}")
+    return results
+
+def benchmark_categorization(server, args):
+    """Runs categorizing_papers.py on synthetic papers for each --samples setting. Returns a list of result rows."""
+    rate_limit.set_limits('openai', requests=args.rpm or UNLIMITED, tokens=args.tpm or UNLIMITED)
+    shutil.copy(os.path.join(CATEGORIZATION_DIR, 'prompt.txt'), WORK_DIR)
+    papers = pd.DataFrame(synthetic_papers(args.papers))
+    papers['URL'] = papers['PDF_Link']
+    papers['Safety_category'] = ['No' if i % 3 else 'Mechanistic interpretability' for i in range(len(papers))]
+    papers[['Title', 'Abstract', 'URL', 'Safety_category']].to_csv(os.path.join(WORK_DIR, 'papers.csv'), index=False)
+    env = dict(os.environ, OPENAI_BASE_URL=server.url + '/v1', OPENAI_API_KEY='mock')
+
+    results = []
+    for samples in args.samples:
+        open(os.environ['TRACE_FILE'], 'w').close()
+        server.reset_stats()
+        command = [sys.executable, os.path.join(CATEGORIZATION_DIR, 'categorizing_papers.py'),
+                   '--input', 'papers.csv', '--output', f"output_{samples}.csv", '--restart',
+                   '--samples', str(samples), '--agreement', str(args.agreement)]
+        finished = subprocess.run(command, cwd=WORK_DIR, env=env, capture_output=True, text=True)
+        if finished.returncode != 0:
+            print(finished.stdout[-2000:], finished.stderr[-2000:])
+            raise RuntimeError(f"categorizing_papers.py failed with --samples {samples}")
+
+        spans = [span for span in tracing.load(os.environ['TRACE_FILE']) if span['name'] == 'categorize_paper']
+        # Time from the first paper starting to the last one finishing, leaving out the script's start-up
+        elapsed = max(s['start'] + s['duration'] for s in spans) - min(s['start'] for s in spans) if spans else 0.0
+        requests_made, throttled, retry_overhead = overhead(server.stats, 'openai')
+        results.append(['categorize', f"samples={samples} agreement={args.agreement}", len(spans), elapsed,
+                        *latency_summary([s['duration'] for s in spans]), requests_made, throttled, retry_overhead])
+        report = [line for line in finished.stdout.splitlines() if 'calls for' in line or 'Agreement' in line]
+        print(f"  samples={samples}: " + ('; '.join(report) or f"{len(spans)} papers"))
+    return results
+
+def comma_separated(value):
+    return [int(item) for item in value.split(',') if item]
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the LLM stages against local mock APIs.")
+    parser.add_argument('--stage', choices=['affiliation', 'categorize', 'both'], default='both')
+    parser.add_argument('--papers', type=int, default=100)
+    parser.add_argument('--workers', type=comma_separated, default=[16, 64], help="Papers in progress, e.g. 16,64")
+    parser.add_argument('--llm-max', type=comma_separated, default=[8, 50], help="Most LLM requests in flight, e.g. 8,50")
+    parser.add_argument('--fixed', action='store_true', help="Hold the LLM concurrency at --llm-max instead of adapting")
+    parser.add_argument('--samples', type=comma_separated, default=[1, 5], help="Samples per paper to categorize")
+    parser.add_argument('--agreement', type=float, default=0.75)
+    parser.add_argument('--rpm', type=float, help="Shared rate limit to apply, in requests per minute")
+    parser.add_argument('--tpm', type=float, help="Shared rate limit to apply, in tokens per minute")
+    parser.add_argument('--keep', action='store_true', help="Keep the temporary directory with the outputs and traces")
+    mock_api_server.add_arguments(parser)
+    args = parser.parse_args()
+
+    server = mock_api_server.start(**mock_api_server.settings_from(args))
+    print(f"Mock APIs on {server.url}; outputs in {WORK_DIR}")
+    results = []
+    try:
+        if args.stage in ('affiliation', 'both'):
+            print("Affiliation stage:")
+            results += benchmark_affiliation(server, args)
+        if args.stage in ('categorize', 'both'):
+            print("Categorization stage:")
+            results += benchmark_categorization(server, args)
+    finally:
+        server.shutdown()
+        if not args.keep:
+            shutil.rmtree(WORK_DIR, ignore_errors=True)
+
+    print(f"\n{'stage':<13}{'setting':<32}{'papers':>7}{'papers/s':>10}{'p50':>8}{'p95':>8}{'p99':>8}"
+          f"{'requests':>10}{'429s':>7}{'retry %':>9}")
+    for stage, setting, papers, elapsed, p50, p95, p99, requests_made, throttled, retry_overhead in results:
+        print(f"{stage:<13}{setting:<32}{papers:>7}{papers / elapsed if elapsed else 0:>10.2f}{p50:>8.2f}{p95:>8.2f}"
+              f"{p99:>8.2f}{requests_made:>10}{throttled:>7}{retry_overhead:>8.1f}%")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,297 @@
+"""
+Local stand-in for the Anthropic and OpenAI APIs (and the arXiv pages the affiliation stage reads), for offline benchmarks.
+
+It answers
+    POST /v1/messages                           like the Anthropic Messages API
+    POST /v1/chat/completions                   like the OpenAI Chat Completions API
+    GET  /html/<id>, /abs/<id>, /pdf/<id>       like arxiv.org, with a small author block
+    GET  /stats                                 requests, throttled requests and peak concurrency per API
+after a random delay, with canned responses. Requests beyond --capacity in flight for an
+API, and a random --error-rate share of the rest, get a 429 (or --overload-status), so the
+retry and backoff code is exercised the way the real APIs would.
+
+The SDKs can be pointed at it without changing any code:
+    python mock_api_server.py --port 8765 --latency 0.8 --capacity 20
+    ANTHROPIC_BASE_URL=http://localhost:8765 OPENAI_BASE_URL=http://localhost:8765/v1 python ...
+
+Canned responses can be replaced with --responses rules.json, a list of
+    {"api": "anthropic", "match": "first page of a journal article", "responses": ["...", "..."]}
+The first rule for the API whose "match" is in the system prompt or messages is used, and
+one of its responses is picked at random (repeat a response to make it more likely).
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+DEFAULT_RESPONSES = [
+    {'api': 'anthropic', 'match': 'first page of a journal article', 'responses': [
+        "Looking at the text, the first author's affiliation is Google DeepMind.",
+        "The first author lists OpenAI as their affiliation.",
+        "The first author is at Anthropic.",
+        "The first author's affiliation is Stanford University.",
+    ]},
+    {'api': 'anthropic', 'match': '', 'responses': ['Google DeepMind', 'OpenAI', 'Anthropic', 'Stanford University']},
+    # Mostly clear-cut papers, with a few that could go either way, so consensus voting has something to do
+    {'api': 'openai', 'match': '', 'responses': [
+        json.dumps({'reasoning': "The paper is about improving model capabilities.", 'categorization': 'No'}),
+    ] * 6 + [
+        json.dumps({'reasoning': "The paper studies features inside the model.", 'categorization': 'Mechanistic interpretability'}),
+        json.dumps({'reasoning': "The paper trains models from human preferences.", 'categorization': 'Enhancing human feedback'}),
+        json.dumps({'reasoning': "It is unclear whether this is about safety.", 'categorization': 'Unsure'}),
+        json.dumps({'reasoning': "The paper tests models on adversarial inputs.", 'categorization': 'Robustness'}),
+    ]},
+]
+
+class MockAPIServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency=0.5, sigma=0.5, per_token=0.0, page_latency=0.05, capacity=None,
+                 error_rate=0.0, overload_status=429, company_share=0.5, responses=None, seed=None):
+        """
+        Parameters:
+            address (tuple): (host, port). Port 0 picks a free one.
+            latency (float): Median seconds before an API response.
+            sigma (float): Spread of the log-normal latency distribution; 0 for a fixed latency.
+            per_token (float): Extra seconds per output token.
+            page_latency (float): Seconds before an arXiv page.
+            capacity (int): Requests in flight per API before the rest are throttled. None for no limit.
+            error_rate (float): Share of the other API requests that are throttled anyway.
+            overload_status (int): Status for throttled Anthropic requests, 429 or 529.
+            company_share (float): Share of the arXiv papers whose author block mentions a company.
+            responses (list): Canned response rules, as described at the top. Defaults to DEFAULT_RESPONSES.
+            seed (int): For repeatable latencies, errors and responses.
+        """
+        super().__init__(address, MockHandler)
+        self.latency = latency
+        self.sigma = sigma
+        self.per_token = per_token
+        self.page_latency = page_latency
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.overload_status = overload_status
+        self.company_share = company_share
+        self.responses = responses or DEFAULT_RESPONSES
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.reset_stats()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def reset_stats(self):
+        with self.lock:
+            self.in_flight = {}
+            self.stats = {}
+
+    def enter(self, api):
+        """Counts a request in. Returns False if it should be throttled."""
+        with self.lock:
+            stats = self.stats.setdefault(api, {'requests': 0, 'throttled': 0, 'peak_in_flight': 0})
+            stats['requests'] += 1
+            over_capacity = self.capacity is not None and self.in_flight.get(api, 0) >= self.capacity
+            if api != 'arxiv' and (over_capacity or self.random.random() < self.error_rate):
+                stats['throttled'] += 1
+                return False
+            self.in_flight[api] = self.in_flight.get(api, 0) + 1
+            stats['peak_in_flight'] = max(stats['peak_in_flight'], self.in_flight[api])
+            return True
+
+    def leave(self, api):
+        with self.lock:
+            self.in_flight[api] -= 1
+
+    def delay(self, output_tokens=0):
+        with self.lock:
+            spread = math.exp(self.sigma * self.random.gauss(0, 1)) if self.sigma else 1.0
+        return self.latency * spread + self.per_token * output_tokens
+
+    def canned(self, api, text):
+        for rule in self.responses:
+            if rule['api'] == api and rule.get('match', '') in text:
+                with self.lock:
+                    return self.random.choice(rule['responses'])
+        return ''
+
+    def mentions_company(self, arxiv_id):
+        # The same paper always gets the same author block
+        digest = hashlib.md5(arxiv_id.encode()).hexdigest()
+        return int(digest[:8], 16) / 0xFFFFFFFF < self.company_share
+
+def count_tokens(text):
+    # Same rough rule as rate_limit.estimate_tokens
+    return max(1, len(text) // 4)
+
+def message_text(content):
+    # Message content is either a string or a list of blocks
+    if isinstance(content, str):
+        return content
+    return ' '.join(block.get('text', '') for block in content if isinstance(block, dict))
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass  # One line per request would drown out the benchmark's output
+
+    def send(self, status, body, content_type='application/json', headers=None):
+        data = body if isinstance(body, bytes) else json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        path = urlparse(self.path).path
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            request = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            self.send(400, {'error': {'type': 'invalid_request_error', 'message': 'Body is not JSON'}})
+            return
+        if path.endswith('/messages'):
+            self.api_call('anthropic', request)
+        elif path.endswith('/chat/completions'):
+            self.api_call('openai', request)
+        else:
+            self.send(404, {'error': {'type': 'not_found_error', 'message': f'No route for {path}'}})
+
+    def api_call(self, api, request):
+        server = self.server
+        if not server.enter(api):
+            self.throttled(api)
+            return
+        try:
+            messages = request.get('messages', [])
+            prompt = message_text(request.get('system', '')) + ' ' + ' '.join(
+                message_text(message.get('content', '')) for message in messages)
+            text = server.canned(api, prompt)
+            input_tokens, output_tokens = count_tokens(prompt), count_tokens(text)
+            time.sleep(server.delay(output_tokens))
+        finally:
+            server.leave(api)
+        model = request.get('model', 'mock')
+        if api == 'anthropic':
+            self.send(200, {
+                'id': 'msg_' + uuid.uuid4().hex[:24],
+                'type': 'message',
+                'role': 'assistant',
+                'model': model,
+                'content': [{'type': 'text', 'text': text}],
+                'stop_reason': 'end_turn',
+                'stop_sequence': None,
+                'usage': {'input_tokens': input_tokens, 'output_tokens': output_tokens},
+            })
+        else:
+            self.send(200, {
+                'id': 'chatcmpl-' + uuid.uuid4().hex[:24],
+                'object': 'chat.completion',
+                'created': int(time.time()),
+                'model': model,
+                'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': text}, 'finish_reason': 'stop'}],
+                'usage': {'prompt_tokens': input_tokens, 'completion_tokens': output_tokens,
+                          'total_tokens': input_tokens + output_tokens},
+            })
+
+    def throttled(self, api):
+        # Shaped like the real error bodies, so the SDKs raise their usual exceptions
+        headers = {'retry-after': '1'}
+        if api == 'anthropic':
+            status = self.server.overload_status
+            error_type = 'overloaded_error' if status == 529 else 'rate_limit_error'
+            self.send(status, {'type': 'error', 'error': {'type': error_type, 'message': 'Mock server is busy'}},
+                      headers=headers)
+        else:
+            self.send(429, {'error': {'message': 'Mock server is busy', 'type': 'requests',
+                                      'code': 'rate_limit_exceeded', 'param': None}}, headers=headers)
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == '/stats':
+            with self.server.lock:
+                self.send(200, self.server.stats)
+            return
+        kind, _, arxiv_id = path.strip('/').partition('/')
+        if kind not in ('html', 'abs', 'pdf') or not arxiv_id:
+            self.send(404, b'Not found', 'text/plain')
+            return
+        self.server.enter('arxiv')
+        try:
+            time.sleep(self.server.page_latency)
+        finally:
+            self.server.leave('arxiv')
+        if kind == 'pdf':
+            # Not a real PDF; the benchmark serves the author block as HTML so no PDF is needed
+            self.send(404, b'Not found', 'text/plain')
+            return
+        self.send(200, self.arxiv_page(kind, arxiv_id).encode(), 'text/html; charset=utf-8')
+
+    def arxiv_page(self, kind, arxiv_id):
+        institution = 'Google DeepMind, London' if self.server.mentions_company(arxiv_id) else 'University of Somewhere'
+        if kind == 'abs':
+            # No citation_author_institution tags, so the affiliation stage goes on to the LLMs
+            return (f'<html><head><meta name="citation_title" content="Paper {arxiv_id}">'
+                    f'<meta name="citation_author" content="Author, First"></head><body></body></html>')
+        # An author block without ltx_role_affiliation markup, so its text goes to the filter and the LLMs
+        return (f'<html><body><h1 class="ltx_title">Paper {arxiv_id}</h1><div class="ltx_authors">'
+                f'<span class="ltx_creator ltx_role_author"><span class="ltx_personname">First Author<br>'
+                f'{institution}<br>first@example.com</span></span></div>'
+                f'<div class="ltx_abstract"><p>Abstract.</p></div>' + 'x' * 2000 + '</body></html>')
+
+def start(**settings):
+    """Starts a server on a free local port in a background thread. Returns the server; stop it with shutdown()."""
+    server = MockAPIServer(('127.0.0.1', settings.pop('port', 0)), **settings)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def add_arguments(parser):
+    """The server settings, shared with benchmark_llm_stages.py."""
+    parser.add_argument('--latency', type=float, default=0.5, help="Median seconds per API response")
+    parser.add_argument('--sigma', type=float, default=0.5, help="Spread of the log-normal latency; 0 for fixed")
+    parser.add_argument('--per-token', type=float, default=0.0, help="Extra seconds per output token")
+    parser.add_argument('--page-latency', type=float, default=0.05, help="Seconds per arXiv page")
+    parser.add_argument('--capacity', type=int, help="Requests in flight per API before the rest get a 429")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Share of other requests that get a 429 anyway")
+    parser.add_argument('--overload-status', type=int, default=429, choices=[429, 529],
+                        help="Status for throttled Anthropic requests")
+    parser.add_argument('--company-share', type=float, default=0.5,
+                        help="Share of arXiv papers whose author block mentions a company")
+    parser.add_argument('--responses', help="JSON file with canned response rules")
+    parser.add_argument('--seed', type=int)
+
+def settings_from(args):
+    responses = None
+    if args.responses:
+        with open(args.responses, 'r', encoding='utf-8') as f:
+            responses = json.load(f)
+    return dict(latency=args.latency, sigma=args.sigma, per_token=args.per_token, page_latency=args.page_latency,
+                capacity=args.capacity, error_rate=args.error_rate, overload_status=args.overload_status,
+                company_share=args.company_share, responses=responses, seed=args.seed)
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local stand-in for the Anthropic and OpenAI APIs.")
+    parser.add_argument('--port', type=int, default=8765)
+    add_arguments(parser)
+    args = parser.parse_args()
+    server = MockAPIServer(('127.0.0.1', args.port), **settings_from(args))
+    print(f"Mock APIs on {server.url}. Use:\n"
+          f"  ANTHROPIC_BASE_URL={server.url} OPENAI_BASE_URL={server.url}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(json.dumps(server.stats, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -1,54 +1,119 @@
 import csv
+import glob
+import hashlib
 import os
-from collections import defaultdict
+import sys
+from collections import Counter
+
+# Shared helpers live in the "Shared code" folder at the top of the repository
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Shared code'))
+from paper_store import paper_id
+
+# Fields that are checked for edits between the old and the new file
+COMPARED_FIELDS = ['Company', 'Title', 'Safety_category', 'Abstract']
+FIELDNAMES = ['Company', 'Title', 'URL', 'Safety_category', 'Abstract', 'New paper?', 'Changed fields']
+
+def normalize_key(url):
+    # Join on the arXiv ID when there is one, so that abs/pdf links and
+    # different versions of the same paper count as the same paper.
+    # Otherwise use the URL without scheme, "www.", trailing slash or tracking
+    # parameters, keeping the rest of the query string (openreview.net/forum?id=...)
+    return paper_id(url=url)
+
+def field_digest(value):
+    # Small fixed-size digest so the old side can be held in memory cheaply.
+    # Whitespace is collapsed so that re-wrapped abstracts don't count as edits.
+    normalized = ' '.join((value or '').split())
+    return hashlib.blake2b(normalized.encode('utf-8'), digest_size=8).digest()
 
 def read_csv(filename):
     with open(filename, 'r', newline='', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        data = {}
-        for row in reader:
-            if 'Date' in row:
-                del row['Date']  # Remove the 'Date' column if present
-            data[row['URL']] = row
-        return data
-
-def write_csv(filename, fieldnames, rows):
-    with open(filename, 'w', newline='', encoding='utf-8') as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
-        writer.writerows(rows)
+        for row in csv.DictReader(f):
+            row.pop('Date', None)  # Remove the 'Date' column if present
+            yield row
+
+def build_index(filename):
+    # Build side of the hash join: key -> digest of each compared field
+    index = {}
+    for row in read_csv(filename):
+        index[normalize_key(row['URL'])] = {
+            field: field_digest(row.get(field)) for field in COMPARED_FIELDS
+        }
+    return index
 
 def compare_csv_files(company):
     old_file = f'old_{company}.csv'
     new_file = f'new_{company}.csv'
     output_file = f'comparison_{company}.csv'
 
-    old_data = read_csv(old_file)
-    new_data = read_csv(new_file)
-
-    all_urls = set(old_data.keys()) | set(new_data.keys())
-
-    output_rows = []
-    for url in all_urls:
-        if url in old_data and url in new_data:
-            row = new_data[url]
-            row['New paper?'] = 'Both'
-        elif url in new_data:
-            row = new_data[url]
-            row['New paper?'] = 'New'
-        else:
-            row = old_data[url]
+    old_index = build_index(old_file)
+    seen = set()
+    summary = Counter()
+
+    with open(output_file, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDNAMES, extrasaction='ignore')
+        writer.writeheader()
+
+        # Probe side: stream the new file and look each row up in the old index
+        for row in read_csv(new_file):
+            key = normalize_key(row['URL'])
+            if key in seen:
+                summary['Duplicate'] += 1
+                continue
+            seen.add(key)
+            old_digests = old_index.get(key)
+            if old_digests is None:
+                row['New paper?'] = 'New'
+                row['Changed fields'] = ''
+            else:
+                changed = [
+                    field for field in COMPARED_FIELDS
+                    if field_digest(row.get(field)) != old_digests[field]
+                ]
+                row['New paper?'] = 'Both'
+                row['Changed fields'] = ', '.join(changed)
+                if changed:
+                    summary['Changed'] += 1
+                summary.update(f'{field} changed' for field in changed)
+            summary[row['New paper?']] += 1
+            writer.writerow(row)
+
+        # Second pass over the old file for the papers that are no longer there
+        for row in read_csv(old_file):
+            key = normalize_key(row['URL'])
+            if key in seen:
+                continue
+            seen.add(key)
             row['New paper?'] = 'Old'
-        output_rows.append(row)
+            row['Changed fields'] = ''
+            summary['Old'] += 1
+            writer.writerow(row)
+
+    return summary
+
+def find_companies():
+    # Every company that has both an old_<company>.csv and a new_<company>.csv
+    companies = []
+    for new_file in sorted(glob.glob('new_*.csv')):
+        company = new_file[len('new_'):-len('.csv')]
+        if os.path.exists(f'old_{company}.csv'):
+            companies.append(company)
+    return companies
 
-    fieldnames = ['Company', 'Title', 'URL', 'Safety_category', 'Abstract', 'New paper?']
-    write_csv(output_file, fieldnames, output_rows)
+def print_summary(company, summary):
+    print(f"{company}: {summary['New']} new, {summary['Old']} old, {summary['Both']} in both "
+          f"({summary['Changed']} with changed fields)")
+    for field in COMPARED_FIELDS:
+        if summary[f'{field} changed']:
+            print(f"    {field} changed: {summary[f'{field} changed']}")
+    if summary['Duplicate']:
+        print(f"    Skipped {summary['Duplicate']} duplicate rows in new_{company}.csv")
 
 def main():
-    companies = ['Anthropic', 'GDM', 'OpenAI']
+    companies = find_companies()
     for company in companies:
-        compare_csv_files(company)
+        print_summary(company, compare_csv_files(company))
     print("Comparison files have been generated.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,188 @@
+"""
+Harvests papers from a local copy of the arXiv metadata instead of the arXiv API.
+
+Two formats are supported:
+    * the JSON-lines metadata snapshot (one paper per line, e.g. arxiv-metadata-oai-snapshot.json)
+    * an OAI-PMH export in the arXiv metadata format (<record> elements), saved as .xml
+
+The file is memory-mapped and split into byte ranges, one per process. Each process
+filters its range by category (cs.AI/cs.LG), submission date and the title search
+terms, and returns rows with the same columns as the API harvest in from_arxiv.py.
+Because this is all local, it also avoids the end date bug in the API described in
+the README. IDs from both formats go through arxiv_ids, so a paper has the same key
+whichever file it came from.
+"""
+
+import json
+import mmap
+import os
+import re
+import sys
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+from email.utils import parsedate_to_datetime
+
+# Shared helpers live in the "Shared code" folder at the top of the repository
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'Shared code'))
+import arxiv_ids
+
+CATEGORIES = {'cs.AI', 'cs.LG'}
+
+def title_pattern(terms):
+    """Builds one regular expression that matches any of the search terms as whole words in a title."""
+    alternatives = sorted(
+        (r'\s+'.join(re.escape(word) for word in term.split()) for term in terms),
+        key=len, reverse=True,
+    )
+    return r'\b(?:' + '|'.join(alternatives) + r')\b'
+
+def byte_ranges(path, processes):
+    size = os.path.getsize(path)
+    step = max(1, -(-size // processes))
+    return [(start, min(size, start + step)) for start in range(0, size, step)]
+
+def lines_in_range(mm, start, end):
+    # A line belongs to the range that its first byte is in
+    if start > 0:
+        newline = mm.find(b'\n', start - 1)
+        position = len(mm) if newline == -1 else newline + 1
+    else:
+        position = 0
+    while position < end:
+        newline = mm.find(b'\n', position)
+        if newline == -1:
+            newline = len(mm)
+        yield mm[position:newline]
+        position = newline + 1
+
+def records_in_range(mm, start, end):
+    # A <record> belongs to the range that its opening tag starts in
+    position = mm.find(b'<record>', start)
+    while position != -1 and position < end:
+        close = mm.find(b'</record>', position)
+        if close == -1:
+            return
+        yield mm[position:close + len(b'</record>')]
+        position = mm.find(b'<record>', close)
+
+def make_row(arxiv_id, title, authors, abstract, submitted):
+    # authors is a list of {'name': ..., 'affiliations': [...]}, as in arxiv_metadata.parse_authors
+    arxiv_id = arxiv_ids.arxiv_id_from_url(arxiv_id) or arxiv_id
+    return {
+        'Title': ' '.join(title.split()),
+        'Authors': ', '.join(author['name'] for author in authors),
+        'Abstract': abstract.strip().replace('\n', ' '),
+        'arXiv ID': arxiv_id,
+        'PDF_Link': f"https://arxiv.org/pdf/{arxiv_id}",
+        'Submitted': submitted,
+        'Author_affiliations': json.dumps(authors),
+    }
+
+def row_from_json(line, title_regex, date_from, date_to):
+    # Cheap check on the raw bytes before parsing the JSON
+    if b'cs.AI' not in line and b'cs.LG' not in line:
+        return None
+    paper = json.loads(line)
+    if not CATEGORIES.intersection(paper['categories'].split()):
+        return None
+    if not title_regex.search(paper['title']):
+        return None
+    # The submission date is when the first version was created
+    submitted = parsedate_to_datetime(paper['versions'][0]['created']).date().isoformat()
+    if not date_from <= submitted <= date_to:
+        return None
+    # Each author is [last, first, suffix], followed by their affiliations if the snapshot has them
+    authors = [
+        {
+            'name': ' '.join(part for part in (first, last, *rest[:1]) if part),
+            'affiliations': [affiliation for affiliation in rest[1:] if affiliation],
+        }
+        for last, first, *rest in paper['authors_parsed']
+    ]
+    arxiv_id = paper['id'] + paper['versions'][-1]['version']
+    return make_row(arxiv_id, paper['title'], authors, paper['abstract'], submitted)
+
+def local_name(tag):
+    return tag.rsplit('}', 1)[-1]
+
+def row_from_xml(record, title_regex, date_from, date_to):
+    if b'cs.AI' not in record and b'cs.LG' not in record:
+        return None
+    fields = {}
+    authors = []
+    versions = []  # Only in the arXivRaw format; the arXiv format has no versions
+    for element in ET.fromstring(record).iter():
+        name = local_name(element.tag)
+        if name == 'version' and element.get('version'):
+            versions.append(element.get('version'))
+        elif name == 'author':
+            parts = {local_name(part.tag): (part.text or '') for part in element}
+            authors.append({
+                'name': ' '.join(part for part in (parts.get('forenames'), parts.get('keyname')) if part),
+                'affiliations': [
+                    part.text.strip() for part in element
+                    if local_name(part.tag) == 'affiliation' and part.text and part.text.strip()
+                ],
+            })
+        elif name in ('id', 'created', 'title', 'categories', 'abstract') and name not in fields:
+            fields[name] = element.text or ''
+    if 'categories' not in fields or not CATEGORIES.intersection(fields['categories'].split()):
+        return None
+    if not title_regex.search(fields.get('title', '')):
+        return None
+    submitted = fields.get('created', '')
+    if not date_from <= submitted <= date_to:
+        return None
+    arxiv_id = fields['id'].strip()
+    if versions:
+        arxiv_id += max(versions, key=lambda version: int(version.lstrip('v')))
+    return make_row(arxiv_id, fields['title'], authors, fields.get('abstract', ''), submitted)
+
+def filter_range(path, start, end, pattern, date_from, date_to):
+    """Filters one byte range of the file. Runs in a worker process."""
+    title_regex = re.compile(pattern, re.IGNORECASE)
+    is_xml = path.endswith('.xml')
+    rows = []
+    if os.path.getsize(path) == 0:
+        return rows  # mmap can't map an empty file
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        if is_xml:
+            for record in records_in_range(mm, start, end):
+                row = row_from_xml(record, title_regex, date_from, date_to)
+                if row:
+                    rows.append(row)
+        else:
+            for line in lines_in_range(mm, start, end):
+                if line.strip():
+                    row = row_from_json(line, title_regex, date_from, date_to)
+                    if row:
+                        rows.append(row)
+    return rows
+
+def harvest(path, terms, date_from='2022-01-01', date_to='2024-07-31', processes=None):
+    """
+    Finds the papers in a local arXiv metadata file that match the search.
+
+    Parameters:
+        path (str): The JSON-lines snapshot, or an OAI-PMH export ending in .xml.
+        terms (list): Search terms that have to appear in the title.
+        date_from (str): First submission date to include, as YYYY-MM-DD.
+        date_to (str): Last submission date to include, as YYYY-MM-DD.
+        processes (int): Number of worker processes. Defaults to the number of CPUs.
+
+    Returns:
+        dict: arXiv ID without version -> row with the same columns as the API harvest.
+    """
+    processes = processes or os.cpu_count() or 1
+    pattern = title_pattern(terms)
+    ranges = byte_ranges(path, processes)
+    all_data = {}
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = [
+            executor.submit(filter_range, path, start, end, pattern, date_from, date_to)
+            for start, end in ranges
+        ]
+        for future in futures:
+            for row in future.result():
+                all_data[arxiv_ids.base_id(row['arXiv ID'])] = row
+    return all_data
@@ -1,10 +1,31 @@
+import argparse
+import json
 import urllib.parse
 import urllib.request
 import feedparser
 import pandas as pd
 import time
+import os
+import re
+import sys
 from datetime import date
 
+# Shared helpers live in the "Shared code" folder at the top of the repository
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'Shared code'))
+import arxiv_ids
+import arxiv_metadata
+import arxiv_snapshot
+from paper_store import PaperStore
+from work_queue import WorkQueue
+import tracing
+
+FIRST_SUBMITTED = '2022-01-01'  # Papers submitted before this are left out
+LAST_SUBMITTED = '2024-07-31'  # Papers submitted after this are left out
+
+# Entries skipped by plan_start, and the probe requests it took, for the report at the end
+skip_stats = {'skipped': 0, 'probes': 0}
+
+@tracing.traced()
 def search_arxiv(query, start=0, max_results=100):
     """
     Sends a query to the arXiv API and retrieves a list of papers.
@@ -24,10 +45,17 @@ def search_arxiv(query, start=0, max_results=100):
         f"sortOrder=descending"
     )
     response = urllib.request.urlopen(url)
-    feed = feedparser.parse(response.read())
+    content = response.read()
+    feed = feedparser.parse(content)
+    # feedparser flattens arxiv:affiliation into one value per entry, so read the authors ourselves
+    authors = arxiv_metadata.authors_by_id(content)
+    for entry in feed.entries:
+        entry['author_affiliations'] = authors.get(arxiv_ids.arxiv_id_from_url(entry.id), [])
     total_results = int(feed.feed.opensearch_totalresults)
+    tracing.annotate(bytes=len(content), entries=len(feed.entries))
     return feed.entries, total_results
 
+@tracing.traced()
 def fetch_batch(query, start, batch_size):
     """
     Fetches a batch of results with retry logic and exponential backoff.
@@ -47,6 +75,7 @@ def fetch_batch(query, start, batch_size):
         try:
             results, _ = search_arxiv(query, start=start, max_results=batch_size)
             if results:
+                tracing.annotate(attempts=attempt + 1)
                 return results
             else:
                 print(f"Attempt {attempt + 1}: Empty batch. Retrying...")
@@ -58,6 +87,71 @@ def fetch_batch(query, start, batch_size):
     print(f"Failed to fetch batch after {max_attempts} attempts.")
     return []
 
+def probe_entry(encoded_query, start, attempts=2):
+    """Returns the single result at start, or None if there is none (or the API keeps failing)."""
+    for attempt in range(attempts):
+        try:
+            entries, _ = search_arxiv(encoded_query, start=start, max_results=1)
+            return entries[0] if entries else None
+        except Exception as e:
+            print(f"Probe at {start} failed: {e}")
+            if attempt < attempts - 1:
+                time.sleep(3)
+    return None
+
+def plan_start(encoded_query, first_entries, total_results, cutoff=LAST_SUBMITTED):
+    """
+    Finds the offset of the first result submitted on or before the cutoff.
+
+    Because of the end-date bug in the API, queries go up to 20250101 and everything after the
+    cutoff is thrown away. Results are sorted newest first, so those are all at the start; instead
+    of downloading them, binary-search for where they end with one-result requests.
+
+    Parameters:
+        encoded_query (str): The encoded query string.
+        first_entries (list): The entries from the max_results=1 request that got total_results.
+        total_results (int): Number of results for the query.
+        cutoff (str): Last submission date to keep, as YYYY-MM-DD.
+
+    Returns:
+        int: The offset to start paging from.
+    """
+    if not first_entries or first_entries[0].published[:10] <= cutoff:
+        return 0  # Nothing to skip, as for the windows that end before the cutoff
+    low, high = 1, total_results  # The first in-window result is somewhere in [low, high]
+    while low < high:
+        middle = (low + high) // 2
+        time.sleep(3)  # Be polite to the API and avoid rate limiting
+        probe = probe_entry(encoded_query, middle)
+        skip_stats['probes'] += 1
+        if probe is None or probe.published[:10] <= cutoff:
+            # The total can overstate the results, so nothing there means we are past the end
+            high = middle
+        else:
+            low = middle + 1
+    skip_stats['skipped'] += low
+    if low:
+        print(f"Skipping the first {low} results, which were submitted after {cutoff}.")
+    return low
+
+# Columns of the harvest CSV, as row_from_entry makes them
+HARVEST_COLUMNS = ['Title', 'Authors', 'Abstract', 'arXiv ID', 'PDF_Link', 'Submitted', 'Author_affiliations']
+
+def row_from_entry(paper):
+    """Turns an entry of the API feed into a row of the harvest CSV."""
+    arxiv_id = arxiv_ids.arxiv_id_from_url(paper.id)
+    return {
+        'Title': paper.title.strip().replace('\n', ' '),
+        'Authors': ', '.join(
+            author.name for author in paper.authors
+        ),
+        'Abstract': paper.summary.strip().replace('\n', ' '),
+        'arXiv ID': arxiv_id,
+        'PDF_Link': f"https://arxiv.org/pdf/{arxiv_id}",
+        'Submitted': paper.published[:10],
+        'Author_affiliations': json.dumps(paper.author_affiliations)
+    }
+
 def construct_query(term):
     """
     Constructs the query string for a given search term.
@@ -75,12 +169,103 @@ def construct_query(term):
         # For single words, search for that word in the title
         return f'ti:{term}'
 
+def harvest_window(term, date_from, date_to, categories="(cat:cs.AI OR cat:cs.LG)"):
+    """
+    Fetches every paper for one search term submitted in one date window.
+
+    Parameters:
+        term (str): The search term.
+        date_from (str): First submission date, as YYYYMMDD.
+        date_to (str): Last submission date, as YYYYMMDD.
+        categories (str): Category part of the query.
+
+    Returns:
+        dict: arXiv ID -> row of the harvest CSV.
+
+    Raises:
+        RuntimeError: If a batch can't be fetched, so that a partly harvested window isn't taken for a finished one.
+    """
+    query = f'({construct_query(term)}) AND {categories} AND submittedDate:[{date_from} TO {date_to}]'
+    encoded_query = urllib.parse.quote(query)
+    first_entries, total_results = search_arxiv(encoded_query, max_results=1)
+    rows = {}
+    batch_size = 100
+    for start in range(plan_start(encoded_query, first_entries, total_results), total_results, batch_size):
+        time.sleep(3)  # Be polite to the API and avoid rate limiting
+        results = fetch_batch(encoded_query, start, min(batch_size, total_results - start))
+        if not results:
+            raise RuntimeError(f"Couldn't fetch results {start + 1} to {start + batch_size} for '{term}'")
+        for paper in results:
+            row = row_from_entry(paper)
+            if row['Submitted'] <= LAST_SUBMITTED:
+                rows[row['arXiv ID']] = row
+    return rows
+
+def distributed(role, queue_dir, csv_filename, search_terms, date_ranges):
+    """
+    Runs one role of a harvest shared between machines (see work_queue.py).
+
+    plan adds a shard for each search term and date range, work harvests shards until none
+    are left (start as many of these as you like, anywhere that can see queue_dir), and
+    merge combines their results into csv_filename, one row per paper.
+    """
+    queue = WorkQueue(queue_dir)
+    if role == 'plan':
+        shards = {}
+        for term in search_terms:
+            for date_range in date_ranges:
+                date_from, date_to = re.search(r'\[(\d+) TO (\d+)\]', date_range).groups()
+                shards[f"{term}_{date_from}"] = {'term': term, 'from': date_from, 'to': date_to}
+        print(f"Added {queue.add('harvest', shards)} of {len(shards)} shards to {queue_dir}.")
+
+    elif role == 'work':
+        def work(shard_id, shard, result_path):
+            rows = harvest_window(shard['term'], shard['from'], shard['to'])
+            # Always with a header, so that merge can read a shard that found nothing
+            pd.DataFrame(list(rows.values()), columns=HARVEST_COLUMNS).to_csv(result_path, index=False)
+            print(f"{len(rows)} papers for '{shard['term']}' from {shard['from']} to {shard['to']}")
+        print(f"Finished {queue.run('harvest', work)} shards.")
+
+    else:
+        results = [pd.read_csv(path) for path in queue.result_files('harvest')]
+        if os.path.exists(csv_filename):
+            results.insert(0, pd.read_csv(csv_filename))
+        combined_df = pd.concat(results, ignore_index=True)
+        # The same paper can come from several terms, or twice from one shard whose lease ran out.
+        # Keep one row per paper: the latest version, in the place the paper first appeared
+        combined_df = pd.DataFrame(arxiv_ids.latest_rows(combined_df.to_dict('records')))
+        combined_df.to_csv(csv_filename, index=False)
+
+        rows = combined_df.to_dict('records')
+        PaperStore().upsert_many(rows)
+        metadata_cache = arxiv_metadata.load_cache()
+        for row in rows:
+            # Also over a None left by an earlier lookup that didn't find the paper
+            if metadata_cache.get(arxiv_ids.base_id(row['arXiv ID'])) is None:
+                metadata_cache[arxiv_ids.base_id(row['arXiv ID'])] = row
+        arxiv_metadata.save_cache(metadata_cache)
+        counts = queue.counts('harvest')
+        print(f"Merged {len(combined_df)} unique papers into {csv_filename}. Shards: "
+              + ', '.join(f"{status} {n}" for (_, status), n in sorted(counts.items())))
+
 def main():
+    parser = argparse.ArgumentParser(description="Search arXiv for papers with safety-related terms in the title.")
+    parser.add_argument('--output', help="CSV to write to (and resume from). Defaults to data_<today>.csv.")
+    parser.add_argument('--snapshot', help="Read papers from a local arXiv metadata snapshot (JSON lines) "
+                                           "or OAI-PMH export (.xml) instead of the API")
+    parser.add_argument('--processes', type=int, help="Processes to use with --snapshot. Defaults to the number of CPUs.")
+    parser.add_argument('--distributed', choices=['plan', 'work', 'merge'],
+                        help="Share the harvest between several processes or machines through --queue")
+    parser.add_argument('--queue', default='work_queue', help="Directory with the shared work queue")
+    args = parser.parse_args()
+
     # List of search terms with expanded variations
     search_terms = [
         
         # I'm not sure how ArXiv handles wildcards so I wrote
         # them out manually instead.
+        # title_index.py can check what a set of terms (or real wildcards
+        # like align*) matches in papers we have already harvested.
         
         # Variations for "align*"
         "align", "alignment", "aligned",
@@ -92,7 +277,7 @@ def main():
         "safe", "safety", "safely",
         
         # Variations for "robust*"
-        "robust", "robustness", "robustly"
+        "robust", "robustness", "robustly",
         
         # Variations for "interpret*"
         "interpret", "interpretable", "interpretability",
@@ -140,25 +325,51 @@ def main():
         "submittedDate:[20240101 TO 20250101]",
     ]
 
+    today = date.today().strftime("%b_%d")
+    csv_filename = args.output or f'data_{today}.csv'
+    if args.distributed:
+        distributed(args.distributed, args.queue, csv_filename, search_terms, date_ranges)
+        return
+
     # Initialize data structures
-    all_data = {}      # Dictionary to store all retrieved paper data
+    all_data = {}      # Base arXiv ID -> the latest version of the paper retrieved
     duplicates = set() # Set to track duplicate arXiv IDs
+    metadata_cache = arxiv_metadata.load_cache()  # arXiv ID -> metadata, shared with collecting_abstracts.py
+    store = PaperStore()  # Every paper is also added to the shared paper store as it is found
 
     # Load existing data from CSV if checkpoint exists
-    today = date.today().strftime("%b_%d")
-    csv_filename = f'data_{today}.csv'
     try:
         existing_df = pd.read_csv(csv_filename)
-        existing_ids = set(existing_df['arXiv ID'].tolist())
+        # Base ID -> latest version, so a new version of a paper we already have isn't added again
+        seen_ids = arxiv_ids.VersionIndex(existing_df['arXiv ID'])
         print(f"Loaded {len(existing_df)} existing records from {csv_filename}.")
     except FileNotFoundError:
         existing_df = pd.DataFrame()
-        existing_ids = set()
+        seen_ids = arxiv_ids.VersionIndex()
         print("No existing checkpoint found. Starting fresh.")
 
     total_papers_to_retrieve = 0  # Total number of papers to retrieve across all terms
     total_papers_retrieved = 0    # Total number of papers actually retrieved
 
+    # With a local snapshot, everything is filtered locally and there is nothing to fetch from the API
+    if args.snapshot:
+        print(f"Filtering {args.snapshot}...")
+        snapshot_data = arxiv_snapshot.harvest(
+            args.snapshot, search_terms, date_from='2022-01-01', date_to=LAST_SUBMITTED, processes=args.processes
+        )
+        for paper in snapshot_data.values():
+            arxiv_id = paper['arXiv ID']
+            # A newer version of a paper we already have replaces it; the same or an older one is skipped
+            if not seen_ids.add(arxiv_id):
+                duplicates.add(arxiv_ids.base_id(arxiv_id))
+                continue
+            all_data[arxiv_ids.base_id(arxiv_id)] = paper
+            metadata_cache[arxiv_ids.base_id(arxiv_id)] = paper
+        store.upsert_many(all_data.values())
+        total_papers_to_retrieve = total_papers_retrieved = len(all_data)
+        print(f"Found {len(snapshot_data)} matching papers, {len(all_data)} of them new.")
+        search_terms = []  # Skip the API search below
+
     # Process each search term
     for term in search_terms:
         print(f"\nProcessing term: {term}")
@@ -168,7 +379,7 @@ def main():
         # Construct the full query with the entire date range
         full_query = f'({query_term}) AND {categories} AND submittedDate:[20220101 TO 20250101]'
         encoded_query = urllib.parse.quote(full_query)
-        _, total_results = search_arxiv(encoded_query, max_results=1)
+        first_entries, total_results = search_arxiv(encoded_query, max_results=1)
         print(f"Total number of papers found for term '{term}': {total_results}")
 
         # Check if total_results exceeds API limitations (usually around 1000)
@@ -180,19 +391,19 @@ def main():
                 encoded_yearly_query = urllib.parse.quote(yearly_query)
                 print(f"\nProcessing date range: {date_range}")
                 print(f"Query: {urllib.parse.unquote(yearly_query)}")
-                _, yearly_total_results = search_arxiv(encoded_yearly_query, max_results=1)
+                first_entries, yearly_total_results = search_arxiv(encoded_yearly_query, max_results=1)
                 print(f"Total number of papers found: {yearly_total_results}")
 
                 if yearly_total_results == 0:
                     continue  # Skip if no results for this year
 
-                num_papers_to_retrieve = yearly_total_results
-                total_papers_to_retrieve += num_papers_to_retrieve
-                term_total_results += num_papers_to_retrieve
-
                 batch_size = 100  # Maximum batch size per API request
                 papers_retrieved_for_range = 0
-                start = 0
+                start = plan_start(encoded_yearly_query, first_entries, yearly_total_results)
+                # The skipped results were submitted after the cutoff, so they aren't available to retrieve
+                num_papers_to_retrieve = yearly_total_results - start
+                total_papers_to_retrieve += num_papers_to_retrieve
+                term_total_results += num_papers_to_retrieve
                 while (
                     papers_retrieved_for_range < num_papers_to_retrieve and start < yearly_total_results
                 ):
@@ -211,25 +422,23 @@ def main():
                     for paper in results:
                         submitted_date = paper.published[:10]
                         # Filter papers submitted after July 31, 2024
-                        if submitted_date > '2024-07-31':
+                        if submitted_date > LAST_SUBMITTED:
                             continue
-                        arxiv_id = paper.id.split('/abs/')[-1]
-                        if arxiv_id in existing_ids or arxiv_id in all_data:
-                            duplicates.add(arxiv_id)
+                        arxiv_id = arxiv_ids.arxiv_id_from_url(paper.id)
+                        # A newer version of a paper we already have replaces it; the same or an older one is skipped
+                        if not seen_ids.add(arxiv_id):
+                            duplicates.add(arxiv_ids.base_id(arxiv_id))
                             continue
                         else:
-                            all_data[arxiv_id] = {
-                                'Title': paper.title.strip().replace('\n', ' '),
-                                'Authors': ', '.join(
-                                    author.name for author in paper.authors
-                                ),
-                                'Abstract': paper.summary.strip().replace('\n', ' '),
-                                'arXiv ID': arxiv_id,
-                                'PDF_Link': f"https://arxiv.org/pdf/{arxiv_id}",
-                                'Submitted': submitted_date
-                            }
-                            papers_retrieved_for_range += 1
-                            total_papers_retrieved += 1
+                            # A newer version only replaces a paper that was already counted
+                            is_new = arxiv_ids.base_id(arxiv_id) not in all_data
+                            row = all_data[arxiv_ids.base_id(arxiv_id)] = row_from_entry(paper)
+                            # Share the metadata so later stages don't have to look it up again
+                            metadata_cache[arxiv_ids.base_id(arxiv_id)] = row
+                            store.upsert(row)
+                            if is_new:
+                                papers_retrieved_for_range += 1
+                                total_papers_retrieved += 1
 
                     # Save checkpoint after each batch to prevent data loss
                     combined_data = list(all_data.values())
@@ -239,13 +448,15 @@ def main():
                         )
                     else:
                         combined_df = pd.DataFrame(combined_data)
-                    combined_df.drop_duplicates(subset=['arXiv ID'], inplace=True)
+                    combined_df = pd.DataFrame(arxiv_ids.latest_rows(combined_df.to_dict('records')))
                     combined_df.to_csv(csv_filename, index=False)
                     print(f"Checkpoint saved with {len(combined_df)} records.")
 
                     time.sleep(3)  # Be polite to the API and avoid rate limiting
 
                     start += fetch_size  # Increment start index for the next batch
+                    if results[-1].published[:10] < FIRST_SUBMITTED:
+                        break  # Sorted newest first, so the rest are before the window too
 
                 if papers_retrieved_for_range == 0:
                     print(f"No papers retrieved for date range '{date_range}'.")
@@ -253,13 +464,13 @@ def main():
             # Total results within API limitations; process normally
             print("Total results within API limit. Processing normally.")
             print(f"Query: {urllib.parse.unquote(full_query)}")
-            num_papers_to_retrieve = total_results
-            total_papers_to_retrieve += num_papers_to_retrieve
-            term_total_results += num_papers_to_retrieve
-
             batch_size = 100  # Maximum batch size per API request
             papers_retrieved_for_term = 0
-            start = 0
+            start = plan_start(encoded_query, first_entries, total_results)
+            # The skipped results were submitted after the cutoff, so they aren't available to retrieve
+            num_papers_to_retrieve = total_results - start
+            total_papers_to_retrieve += num_papers_to_retrieve
+            term_total_results += num_papers_to_retrieve
             while (
                 papers_retrieved_for_term < num_papers_to_retrieve and start < total_results
             ):
@@ -278,25 +489,23 @@ def main():
                 for paper in results:
                     submitted_date = paper.published[:10]
                     # Filter papers submitted after July 31, 2024
-                    if submitted_date > '2024-07-31':
+                    if submitted_date > LAST_SUBMITTED:
                         continue
-                    arxiv_id = paper.id.split('/abs/')[-1]
-                    if arxiv_id in existing_ids or arxiv_id in all_data:
-                        duplicates.add(arxiv_id)
+                    arxiv_id = arxiv_ids.arxiv_id_from_url(paper.id)
+                    # A newer version of a paper we already have replaces it; the same or an older one is skipped
+                    if not seen_ids.add(arxiv_id):
+                        duplicates.add(arxiv_ids.base_id(arxiv_id))
                         continue
                     else:
-                        all_data[arxiv_id] = {
-                            'Title': paper.title.strip().replace('\n', ' '),
-                            'Authors': ', '.join(
-                                author.name for author in paper.authors
-                            ),
-                            'Abstract': paper.summary.strip().replace('\n', ' '),
-                            'arXiv ID': arxiv_id,
-                            'PDF_Link': f"https://arxiv.org/pdf/{arxiv_id}",
-                            'Submitted': submitted_date
-                        }
-                        papers_retrieved_for_term += 1
-                        total_papers_retrieved += 1
+                        # A newer version only replaces a paper that was already counted
+                        is_new = arxiv_ids.base_id(arxiv_id) not in all_data
+                        row = all_data[arxiv_ids.base_id(arxiv_id)] = row_from_entry(paper)
+                        # Share the metadata so later stages don't have to look it up again
+                        metadata_cache[arxiv_ids.base_id(arxiv_id)] = row
+                        store.upsert(row)
+                        if is_new:
+                            papers_retrieved_for_term += 1
+                            total_papers_retrieved += 1
 
                 # Save checkpoint after each batch to prevent data loss
                 combined_data = list(all_data.values())
@@ -306,13 +515,15 @@ def main():
                     )
                 else:
                     combined_df = pd.DataFrame(combined_data)
-                combined_df.drop_duplicates(subset=['arXiv ID'], inplace=True)
+                combined_df = pd.DataFrame(arxiv_ids.latest_rows(combined_df.to_dict('records')))
                 combined_df.to_csv(csv_filename, index=False)
                 print(f"Checkpoint saved with {len(combined_df)} records.")
 
                 time.sleep(3)  # Be polite to the API and avoid rate limiting
 
                 start += fetch_size  # Increment start index for the next batch
+                if results[-1].published[:10] < FIRST_SUBMITTED:
+                    break  # Sorted newest first, so the rest are before the window too
 
             if papers_retrieved_for_term == 0:
                 print(f"No papers retrieved for term '{term}'.")
@@ -323,6 +534,12 @@ def main():
         f"\nRetrieved a total of {total_papers_retrieved} papers out of "
         f"{total_papers_to_retrieve} available."
     )
+    if skip_stats['skipped']:
+        # Scanning from the start would have downloaded these in batches of 100 just to drop them
+        print(
+            f"Skipped {skip_stats['skipped']} results submitted after {LAST_SUBMITTED} (about "
+            f"{-(-skip_stats['skipped'] // 100)} batch requests) with {skip_stats['probes']} one-result probes."
+        )
 
     # Save final data after processing all terms
     combined_data = list(all_data.values())
@@ -332,12 +549,14 @@ def main():
         )
     else:
         combined_df = pd.DataFrame(combined_data)
-    combined_df.drop_duplicates(subset=['arXiv ID'], inplace=True)
+    combined_df = pd.DataFrame(arxiv_ids.latest_rows(combined_df.to_dict('records')))
     combined_df.to_csv(csv_filename, index=False)
+    arxiv_metadata.save_cache(metadata_cache)
     print(
         f"\nFinal data saved to {csv_filename} with "
         f"{len(combined_df)} unique records."
     )
+    tracing.print_summary()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,245 @@
+"""
+Local inverted index over harvested titles and abstracts, for trying out search terms.
+
+Instead of spelling out every variant of a term and going back to the arXiv API to
+see what it finds, load the papers we have already harvested and query them here:
+
+    python title_index.py data_arxiv.csv -q 'align* OR misalign*' -q '"model organism*"'
+    python title_index.py data_arxiv.csv          # type queries, one per line
+
+Queries use a syntax close to the arXiv API:
+    word       whole word                      align* - any word starting with align
+    "a b"      phrase (words may end in *)     a b    - both (same as a AND b)
+    a OR b     either                          a AND NOT b, a ANDNOT b - a but not b
+    ( ... )    grouping                        ti:word, abs:word, all:word - field to search
+A field also applies to a phrase (abs:"reward model") or a group (ti:(a OR b)); inside
+a group, words without their own field use the group's. Words are matched
+case-insensitively. Without a field, the title is searched, as in our arXiv searches.
+"""
+
+import argparse
+import bisect
+import csv
+import re
+import sys
+import time
+from collections import defaultdict
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+QUERY_TOKEN_RE = re.compile(
+    r'\s*(?:((?:ti|abs|all):)?(\()|(\))|((?:ti|abs|all):)?"([^"]*)"|((?:ti|abs|all):)?([^\s()"]+))'
+)
+FIELDS = {'ti': 'Title', 'abs': 'Abstract'}
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower())
+
+class InvertedIndex:
+    def __init__(self):
+        self.papers = []  # doc ID -> row
+        # field -> term -> doc ID -> positions of the term in that field
+        self.postings = {field: defaultdict(dict) for field in FIELDS}
+        self.sorted_terms = {}
+
+    def add(self, row):
+        doc = len(self.papers)
+        self.papers.append(row)
+        for field, column in FIELDS.items():
+            for position, term in enumerate(tokenize(row.get(column) or '')):
+                self.postings[field][term].setdefault(doc, []).append(position)
+        self.sorted_terms = {}  # Rebuilt on the next query
+
+    def terms(self, field, word):
+        """The terms in the dictionary that a query word matches: itself, or every term with the prefix for word*."""
+        if not word.endswith('*'):
+            return [word] if word in self.postings[field] else []
+        if field not in self.sorted_terms:
+            self.sorted_terms[field] = sorted(self.postings[field])
+        terms = self.sorted_terms[field]
+        prefix = word[:-1]
+        start = bisect.bisect_left(terms, prefix)
+        end = bisect.bisect_left(terms, prefix + '\uffff')
+        return terms[start:end]
+
+    def positions(self, field, word):
+        """doc ID -> positions for every term a query word matches."""
+        matches = defaultdict(set)
+        for term in self.terms(field, word):
+            for doc, positions in self.postings[field][term].items():
+                matches[doc].update(positions)
+        return matches
+
+    def phrase(self, field, words):
+        """doc IDs where the words appear next to each other, in order."""
+        first, *rest = [self.positions(field, word) for word in words]
+        docs = set()
+        for doc, starts in first.items():
+            candidates = starts
+            for offset, following in enumerate(rest, 1):
+                if doc not in following:
+                    candidates = set()
+                    break
+                candidates = {start for start in candidates if start + offset in following[doc]}
+            if candidates:
+                docs.add(doc)
+        return docs
+
+    def match(self, field, words):
+        fields = list(FIELDS) if field == 'all' else [field]
+        docs = set()
+        for field in fields:
+            if len(words) == 1:
+                docs.update(self.positions(field, words[0]))
+            else:
+                docs.update(self.phrase(field, words))
+        return docs
+
+    def search(self, query):
+        """Returns the rows matching a query, in the order they were added."""
+        parser = QueryParser(query, self)
+        docs = parser.parse()
+        return [self.papers[doc] for doc in sorted(docs)]
+
+class QueryParser:
+    """Recursive descent parser that evaluates a query to a set of doc IDs as it goes."""
+
+    def __init__(self, query, index):
+        self.index = index
+        self.tokens = []
+        position = 0
+        query = query.strip()
+        while position < len(query):
+            found = QUERY_TOKEN_RE.match(query, position)
+            if not found or found.end() == position:
+                raise ValueError(f"Can't parse query at: {query[position:]}")
+            self.tokens.append(found.groups())
+            position = found.end()
+            while position < len(query) and query[position].isspace():
+                position += 1
+        self.position = 0
+        self.field = 'ti'  # For words without a field of their own; changed inside ti:( ... ) groups
+
+    def peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else None
+
+    def keyword(self, token):
+        # Returns AND/OR/NOT/ANDNOT if the token is an operator
+        if token and token[6] in ('AND', 'OR', 'NOT', 'ANDNOT') and not token[5]:
+            return token[6]
+        return None
+
+    def parse(self):
+        docs = self.parse_or()
+        if self.peek() is not None:
+            raise ValueError("Unexpected ')' in query")
+        return docs
+
+    def parse_or(self):
+        docs = self.parse_and()
+        while self.keyword(self.peek()) == 'OR':
+            self.position += 1
+            docs = docs | self.parse_and()
+        return docs
+
+    def parse_and(self):
+        docs = self.parse_not()
+        while True:
+            token = self.peek()
+            keyword = self.keyword(token)
+            if keyword == 'AND':
+                self.position += 1
+                docs = docs & self.parse_not()
+            elif keyword == 'ANDNOT':
+                self.position += 1
+                docs = docs - self.parse_atom()
+            elif token is not None and token[2] is None and keyword != 'OR':
+                docs = docs & self.parse_not()  # Words next to each other are combined with AND
+            else:
+                return docs
+
+    def parse_not(self):
+        if self.keyword(self.peek()) == 'NOT':
+            self.position += 1
+            return set(range(len(self.index.papers))) - self.parse_atom()
+        return self.parse_atom()
+
+    def parse_atom(self):
+        token = self.peek()
+        if token is None:
+            raise ValueError("Query ended unexpectedly")
+        self.position += 1
+        group_field, open_paren, close_paren, phrase_field, phrase, word_field, word = token
+        if open_paren:
+            outer_field = self.field
+            if group_field:
+                self.field = group_field[:-1]
+            docs = self.parse_or()
+            self.field = outer_field
+            if self.peek() is None or not self.peek()[2]:
+                raise ValueError("Missing ')' in query")
+            self.position += 1
+            return docs
+        if close_paren:
+            raise ValueError("Unexpected ')' in query")
+        if word in ('ti:', 'abs:', 'all:'):
+            raise ValueError(f"Nothing to search for after {word}")
+        field = (phrase_field or word_field)[:-1] if (phrase_field or word_field) else self.field
+        text = phrase if phrase is not None else word
+        words = [w for w in (part.lower() for part in text.split()) if w]
+        # Split words the same way as the indexed text, keeping a trailing * for prefix matches
+        terms = []
+        for w in words:
+            pieces = tokenize(w)
+            if w.endswith('*') and pieces:
+                pieces[-1] += '*'
+            terms.extend(pieces)
+        if not terms:
+            return set()
+        return self.index.match(field, terms)
+
+def load_csv(paths):
+    index = InvertedIndex()
+    seen = set()
+    for path in paths:
+        with open(path, 'r', newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                key = row.get('arXiv ID') or row.get('URL') or row.get('Title')
+                if key in seen:
+                    continue
+                seen.add(key)
+                index.add(row)
+    return index
+
+def run_query(index, query, show):
+    start = time.perf_counter()
+    try:
+        results = index.search(query)
+    except ValueError as e:
+        print(f"Error: {e}")
+        return
+    elapsed = 1000 * (time.perf_counter() - start)
+    print(f"{query}: {len(results)} papers ({elapsed:.1f} ms)")
+    for row in results[:show]:
+        print(f"    {row.get('Title', '')}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Search harvested titles and abstracts.")
+    parser.add_argument('files', nargs='+', help="CSVs with Title and Abstract columns, e.g. from from_arxiv.py")
+    parser.add_argument('-q', '--query', action='append', help="Query to run. Without this, queries are read from stdin.")
+    parser.add_argument('--show', type=int, default=10, help="Number of matching titles to print")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    index = load_csv(args.files)
+    print(f"Indexed {len(index.papers)} papers in {time.perf_counter() - start:.1f} s.")
+
+    if args.query:
+        for query in args.query:
+            run_query(index, query, args.show)
+    else:
+        for line in sys.stdin:
+            if line.strip():
+                run_query(index, line.strip(), args.show)
+
+if __name__ == "__main__":
+    main()
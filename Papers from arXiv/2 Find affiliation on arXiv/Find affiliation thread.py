@@ -6,40 +6,104 @@ Created on Fri Aug 16 12:13:10 2024
 @author: oliverguest
 """
 
+import argparse
+import os
 import pandas as pd
 import requests
 import io
-import fitz  # PyMuPDF
 import re
-from anthropic import Anthropic
+from anthropic import Anthropic, APIConnectionError, APIStatusError, APITimeoutError
+import sys
 import time
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from functools import partial
 
-api_key = input("Please enter your Anthropic API key: ")
-client = Anthropic(api_key=api_key)
+# Shared helpers live in the "Shared code" folder at the top of the repository
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'Shared code'))
+from paper_store import PaperStore
+import arxiv_ids
+import arxiv_metadata
+import tracing
+from aimd import AIMDController, export_trace
+from budget import Budget, known_company_authors, prior
+import rate_limit
+from work_queue import WorkQueue
+from pdf_header import HeaderExtractor, blocks_text
+import affiliation_sources
 
-# Define the maximum number of threads
-MAX_WORKERS = 6  # Adjust based on your system and API rate limits
+# Set up in main(), so that importing this file (e.g. in the PDF worker processes) doesn't ask for the key
+client = None
+header_extractor = None
+budget = Budget()  # Replaced in main() with the limits from the command line
 
+# Papers in progress at once. The number of requests actually in flight is set by the controllers below.
+MAX_WORKERS = 64
+# Number of processes for reading the PDFs, which is CPU-bound
+PDF_PROCESSES = os.cpu_count()
+
+# Status of each paper, in the Affiliation_status column. A paper goes from pending to downloaded
+# (we have the text of its author block) to done, or stops at filtered (no company mentioned)
+# or permanent_failure. Papers in RETRY_STATUSES are tried again on the next run, up to MAX_ATTEMPTS times.
+PENDING = 'pending'
+DOWNLOADED = 'downloaded'
+FILTERED = 'filtered'
+LLM_FAILED_TRANSIENT = 'llm_failed_transient'
+DONE = 'done'
+PERMANENT_FAILURE = 'permanent_failure'
+RETRY_STATUSES = {PENDING, DOWNLOADED, LLM_FAILED_TRANSIENT}
+MAX_ATTEMPTS = 5
+BUDGET_SPENT = "Budget spent before the LLM step"  # Not counted as an attempt
+STATUS_COLUMNS = ['Affiliation_status', 'Affiliation_attempts', 'Affiliation_last_attempt', 'Affiliation_error']
+
+LLM_ATTEMPTS = 4  # Tries per LLM call when the API says it's overloaded
+CONCURRENCY_TRACE = 'concurrency_trace.csv'
+
+def download_overloaded(error):
+    if isinstance(error, requests.exceptions.Timeout):
+        return True
+    return (isinstance(error, requests.exceptions.HTTPError) and error.response is not None
+            and error.response.status_code in (429, 503))
+
+def llm_overloaded(error):
+    if isinstance(error, APITimeoutError):
+        return True
+    return isinstance(error, APIStatusError) and error.status_code in (429, 529)
+
+# Downloads and LLM calls have separate limits on requests in flight, which adapt to how the servers respond
+download_controller = AIMDController('download', initial=4, maximum=32, is_overload=download_overloaded)
+llm_controller = AIMDController('llm', initial=4, maximum=50, is_overload=llm_overloaded)
+
+@tracing.traced()
 def download_pdf(url, session, max_attempts=3):
+    """Returns the PDF, or None if it couldn't be downloaded. Raises HTTPError for errors that retrying won't fix."""
     for attempt in range(max_attempts):
         try:
-            response = session.get(url, timeout=10)
-            response.raise_for_status()  # Raise an exception for HTTP errors
+            with download_controller.slot():
+                response = session.get(url, timeout=10)
+                response.raise_for_status()  # Raise an exception for HTTP errors
+            tracing.annotate(bytes=len(response.content), attempts=attempt + 1)
             return io.BytesIO(response.content)
+        except requests.exceptions.HTTPError as e:
+            # e.g. 404 for a withdrawn paper
+            if 400 <= e.response.status_code < 500 and e.response.status_code != 429:
+                raise
+            print(f"Attempt {attempt + 1} failed: {e}. Retrying...")
+            time.sleep(1)
         except requests.exceptions.RequestException as e:
             print(f"Attempt {attempt + 1} failed: {e}. Retrying...")
             time.sleep(1)  # Wait for 1 second before retrying
     print(f"Failed to download PDF after {max_attempts} attempts for URL: {url}")
     return None
 
+@tracing.traced()
 def extract_first_page_text(pdf_content):
+    # Only the title, author and affiliation parts of the first page, extracted in a worker process
     try:
-        with fitz.open(stream=pdf_content, filetype="pdf") as doc:
-            if len(doc) > 0:
-                page = doc.load_page(0)
-                return page.get_text()
+        blocks = header_extractor.extract(pdf_content.getvalue())
+        text = blocks_text(blocks)
+        tracing.annotate(blocks=len(blocks), chars=len(text))
+        return text
     except Exception as e:
         print(f"Error extracting text from PDF: {e}")
     return ""
@@ -51,116 +115,350 @@ def check_companies(text):
     companies = ["openai", "anthropic", "google", "deepmind"]
     return any(company in text for company in companies)
 
+def create_message(**kwargs):
+    """Calls the API within the LLM controller's and the shared rate limits, retrying with backoff when it says it's overloaded."""
+    delay = 2
+    for attempt in range(LLM_ATTEMPTS):
+        try:
+            # Limits shared with every other process using the same API key
+            estimate = rate_limit.estimate_tokens(
+                kwargs.get('system', ''), *(message['content'] for message in kwargs['messages']),
+                max_tokens=kwargs['max_tokens'],
+            )
+            # The slot is taken after the rate limiter lets the request through, so time spent waiting
+            # for the shared buckets doesn't hold a slot or count as LLM latency in the controller
+            with rate_limit.limited('anthropic', estimate) as usage, llm_controller.slot():
+                response = client.messages.create(**kwargs)
+                usage['tokens'] = response.usage.input_tokens + response.usage.output_tokens
+                return response
+        except Exception as e:
+            if not llm_overloaded(e) or attempt == LLM_ATTEMPTS - 1:
+                raise
+            time.sleep(delay)
+            delay *= 2
+
+@tracing.traced()
 def get_affiliation_1(text):
-    try:
-        response = client.messages.create(
-            model="claude-3-5-sonnet-20240620",
-            max_tokens=256,
-            temperature=0,
-            system="You will see text taken from the first page of a journal article. Your answer will be the affiliation or affiliations of the first author, such as their university or company. Write a few tokens before saying the institution so that you have more time to think. If the answer is unclear, say that.",
-            messages=[
-                {"role": "user", "content": text}
-            ]
-        )
-        return response.content[0].text.strip()
-    except Exception as e:
-        return f"[LLM extraction failed: {str(e)}]"
+    response = create_message(
+        model="claude-3-5-sonnet-20240620",
+        max_tokens=256,
+        temperature=0,
+        system="You will see text taken from the first page of a journal article. Your answer will be the affiliation or affiliations of the first author, such as their university or company. Write a few tokens before saying the institution so that you have more time to think. If the answer is unclear, say that.",
+        messages=[
+            {"role": "user", "content": text}
+        ]
+    )
+    tracing.annotate(input_tokens=response.usage.input_tokens, output_tokens=response.usage.output_tokens)
+    budget.record(response.model, response.usage.input_tokens, response.usage.output_tokens)
+    return response.content[0].text.strip()
 
+@tracing.traced()
 def get_affiliation_2(text):
-    try:
-        response = client.messages.create(
-            model="claude-3-haiku-20240307",
-            max_tokens=256,
-            temperature=0,
-            system="What institution(s) does the first author belong to? Just write the institution(s) or '[Unclear]'. If there are multiple institutions, use \" · \" to separate them.",
-            messages=[
-                {"role": "user", "content": text}
-            ]
-        )
-        return response.content[0].text.strip()
-    except Exception as e:
-        return f"[LLM extraction failed: {str(e)}]"
+    response = create_message(
+        model="claude-3-haiku-20240307",
+        max_tokens=256,
+        temperature=0,
+        system="What institution(s) does the first author belong to? Just write the institution(s) or '[Unclear]'. If there are multiple institutions, use \" · \" to separate them.",
+        messages=[
+            {"role": "user", "content": text}
+        ]
+    )
+    tracing.annotate(input_tokens=response.usage.input_tokens, output_tokens=response.usage.output_tokens)
+    budget.record(response.model, response.usage.input_tokens, response.usage.output_tokens)
+    return response.content[0].text.strip()
+
+def is_transient(error):
+    # Rate limits, overloading, server errors and dropped connections usually go away if we try again later
+    if isinstance(error, APIConnectionError):
+        return True
+    if isinstance(error, APIStatusError):
+        return error.status_code in (408, 409, 429) or error.status_code >= 500
+    return False
+
+def outcome(status, affiliation_step_1='', institution='', error=''):
+    return {
+        'Affiliation_status': status,
+        'Affiliation_step_1': affiliation_step_1,
+        'Institution': institution,
+        'Affiliation_error': error,
+    }
 
-def process_paper(row, session):
+def status_from_institution(institution):
+    """The status of a row from before the status columns existed, going by what was written in Institution."""
+    if not isinstance(institution, str) or institution == '':
+        return PENDING
+    if institution == '[Not ODA]':
+        return FILTERED
+    if institution.startswith('[LLM extraction failed'):
+        return LLM_FAILED_TRANSIENT
+    if institution.startswith('[PDF processing failed'):
+        return PENDING
+    return DONE
+
+@tracing.traced()
+def process_paper(row, session, store):
+    """Finds the first author's affiliation. Returns the outcome() for the paper's columns."""
     print(f"Processing paper: {row['Title']}")
-    # Step 1: Get the text from the first page of the PDF
-    pdf_content = download_pdf(row['PDF_Link'], session)
-    if pdf_content is None:
-        return "[PDF processing failed]", "[PDF processing failed]"
+    tracing.annotate(paper=row['arXiv ID'])
+    # If the harvest's Atom feed had the first author's affiliation, that's the answer: nothing to download or ask
+    affiliations = arxiv_metadata.first_author_affiliations(row.get('Author_affiliations'))
+    if affiliations:
+        affiliation_sources.record('feed', 0)
+        tracing.annotate(source='feed', bytes=0)
+        return outcome(DONE, f"From the arXiv feed: {'; '.join(affiliations)}", " · ".join(affiliations))
+
+    # Step 1: Get the author block from the arXiv HTML or abstract page, and only download the PDF if neither has it
+    with download_controller.slot():
+        found = affiliation_sources.lookup(row['arXiv ID'], session)
+    if found.affiliations:
+        # Affiliations marked up in the page, so no need for the filter or the LLMs
+        affiliation_sources.record(found.source, found.bytes)
+        tracing.annotate(source=found.source, bytes=found.bytes)
+        return outcome(DONE, f"From the arXiv {found.source} page: {'; '.join(found.affiliations)}",
+                       " · ".join(found.affiliations))
 
-    first_page_text = extract_first_page_text(pdf_content)
+    if found.text:
+        first_page_text = found.text
+        source, downloaded, pdf_size = found.source, found.bytes, None
+    else:
+        try:
+            pdf_content = download_pdf(row['PDF_Link'], session)
+        except requests.exceptions.HTTPError as e:
+            affiliation_sources.record('failed', found.bytes)
+            return outcome(PERMANENT_FAILURE, error=f"PDF download failed: {e}")
+        if pdf_content is None:
+            affiliation_sources.record('failed', found.bytes)
+            return outcome(PENDING, error="PDF download failed")
+        pdf_size = len(pdf_content.getvalue())
+        source, downloaded = 'pdf', found.bytes + pdf_size
+        first_page_text = extract_first_page_text(pdf_content)
+    affiliation_sources.record(source, downloaded, pdf_size)
+    tracing.annotate(source=source, bytes=downloaded)
     if not first_page_text:
-        return "[PDF processing failed]", "[PDF processing failed]"
+        return outcome(PERMANENT_FAILURE, error="No text in the PDF")
+    store.upsert({'arXiv ID': row['arXiv ID'], 'Affiliation_status': DOWNLOADED})
 
     # Step 2: String filtering
     processed_text = process_text(first_page_text)
     if not check_companies(processed_text):
-        return "[ODA not mentioned on first page; discarded]", "[Not ODA]"
+        return outcome(FILTERED, "[ODA not mentioned on first page; discarded]", "[Not ODA]")
 
-    # Step 3: Using LLMs to identify institutions
-    affiliation_step_1 = get_affiliation_1(first_page_text)
-    if affiliation_step_1.startswith("[LLM extraction failed"):
-        return affiliation_step_1, affiliation_step_1
-
-    affiliation_step_2 = get_affiliation_2(affiliation_step_1)
-    if affiliation_step_2.startswith("[LLM extraction failed"):
-        return affiliation_step_1, affiliation_step_2
+    # Step 3: Using LLMs to identify institutions, unless the budget ran out while this paper was waiting
+    if budget.exhausted():
+        return outcome(DOWNLOADED, error=BUDGET_SPENT)
+    affiliation_step_1 = ''
+    try:
+        affiliation_step_1 = get_affiliation_1(first_page_text)
+        affiliation_step_2 = get_affiliation_2(affiliation_step_1)
+    except Exception as e:
+        status = LLM_FAILED_TRANSIENT if is_transient(e) else PERMANENT_FAILURE
+        return outcome(status, affiliation_step_1, error=f"LLM extraction failed: {e}")
 
-    return affiliation_step_1, affiliation_step_2
+    return outcome(DONE, affiliation_step_1, affiliation_step_2)
 
 def save_progress(df, file, count):
     df.to_csv(file, index=False)
     print(f"Processed {count} papers and saved to file.")
 
-def main():
-    # Define the file name here
-    file = "data_Sep_23.csv"
+RESULT_COLUMNS = ['Affiliation_step_1', 'Institution'] + STATUS_COLUMNS
+SHARD_SIZE = 50  # Papers per shard in distributed mode
 
-    # Load the CSV file
-    df = pd.read_csv(file)
+def prepare(df):
+    """Adds the result columns to a harvest CSV if they're missing, and a status for rows from before there was one."""
+    for column in RESULT_COLUMNS:
+        if column not in df.columns:
+            df[column] = ''
+        if column != 'Affiliation_attempts':
+            df[column] = df[column].astype(object)
+    no_status = df['Affiliation_status'].isna() | (df['Affiliation_status'] == '')
+    df.loc[no_status, 'Affiliation_status'] = df.loc[no_status, 'Institution'].map(status_from_institution)
+    df['Affiliation_attempts'] = pd.to_numeric(df['Affiliation_attempts'], errors='coerce').fillna(0).astype(int)
+    return df
 
-    # Ensure 'Affiliation_step_1' and 'Institution' columns exist
-    if 'Affiliation_step_1' not in df.columns:
-        df['Affiliation_step_1'] = ''
-    if 'Institution' not in df.columns:
-        df['Institution'] = ''
+def to_process(df):
+    # Only papers that aren't final yet and haven't used up their attempts
+    return df[df['Affiliation_status'].isin(RETRY_STATUSES) & (df['Affiliation_attempts'] < MAX_ATTEMPTS)]
 
-    # Initialize a requests session
-    session = requests.Session()
+def process_queue(df, queue, session, store, file, save_every=50):
+    """
+    Processes papers, most likely company papers first, until they're done or the budget is spent.
 
-    # Set how often to save the DataFrame
-    save_every = 50
-    counter = 0
+    Parameters:
+        df (pd.DataFrame): All papers. Results are written into it.
+        queue (pd.DataFrame): The rows of df to process.
+        session (requests.Session): For downloads.
+        store (PaperStore): Each result is upserted here as soon as it's ready.
+        file (str): Where df is saved every save_every papers.
 
-    # Prepare list of rows to process
-    rows_to_process = df[df['Institution'].isna() | (df['Institution'] == '')].to_dict('records')
+    Returns:
+        int: Papers left unprocessed because the budget ran out.
+    """
+    known_authors = known_company_authors(df[df['Affiliation_status'] == DONE].to_dict('records'))
+    queue = sorted(queue.iterrows(), key=lambda item: -prior(item[1], known_authors))
+    remaining = iter(queue)
+    left_in_queue = len(queue)
+    counter = 0
 
     with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        # Properly utilize partial to fix the unused 'process_func'
-        process_func = partial(process_paper, session=session)
-        
-        # Submit all tasks
-        future_to_index = {
-            executor.submit(process_func, row): index 
-            for index, row in df.iterrows() 
-            if pd.isna(row['Institution']) or row['Institution'] == ''
-        }
-
-        for future in as_completed(future_to_index):
-            row_index = future_to_index[future]  # Corrected mapping
-            try:
-                affiliation_1, affiliation_2 = future.result()
-                df.at[row_index, 'Affiliation_step_1'] = affiliation_1
-                df.at[row_index, 'Institution'] = affiliation_2
+        process_func = partial(process_paper, session=session, store=store)
+        future_to_index = {}
+
+        def submit_next():
+            # Papers are only started while there is budget left; the rest wait for the next run
+            nonlocal left_in_queue
+            if budget.exhausted():
+                return
+            index, row = next(remaining, (None, None))
+            if index is not None:
+                future_to_index[executor.submit(process_func, row)] = index
+                left_in_queue -= 1
+
+        for _ in range(MAX_WORKERS):
+            submit_next()
+
+        while future_to_index:
+            done, _ = wait(future_to_index, return_when=FIRST_COMPLETED)
+            for future in done:
+                row_index = future_to_index.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    # Something we didn't expect, so try again next time
+                    print(f"Error processing paper at index {row_index}: {e}")
+                    result = outcome(PENDING, error=repr(e))
+                attempts = int(df.at[row_index, 'Affiliation_attempts'])
+                if result['Affiliation_error'] == BUDGET_SPENT:
+                    left_in_queue += 1
+                else:
+                    attempts += 1
+                if result['Affiliation_status'] in RETRY_STATUSES and attempts >= MAX_ATTEMPTS:
+                    result['Affiliation_status'] = PERMANENT_FAILURE
+                    result['Affiliation_error'] = f"Gave up after {attempts} attempts. {result['Affiliation_error']}"
+                result['Affiliation_attempts'] = attempts
+                result['Affiliation_last_attempt'] = datetime.now(timezone.utc).isoformat(timespec='seconds')
+                for column, value in result.items():
+                    df.at[row_index, column] = value
+                store.upsert({'arXiv ID': df.at[row_index, 'arXiv ID'], **result})
                 counter += 1
                 if counter % save_every == 0:
                     save_progress(df, file, counter)
-            except Exception as e:
-                print(f"Error processing paper at index {row_index}: {e}")
+                submit_next()
+
+    return left_in_queue
 
-    # Save any remaining data
+def plan_shards(df, queue):
+    """Adds a shard for each range of SHARD_SIZE arXiv IDs that still have papers to process."""
+    ids = sorted(arxiv_ids.base_id(arxiv_id) for arxiv_id in to_process(df)['arXiv ID'])
+    shards = {}
+    for i in range(0, len(ids), SHARD_SIZE):
+        first, last = ids[i], ids[min(i + SHARD_SIZE, len(ids)) - 1]
+        shards[f"{first}_{last}"] = {'from': first, 'to': last}
+    print(f"Added {queue.add('affiliation', shards)} of {len(shards)} shards for {len(ids)} papers.")
+
+def merge_shards(df, queue, file, store):
+    """Writes the results from every shard into df and file. A paper done twice keeps its most final result."""
+    results = [pd.read_csv(path) for path in queue.result_files('affiliation')]
+    if not results:
+        print("No shard results to merge.")
+        return
+    results = pd.concat(results, ignore_index=True)
+    results['base_id'] = results['arXiv ID'].map(arxiv_ids.base_id)
+    rank = {DONE: 0, FILTERED: 0, PERMANENT_FAILURE: 1}
+    results['rank'] = results['Affiliation_status'].map(rank).fillna(2)
+    results = results.sort_values(['rank', 'Affiliation_last_attempt'], ascending=[True, False])
+    results = results.drop_duplicates(subset=['base_id']).set_index('base_id')
+
+    base_ids = df['arXiv ID'].map(arxiv_ids.base_id)
+    found = base_ids.isin(results.index)
+    for column in RESULT_COLUMNS:
+        df.loc[found, column] = base_ids[found].map(results[column]).values
     df.to_csv(file, index=False)
-    print(f"All papers processed and saved to file.")
+    store.upsert_many(df.loc[found, ['arXiv ID'] + RESULT_COLUMNS].to_dict('records'))
+    print(f"Merged results for {found.sum()} papers into {file}.")
+    print(df['Affiliation_status'].value_counts().to_string())
+
+def main():
+    global client, header_extractor, budget
+    parser = argparse.ArgumentParser(description="Find the first author's affiliation for each paper.")
+    parser.add_argument('--input', default="data_Sep_23.csv", help="CSV written by from_arxiv.py")
+    parser.add_argument('--output', help="CSV to write the results to. Defaults to updating the input file.")
+    parser.add_argument('--budget-tokens', type=int, help="Stop starting new papers after this many LLM tokens")
+    parser.add_argument('--budget-dollars', type=float, help="Stop starting new papers after spending this much")
+    parser.add_argument('--distributed', choices=['plan', 'work', 'merge'],
+                        help="Share the papers between several processes or machines through --queue: "
+                             "plan once, start any number of workers, then merge")
+    parser.add_argument('--queue', default='work_queue', help="Directory with the shared work queue")
+    args = parser.parse_args()
+    file = args.output or args.input
+    budget = Budget(tokens=args.budget_tokens, dollars=args.budget_dollars)
+
+    # Load the CSV file, with one row per paper even if it was harvested in more than one version
+    df = pd.read_csv(args.input)
+    df = pd.DataFrame(arxiv_ids.latest_rows(df.to_dict('records')), columns=df.columns)
+
+    # When writing to a separate file, keep the results from earlier runs and only process new papers
+    if file != args.input and os.path.exists(file):
+        previous = pd.read_csv(file)
+        previous = previous[['arXiv ID'] + [column for column in RESULT_COLUMNS if column in previous.columns]]
+        # Joined on the base ID, so results for an older version carry over to the newer one
+        previous['base_id'] = previous.pop('arXiv ID').map(arxiv_ids.base_id)
+        df = df.drop(columns=RESULT_COLUMNS, errors='ignore')
+        df['base_id'] = df['arXiv ID'].map(arxiv_ids.base_id)
+        df = df.merge(previous.drop_duplicates(subset=['base_id']), on='base_id', how='left').drop(columns=['base_id'])
+    df = prepare(df)
+
+    # Results are written to the shared paper store as soon as each paper is done
+    store = PaperStore()
+
+    if args.distributed == 'plan':
+        plan_shards(df, WorkQueue(args.queue))
+        return
+    if args.distributed == 'merge':
+        merge_shards(df, WorkQueue(args.queue), file, store)
+        return
+
+    api_key = os.getenv("ANTHROPIC_API_KEY") or input("Please enter your Anthropic API key: ")
+    # The SDK's own retries would hide the 429s that the LLM controller needs to see
+    client = Anthropic(api_key=api_key, max_retries=0)
+    header_extractor = HeaderExtractor(PDF_PROCESSES)
+
+    # Initialize a requests session
+    session = requests.Session()
+
+    if args.distributed == 'work':
+        queue = WorkQueue(args.queue)
+        base_ids = df['arXiv ID'].map(arxiv_ids.base_id)
+
+        def work(shard_id, shard, result_path):
+            # Each shard's results go to their own file, which merge combines
+            shard_df = df[(base_ids >= shard['from']) & (base_ids <= shard['to'])].copy()
+            left = process_queue(shard_df, to_process(shard_df), session, store, result_path)
+            shard_df[['arXiv ID'] + RESULT_COLUMNS].to_csv(result_path, index=False)
+            if left:
+                raise RuntimeError(f"Budget spent with {left} papers left in the shard")
+
+        print(f"Finished {queue.run('affiliation', work)} shards.")
+    else:
+        queue = to_process(df)
+        print(f"{len(queue)} papers to process; {len(df) - len(queue)} already final or out of attempts.")
+        left_in_queue = process_queue(df, queue, session, store, file)
+
+        # Save any remaining data
+        df.to_csv(file, index=False)
+        if left_in_queue:
+            print(f"Budget spent. {left_in_queue} papers are still queued; run again to continue.")
+        else:
+            print(f"All papers processed and saved to file.")
+        print(df['Affiliation_status'].value_counts().to_string())
+
+    print(budget.summary())
+    header_extractor.close()
+    affiliation_sources.print_summary()
+    print(download_controller.summary())
+    print(llm_controller.summary())
+    export_trace(CONCURRENCY_TRACE, [download_controller, llm_controller])
+    print(f"Concurrency over time saved to {CONCURRENCY_TRACE}.")
+    tracing.print_summary()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,140 @@
+"""
+Looks up a paper's first-author affiliation from the lightest representation that has it.
+
+Downloading the PDF just to read the header of its first page is the most expensive
+option, so we try cheaper sources first. (Before any of these, process_paper uses the
+affiliations from the arXiv feed that from_arxiv.py saved, when the first author has one.)
+    1. the arXiv HTML version (arxiv.org/html/<id>), read only up to the end of the author block.
+       LaTeXML marks affiliations up as ltx_role_affiliation, and otherwise the author block
+       text is still enough for the company filter and the LLM.
+    2. the <head> of the abstract page (arxiv.org/abs/<id>), for citation_author_institution tags.
+    3. the PDF (done by process_paper in Find affiliation thread.py, as before).
+
+Each lookup records which source answered and how many bytes it took, and
+print_summary() compares that with downloading every PDF.
+"""
+
+import threading
+from collections import Counter
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+TIMEOUT = 10  # seconds
+MAX_HTML_BYTES = 512 * 1024  # Stop reading an HTML page after this much even if the author block hasn't ended
+
+AUTHORS_STRAINER = SoupStrainer(class_='ltx_authors')
+META_STRAINER = SoupStrainer('meta')
+
+stats_lock = threading.Lock()
+source_counts = Counter()  # Which source answered
+source_bytes = Counter()   # Bytes downloaded, by source
+pdf_sizes = []             # Sizes of the PDFs we did download, to estimate the PDF-only total
+
+class Lookup:
+    """What the cheap sources found for one paper."""
+
+    def __init__(self):
+        self.affiliations = []  # First author's affiliations, if a source had them marked up
+        self.text = ''          # Otherwise, header text to use instead of the PDF's first page
+        self.source = None
+        self.bytes = 0
+
+def read_until(response, markers, limit):
+    """Reads a streamed response until one of the markers has been seen, and closes it."""
+    content = b''
+    try:
+        for chunk in response.iter_content(chunk_size=16 * 1024):
+            content += chunk
+            if any(marker in content for marker in markers) or len(content) >= limit:
+                break
+    finally:
+        response.close()
+    return content
+
+def from_html(arxiv_id, session, lookup):
+    response = session.get(f"https://arxiv.org/html/{arxiv_id}", timeout=TIMEOUT, stream=True)
+    if response.status_code != 200:
+        response.close()
+        return
+    # The abstract comes straight after the author block
+    content = read_until(response, [b'ltx_abstract', b'ltx_section'], MAX_HTML_BYTES)
+    lookup.bytes += len(content)
+    authors = BeautifulSoup(content, 'lxml', parse_only=AUTHORS_STRAINER)
+    first_author = authors.find(class_='ltx_role_author')
+    if first_author is None:
+        return
+    lookup.affiliations = [
+        ' '.join(tag.stripped_strings) for tag in first_author.find_all(class_='ltx_role_affiliation')
+    ]
+    lookup.text = '\n'.join(authors.stripped_strings)
+    lookup.source = 'html'
+
+def from_abs(arxiv_id, session, lookup):
+    response = session.get(f"https://arxiv.org/abs/{arxiv_id}", timeout=TIMEOUT, stream=True)
+    if response.status_code != 200:
+        response.close()
+        return
+    content = read_until(response, [b'</head>'], MAX_HTML_BYTES)
+    lookup.bytes += len(content)
+    head = BeautifulSoup(content, 'lxml', parse_only=META_STRAINER)
+    # Tags are in order: each author, followed by that author's institutions
+    affiliations = []
+    authors_seen = 0
+    for meta in head.find_all('meta'):
+        if meta.get('name') == 'citation_author':
+            authors_seen += 1
+            if authors_seen > 1:
+                break
+        elif meta.get('name') == 'citation_author_institution' and authors_seen == 1:
+            affiliations.append(meta.get('content', '').strip())
+    if affiliations:
+        lookup.affiliations = affiliations
+        lookup.source = 'abs'
+
+SOURCES = [('html', from_html), ('abs', from_abs)]
+
+def lookup(arxiv_id, session):
+    """
+    Tries the cheap sources in order until one has the first author's affiliation.
+
+    Parameters:
+        arxiv_id (str): The arXiv ID.
+        session (requests.Session): Session to download with.
+
+    Returns:
+        Lookup: affiliations if a source had them marked up; otherwise maybe header text from the
+        HTML version; otherwise nothing, and the PDF is needed.
+    """
+    result = Lookup()
+    for name, source in SOURCES:
+        try:
+            source(arxiv_id, session, result)
+        except Exception as e:
+            print(f"Couldn't read the {name} page for {arxiv_id}: {e}")
+        if result.affiliations:
+            break
+    return result
+
+def record(source, downloaded, pdf_size=None):
+    """Records which source answered for a paper and the bytes it took in total."""
+    with stats_lock:
+        source_counts[source] += 1
+        source_bytes[source] += downloaded
+        if pdf_size is not None:
+            pdf_sizes.append(pdf_size)
+
+def print_summary():
+    papers = sum(source_counts.values())
+    if not papers:
+        return
+    total = sum(source_bytes.values())
+    print("\nSources used for affiliations:")
+    for source, count in source_counts.most_common():
+        print(f"  {source}: {count} papers, {source_bytes[source] / count / 1024:.0f} KB per paper")
+    print(f"Downloaded {total / 1e6:.1f} MB in total, {total / papers / 1024:.0f} KB per paper.")
+    print(f"Resolved for free from the harvest's feed affiliations: {source_counts['feed']} of {papers} papers "
+          f"({100 * source_counts['feed'] / papers:.1f}%).")
+    if pdf_sizes:
+        average_pdf = sum(pdf_sizes) / len(pdf_sizes)
+        print(f"Downloading every PDF instead would have been about {average_pdf * papers / 1e6:.1f} MB "
+              f"({average_pdf / 1024:.0f} KB per paper, the average of the {len(pdf_sizes)} PDFs downloaded).")
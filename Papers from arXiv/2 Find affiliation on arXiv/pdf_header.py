@@ -0,0 +1,182 @@
+"""
+Extracts the header of the first page of a PDF (title, authors and affiliations) in worker processes.
+
+PyMuPDF's text extraction is CPU-bound and holds the GIL, so running it on the
+same thread pool as the downloads and LLM calls serialises it. HeaderExtractor
+runs it on a process pool instead, where each worker imports fitz once. Only
+the parts of page 0 where the author block and affiliations are printed are
+extracted, with minimal text flags, and the text blocks come back with their
+coordinates.
+
+To compare it with extracting the whole first page on a set of saved PDFs:
+    python pdf_header.py record data_arxiv.csv pdf_corpus --limit 200
+    python pdf_header.py benchmark pdf_corpus --processes 4
+"""
+
+import argparse
+import glob
+import multiprocessing
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# Parts of the page to extract, as fractions of its height. The top covers the title,
+# authors and affiliations in most templates. The bottom band is there because some
+# templates (e.g. ICML) put the affiliations in a footnote at the bottom of the first column.
+HEADER_REGIONS = [(0.0, 0.45), (0.8, 1.0)]
+
+COMPANIES = ["openai", "anthropic", "google", "deepmind"]
+
+fitz = None
+
+def init_worker():
+    # Imported once per worker process rather than for every PDF
+    global fitz
+    import fitz as pymupdf
+    fitz = pymupdf
+
+def extract_header_blocks(pdf_bytes, regions=HEADER_REGIONS):
+    """
+    Extracts the text blocks in the header regions of the first page.
+
+    Parameters:
+        pdf_bytes (bytes): The PDF.
+        regions (list): (top, bottom) fractions of the page height to extract.
+
+    Returns:
+        list: One dict per text block with its x0, y0, x1, y1 coordinates and text, top to bottom.
+    """
+    if fitz is None:
+        init_worker()
+    blocks = []
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+        if len(doc) == 0:
+            return blocks
+        page = doc.load_page(0)
+        rect = page.rect
+        seen = set()
+        for top, bottom in regions:
+            clip = fitz.Rect(rect.x0, rect.y0 + top * rect.height, rect.x1, rect.y0 + bottom * rect.height)
+            # No ligatures or whitespace preservation and no images: just the text
+            for x0, y0, x1, y1, text, block_no, block_type in page.get_text(
+                "blocks", clip=clip, flags=fitz.TEXT_MEDIABOX_CLIP, sort=True
+            ):
+                # A block that crosses into two regions is returned for both
+                key = (round(x0), round(y0))
+                if block_type == 0 and key not in seen and text.strip():
+                    seen.add(key)
+                    blocks.append({'x0': x0, 'y0': y0, 'x1': x1, 'y1': y1, 'text': text})
+    return blocks
+
+def blocks_text(blocks):
+    """Joins text blocks into the plain text that the rest of the affiliation stage uses."""
+    return '\n'.join(block['text'].strip() for block in blocks)
+
+class HeaderExtractor:
+    """Process pool for extract_header_blocks. Safe to call from many threads at once."""
+
+    def __init__(self, processes=None):
+        # Workers are started on demand from inside the download and LLM thread pool. Forking there
+        # would copy locks (imports, sqlite, logging) that other threads hold, so they are spawned instead.
+        self.executor = ProcessPoolExecutor(max_workers=processes or os.cpu_count(), initializer=init_worker,
+                                            mp_context=multiprocessing.get_context('spawn'))
+
+    def extract(self, pdf_bytes):
+        return self.executor.submit(extract_header_blocks, pdf_bytes).result()
+
+    def close(self):
+        self.executor.shutdown()
+
+def full_page_text(pdf_bytes):
+    # The previous approach in Find affiliation thread.py, for comparison
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+        if len(doc) > 0:
+            return doc.load_page(0).get_text()
+    return ""
+
+def mentions_company(text):
+    text = re.sub(r'\s+', '', text.lower())
+    return any(company in text for company in COMPANIES)
+
+def record(csv_file, directory, limit):
+    """Downloads PDFs listed in a harvest CSV, to benchmark on."""
+    import pandas as pd
+    import requests
+    os.makedirs(directory, exist_ok=True)
+    session = requests.Session()
+    for _, row in pd.read_csv(csv_file).head(limit).iterrows():
+        path = os.path.join(directory, row['arXiv ID'].replace('/', '_') + '.pdf')
+        if os.path.exists(path):
+            continue
+        try:
+            response = session.get(row['PDF_Link'], timeout=30)
+            response.raise_for_status()
+        except Exception as e:
+            print(f"Skipping {row['PDF_Link']}: {e}")
+            continue
+        with open(path, 'wb') as f:
+            f.write(response.content)
+        time.sleep(1)  # Be polite to arXiv
+
+def benchmark(directory, processes):
+    init_worker()
+    pdfs = []
+    for path in sorted(glob.glob(os.path.join(directory, '*.pdf'))):
+        with open(path, 'rb') as f:
+            pdfs.append(f.read())
+    if not pdfs:
+        print(f"No PDFs in {directory}.")
+        return
+    print(f"{len(pdfs)} PDFs, {sum(len(pdf) for pdf in pdfs) / 1e6:.1f} MB")
+
+    def timed(function):
+        start = time.perf_counter()
+        results = []
+        for pdf in pdfs:
+            try:
+                results.append(function(pdf))
+            except Exception:
+                results.append(None)
+        return results, time.perf_counter() - start
+
+    full, full_time = timed(full_page_text)
+    header, header_time = timed(lambda pdf: blocks_text(extract_header_blocks(pdf)))
+    print(f"Whole first page, 1 process:  {len(pdfs) / full_time:7.1f} papers/s per core")
+    print(f"Header regions, 1 process:    {len(pdfs) / header_time:7.1f} papers/s per core")
+
+    extractor = HeaderExtractor(processes)
+    extractor.extract(pdfs[0])  # Start the workers before timing
+    start = time.perf_counter()
+    list(extractor.executor.map(extract_header_blocks, pdfs, chunksize=4))
+    pool_time = time.perf_counter() - start
+    extractor.close()
+    print(f"Header regions, {processes} processes: {len(pdfs) / pool_time:7.1f} papers/s "
+          f"({len(pdfs) / pool_time / processes:.1f} per core)")
+
+    # The header is only useful if it still finds the papers that mention a company
+    both = [(f, h) for f, h in zip(full, header) if f is not None and h is not None]
+    found_full = sum(1 for f, _ in both if mentions_company(f))
+    found_header = sum(1 for f, h in both if mentions_company(f) and mentions_company(h))
+    print(f"Papers mentioning a company on the first page: {found_full}, "
+          f"of which found in the header regions: {found_header}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Record a PDF corpus or benchmark header extraction on it.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    record_parser = subparsers.add_parser('record', help="Download PDFs from a harvest CSV")
+    record_parser.add_argument('csv_file')
+    record_parser.add_argument('directory')
+    record_parser.add_argument('--limit', type=int, default=200)
+    benchmark_parser = subparsers.add_parser('benchmark', help="Compare whole-page and header extraction")
+    benchmark_parser.add_argument('directory')
+    benchmark_parser.add_argument('--processes', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    if args.command == 'record':
+        record(args.csv_file, args.directory, args.limit)
+    else:
+        benchmark(args.directory, args.processes)
+
+if __name__ == "__main__":
+    main()
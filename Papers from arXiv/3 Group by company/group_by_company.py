@@ -1 +1 @@
-import pandas as pd# Read the CSV filedf = pd.read_csv('data_Sep_23.csv')# Create dataframes for each companyanthropic_df = df[df['Institution'].str.contains('Anthropic', case=False, na=False)].copy()openai_df = df[df['Institution'].str.contains('OpenAI', case=False, na=False)].copy()gdm_df = df[df['Institution'].str.contains('DeepMind', case=False, na=False)].copy()# Function to process dataframedef process_df(df):    df['Company'] = df['Institution']  # Keep the exact Institution value    df['URL'] = df['PDF_Link']    df['Safety_category'] = ''    df = df[['Company', 'Title', 'URL', 'Safety_category', 'Abstract']]    return df# Process each dataframeanthropic_df = process_df(anthropic_df)openai_df = process_df(openai_df)gdm_df = process_df(gdm_df)# Check for overlapping papersall_dfs = [('Anthropic', anthropic_df), ('OpenAI', openai_df), ('GDM', gdm_df)]for i, (name1, df1) in enumerate(all_dfs):    for name2, df2 in all_dfs[i+1:]:        overlap = pd.merge(df1, df2, on='Title')        if not overlap.empty:            print(f"Warning: The following papers appear in both {name1} and {name2} dataframes:")            for _, row in overlap.iterrows():                print(f"  - {row['Title']}")                print(f"    Companies: {row['Company_x']} and {row['Company_y']}")# Export to CSVanthropic_df.to_csv('Anthropic.csv', index=False)openai_df.to_csv('OpenAI.csv', index=False)gdm_df.to_csv('GDM.csv', index=False)print("Processing complete. CSV files have been created.")
\ No newline at end of file
+import argparseimport pandas as pdparser = argparse.ArgumentParser(description="Split the papers with affiliations into one CSV per company.")parser.add_argument('--input', default='data_Sep_23.csv', help="CSV written by Find affiliation thread.py")args = parser.parse_args()# Read the CSV filedf = pd.read_csv(args.input)# Create dataframes for each companyanthropic_df = df[df['Institution'].str.contains('Anthropic', case=False, na=False)].copy()openai_df = df[df['Institution'].str.contains('OpenAI', case=False, na=False)].copy()gdm_df = df[df['Institution'].str.contains('DeepMind', case=False, na=False)].copy()# Function to process dataframedef process_df(df):    df['Company'] = df['Institution']  # Keep the exact Institution value    df['URL'] = df['PDF_Link']    df['Safety_category'] = ''    df = df[['Company', 'Title', 'URL', 'Safety_category', 'Abstract']]    return df# Process each dataframeanthropic_df = process_df(anthropic_df)openai_df = process_df(openai_df)gdm_df = process_df(gdm_df)# Check for overlapping papersall_dfs = [('Anthropic', anthropic_df), ('OpenAI', openai_df), ('GDM', gdm_df)]for i, (name1, df1) in enumerate(all_dfs):    for name2, df2 in all_dfs[i+1:]:        overlap = pd.merge(df1, df2, on='Title')        if not overlap.empty:            print(f"Warning: The following papers appear in both {name1} and {name2} dataframes:")            for _, row in overlap.iterrows():                print(f"  - {row['Title']}")                print(f"    Companies: {row['Company_x']} and {row['Company_y']}")# Export to CSVanthropic_df.to_csv('Anthropic.csv', index=False)openai_df.to_csv('OpenAI.csv', index=False)gdm_df.to_csv('GDM.csv', index=False)print("Processing complete. CSV files have been created.")
\ No newline at end of file
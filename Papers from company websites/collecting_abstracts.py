@@ -2,200 +2,455 @@
 # The input is links to webpages from those companies.
 
 import requests
-import xml.etree.ElementTree as ET
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from bs4 import BeautifulSoup, SoupStrainer
 from urllib.parse import urlparse
 import pandas as pd
 import json
+import os
+import hashlib
+import codecs
+from html.parser import HTMLParser
+import threading
+import time
 from tqdm.auto import tqdm
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor
+import sys
 
-#import dataframe from CSV. The CSV comes from exporting the "Export" sheet in the Google Sheet.
-df = pd.read_csv('ODA_papers.csv')
+# Shared helpers live in the "Shared code" folder at the top of the repository
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Shared code'))
+import arxiv_ids
+import arxiv_metadata
+from paper_store import PaperStore
+
+# Number of pages fetched at the same time across all sites
+MAX_WORKERS = 16
+# Number of pages fetched at the same time from any one site
+DOMAIN_LIMITS = {'export.arxiv.org': 1, 'arxiv.org': 2}
+DEFAULT_DOMAIN_LIMIT = 4
+TIMEOUT = 20  # seconds
+
+# Responses are kept on disk so that re-runs only download new or changed pages. Every cached page
+# is revalidated with If-None-Match / If-Modified-Since and only downloaded again if the server says
+# it changed. Pages whose server sent neither an ETag nor a Last-Modified can't be revalidated; those
+# are used as they are for CACHE_MAX_AGE and then downloaded again.
+CACHE_DIR = 'response_cache'
+CACHE_MAX_AGE = 7 * 24 * 60 * 60  # seconds
+
+session = requests.Session()
+session.mount('https://', HTTPAdapter(pool_maxsize=MAX_WORKERS))
+session.mount('http://', HTTPAdapter(pool_maxsize=MAX_WORKERS))
+
+domain_semaphores = {}
+domain_semaphores_lock = threading.Lock()
+
+def domain_semaphore(url):
+    domain = urlparse(url).netloc
+    with domain_semaphores_lock:
+        if domain not in domain_semaphores:
+            limit = DOMAIN_LIMITS.get(domain, DEFAULT_DOMAIN_LIMIT)
+            domain_semaphores[domain] = threading.BoundedSemaphore(limit)
+        return domain_semaphores[domain]
+
+def cache_paths(url):
+    key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+    return os.path.join(CACHE_DIR, key + '.body'), os.path.join(CACHE_DIR, key + '.json')
+
+def read_cache(url):
+    body_path, meta_path = cache_paths(url)
+    try:
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        with open(body_path, 'rb') as f:
+            return meta, f.read()
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None, None
+
+def write_cache(url, meta, content):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    body_path, meta_path = cache_paths(url)
+    # Write to temporary files first so an interrupted run never leaves a half-written entry
+    with open(body_path + '.tmp', 'wb') as f:
+        f.write(content)
+    with open(meta_path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+    os.replace(body_path + '.tmp', body_path)
+    os.replace(meta_path + '.tmp', meta_path)
+
+def fetch(url):
+    """Return the body of a URL as bytes, or None if it could not be fetched.
+
+    Uses the on-disk cache, revalidating cached entries, and limits how many requests go to each site at once."""
+    meta, content = read_cache(url)
+    can_revalidate = meta is not None and (meta.get('etag') or meta.get('last_modified'))
+    if meta is not None and not can_revalidate and time.time() - meta['fetched_at'] < CACHE_MAX_AGE:
+        return content
+
+    headers = {}
+    if meta is not None:
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+
+    with domain_semaphore(url):
+        response = session.get(url, headers=headers, timeout=TIMEOUT)
+
+    if response.status_code == 304 and meta is not None:
+        meta['fetched_at'] = time.time()
+        write_cache(url, meta, content)
+        return content
+    if response.status_code != 200:
+        return None
+
+    write_cache(url, {
+        'url': url,
+        'etag': response.headers.get('ETag'),
+        'last_modified': response.headers.get('Last-Modified'),
+        'fetched_at': time.time(),
+    }, response.content)
+    return response.content
+
+def fetch_all(function, items, desc):
+    """Apply function to every item on a thread pool, keeping the order of the results."""
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        return list(tqdm(executor.map(function, items), total=len(items), desc=desc))
 
 #Replacing company websites with arXiv links if the webpage links to one
 
+# Company page URL -> {'arxiv': the arXiv paper it links to with "Read paper", or None, plus the page's
+# ETag/Last-Modified and when it was checked}. Kept across runs; after LINK_MAX_AGE a page is requested
+# again conditionally, which costs a 304 if it hasn't changed, in case its link was added, fixed or removed.
+LINK_CACHE_FILE = 'arxiv_links.json'
+LINK_MAX_AGE = 30 * 24 * 60 * 60  # seconds
+link_cache_lock = threading.Lock()
+link_stats = {'cached': 0, 'not_modified': 0, 'stopped_early': 0, 'read_whole_page': 0, 'failed': 0}
+
+def load_link_cache():
+    try:
+        with open(LINK_CACHE_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def save_link_cache():
+    with link_cache_lock:
+        with open(LINK_CACHE_FILE + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(link_cache, f, indent=1)
+    os.replace(LINK_CACHE_FILE + '.tmp', LINK_CACHE_FILE)
+
+link_cache = load_link_cache()
+
+def count_link(what):
+    with link_cache_lock:
+        link_stats[what] += 1
+
+class ReadPaperFinder(HTMLParser):
+    """Finds the first arXiv link whose text or aria-label is "Read paper", as the page is fed in."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.found = None
+        self.anchor = None  # [href, text so far] of the arXiv link we're inside, if any
+
+    def handle_starttag(self, tag, attrs):
+        if tag != 'a' or self.found:
+            return
+        attrs = dict(attrs)
+        href = attrs.get('href') or ''
+        self.anchor = None
+        if 'arxiv.org' not in href:
+            return
+        if (attrs.get('aria-label') or '').lower() == 'read paper':
+            self.found = href
+        else:
+            self.anchor = [href, []]
+
+    def handle_data(self, data):
+        if self.anchor is not None:
+            self.anchor[1].append(data)
+
+    def handle_endtag(self, tag):
+        if tag == 'a' and self.anchor is not None:
+            if 'read paper' in ''.join(self.anchor[1]).lower():
+                self.found = self.anchor[0]
+            self.anchor = None
+
+def canonical_arxiv_url(href):
+    parsed = arxiv_ids.parse(href)
+    return f"https://arxiv.org/abs/{parsed[0]}" if parsed else href
+
 def find_arxiv_link_in_page(url):
-    """Fetch a webpage and look for a link to arXiv with specific link text or aria-label."""
+    """Look for a link to arXiv with "Read paper" as its text or aria-label, reading the page only as far as the link."""
+    with link_cache_lock:
+        entry = link_cache.get(url)
+    if entry is not None and time.time() - entry['checked_at'] < LINK_MAX_AGE:
+        count_link('cached')
+        return entry['arxiv']
+
+    headers = {}
+    if entry is not None:
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
     try:
-        response = requests.get(url)
-        if response.status_code == 200:
-            soup = BeautifulSoup(response.content, 'html.parser')
-            # Search for all 'a' tags to scrutinize individually
-            all_links = soup.find_all('a')
-            for link in all_links:
-                # Check if 'Read paper' is in the link text or 'aria-label' and the href contains 'arxiv.org'
-                if 'arxiv.org' in link.get('href', '') and ('read paper' in link.text.lower() or link.get('aria-label', '').lower() == 'read paper'):
-                    return link['href']
+        with domain_semaphore(url):
+            response = session.get(url, headers=headers, timeout=TIMEOUT, stream=True)
+            try:
+                if response.status_code == 304 and entry is not None:
+                    count_link('not_modified')
+                    with link_cache_lock:
+                        entry['checked_at'] = time.time()
+                    return entry['arxiv']
+                if response.status_code != 200:
+                    count_link('failed')
+                    return entry['arxiv'] if entry is not None else None
+                finder = ReadPaperFinder()
+                decoder = codecs.getincrementaldecoder(response.encoding or 'utf-8')(errors='replace')
+                chunks = []
+                for chunk in response.iter_content(chunk_size=16 * 1024):
+                    chunks.append(chunk)
+                    finder.feed(decoder.decode(chunk))
+                    if finder.found:
+                        break  # The rest of the page isn't needed
+            finally:
+                response.close()
     except Exception as e:
         print(f"Error fetching or parsing {url}: {e}")
-    return None
+        count_link('failed')
+        # Keep using what was found last time rather than losing a link to a network error
+        return entry['arxiv'] if entry is not None else None
+
+    meta = {
+        'url': url,
+        'etag': response.headers.get('ETag'),
+        'last_modified': response.headers.get('Last-Modified'),
+        'fetched_at': time.time(),
+    }
+    if finder.found:
+        count_link('stopped_early')
+        arxiv_url = canonical_arxiv_url(finder.found)
+    else:
+        count_link('read_whole_page')
+        arxiv_url = None
+        # The abstract is taken from this page, so keep it for fetch() rather than downloading it again
+        write_cache(url, meta, b''.join(chunks))
+    with link_cache_lock:
+        link_cache[url] = {'arxiv': arxiv_url, 'etag': meta['etag'], 'last_modified': meta['last_modified'],
+                           'checked_at': meta['fetched_at']}
+    return arxiv_url
+
+def process_url(url):
+    if 'arxiv.org' not in url:
+        arxiv_url = find_arxiv_link_in_page(url)
+        return arxiv_url if arxiv_url else url
+    return url
 
 def process_urls(urls):
     """Process a list of URLs, replacing specific links with their arXiv counterparts."""
-    updated_urls = []
-    for i, url in enumerate(urls, 1):  # Start counting from 1
-        if 'arxiv.org' not in url:
-            arxiv_url = find_arxiv_link_in_page(url)
-            updated_urls.append(arxiv_url if arxiv_url else url)
-        else:
-            updated_urls.append(url)
-        print(f"{i}/{len(urls)} done")
-    return updated_urls
+    processed = fetch_all(process_url, urls, "Resolving arXiv links")
+    save_link_cache()
+    print(f"arXiv links: {link_stats['cached']} from {LINK_CACHE_FILE}, {link_stats['not_modified']} unchanged (304), "
+          f"{link_stats['stopped_early']} found part way through the page, {link_stats['read_whole_page']} pages "
+          f"read in full without one, {link_stats['failed']} failed.")
+    return processed
+
 
-df['URL_processed'] = process_urls(df['URL'].tolist())
+# Extractors are registered per domain with the @extractor decorator. Each one declares what it needs:
+#   needs='url'  - the function gets the URL and does its own lookup (used for arXiv, which goes through the API)
+#   needs='soup' - the page is fetched and parsed with lxml, and the function gets the soup. parse_only is a
+#                  SoupStrainer (built once, when the extractor is registered) so that only the tags the
+#                  extractor looks at are put into the tree.
+EXTRACTORS = {}  # domain -> {'function', 'needs', 'parse_only'}
 
-# Save DataFrame
-df.to_csv('ODA_papers_processed.csv', index=False)
+# Per-extractor timing, so we can see which sites take the most time. Shown at the end of main().
+extractor_stats = {}
+extractor_stats_lock = threading.Lock()
 
+def extractor(domain, needs='soup', parse_only=None):
+    """Register a function that gets the abstract from pages on domain (and its subdomains)."""
+    def register(function):
+        EXTRACTORS[domain] = {'function': function, 'needs': needs, 'parse_only': parse_only}
+        extractor_stats[function.__name__] = {'calls': 0, 'fetch': 0.0, 'parse': 0.0}
+        return function
+    return register
+
+def find_extractor(url):
+    # Try www.anthropic.com, then anthropic.com, then com
+    labels = urlparse(url).netloc.lower().split('.')
+    for i in range(len(labels)):
+        registered = EXTRACTORS.get('.'.join(labels[i:]))
+        if registered is not None:
+            return registered
+    return None
+
+def record_time(function, fetch_time, parse_time):
+    with extractor_stats_lock:
+        stats = extractor_stats[function.__name__]
+        stats['calls'] += 1
+        stats['fetch'] += fetch_time
+        stats['parse'] += parse_time
+
+def print_extractor_stats():
+    print("Time spent per extractor (seconds):")
+    for name, stats in sorted(extractor_stats.items(), key=lambda item: -item[1]['parse']):
+        if stats['calls']:
+            print(f"  {name}: {stats['calls']} pages, {stats['fetch']:.1f} fetching, {stats['parse']:.1f} parsing "
+                  f"({1000 * stats['parse'] / stats['calls']:.1f} ms per page)")
 
 #function to get the title and abstract from an arXiv URL
 #I guess would be good to add the funtionality of switching back to the original URL once the processing is done
 
+# arXiv ID -> metadata, shared with from_arxiv.py. Filled in bulk by prefetch_arXiv before the abstracts are extracted.
+arxiv_cache = arxiv_metadata.load_cache()
+arxiv_cache_lock = threading.Lock()
+
+def prefetch_arXiv(urls):
+    """Look up every arXiv paper in a handful of id_list requests instead of one request per paper."""
+    ids = [arxiv_ids.arxiv_id_from_url(url) for url in urls if 'arxiv.org' in urlparse(url).netloc]
+    arxiv_metadata.fetch_metadata([arxiv_id for arxiv_id in ids if arxiv_id], cache=arxiv_cache)
+
+@extractor('arxiv.org', needs='url')
 def extract_arXiv(url):
     # Extract the arXiv ID from the URL
-    arxiv_id = url.split('/')[-1]
-    
-    # Define the arXiv API endpoint with the arXiv ID
-    api_url = f'http://export.arxiv.org/api/query?id_list={arxiv_id}'
-    
-    # Make the GET request to the arXiv API
-    response = requests.get(api_url)
-    
-    # Check if the request was successful
-    if response.status_code == 200:
-        # Parse the XML response
-        root = ET.fromstring(response.content)
-        
-        # Namespace dictionary to handle the arXiv namespace
-        ns = {'arxiv': 'http://www.w3.org/2005/Atom'}
-        
-        # Find the entry tag in the response
-        entry = root.find('arxiv:entry', ns)
-        
-        # Extract the title and abstract from the entry, remove leading and trailing whitespace
-        abstract = entry.find('arxiv:summary', ns).text.strip()
-        
-        return abstract
-    else:
-        return None
-    
-    #function to get the title and abstract from a DeepMind URL
-
-def extract_GDM(url):
-    response = requests.get(url)
-    if response.status_code == 200:
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        # Attempt to find the <h2> tag containing the text "Abstract"
-        abstract_heading = soup.find(lambda tag: tag.name == 'h2' and 'Abstract' in tag.text)
-        
-        # Check if the abstract heading was found before proceeding
-        if abstract_heading:
-            # Find the next <p> tag which is assumed to contain the abstract
-            abstract_paragraph = abstract_heading.find_next('p')
-            abstract = abstract_paragraph.text.strip() if abstract_paragraph else 'Abstract not found'
-        else:
-            abstract = 'Abstract not found'
-        
-        return abstract
-    else:
+    arxiv_id = arxiv_ids.arxiv_id_from_url(url)
+    if arxiv_id is None:
         return None
-    
-    #function to get the title and abstract from an OpenReview URL
-
-def extract_openreview(url):
-    response = requests.get(url)
-    if response.status_code == 200:
-        soup = BeautifulSoup(response.content, 'html.parser')
-        script_tag = soup.find('script', {'id': '__NEXT_DATA__'})
-        if script_tag:
-            data = json.loads(script_tag.string)
-            abstract = data['props']['pageProps']['forumNote']['content'].get('abstract', 'Abstract not found')
-        else:
-            abstract = 'Abstract not found'
-        
-        return abstract
+
+    # Usually already fetched by prefetch_arXiv; otherwise this makes a single request.
+    # The lock keeps to one arXiv API request at a time; the cache is saved at the end of main().
+    with arxiv_cache_lock:
+        record = arxiv_metadata.fetch_metadata([arxiv_id], cache=arxiv_cache, cache_file=None).get(arxiv_ids.base_id(arxiv_id))
+
+    if record is not None:
+        return record['Abstract']
     else:
         return None
-    
-    #function to get the title and abstract from an Anthropic URL
 
-def extract_Anthropic(url):
-    response = requests.get(url)
-    if response.status_code == 200:
-        soup = BeautifulSoup(response.text, 'html.parser')
+#function to get the title and abstract from a DeepMind URL
 
-        # Locate the abstract based on the <h4> tag using the 'string' argument instead of 'text'
-        abstract_marker = soup.find('h4', string='Abstract')
-        abstract = abstract_marker.find_next_sibling('p').text.strip() if abstract_marker else 'Abstract not found'
+def is_GDM_abstract_heading(tag):
+    return tag.name == 'h2' and 'Abstract' in tag.text
+
+@extractor('deepmind.google', parse_only=SoupStrainer(['h2', 'p']))
+def extract_GDM(soup):
+    # Attempt to find the <h2> tag containing the text "Abstract"
+    abstract_heading = soup.find(is_GDM_abstract_heading)
+
+    # Check if the abstract heading was found before proceeding
+    if abstract_heading:
+        # Find the next <p> tag which is assumed to contain the abstract
+        abstract_paragraph = abstract_heading.find_next('p')
+        return abstract_paragraph.text.strip() if abstract_paragraph else 'Abstract not found'
+    return 'Abstract not found'
+
+#function to get the title and abstract from an OpenReview URL
+
+@extractor('openreview.net', parse_only=SoupStrainer('script', id='__NEXT_DATA__'))
+def extract_openreview(soup):
+    script_tag = soup.find('script')
+    if script_tag:
+        data = json.loads(script_tag.string)
+        return data['props']['pageProps']['forumNote']['content'].get('abstract', 'Abstract not found')
+    return 'Abstract not found'
+
+#function to get the title and abstract from an Anthropic URL
+
+@extractor('anthropic.com', parse_only=SoupStrainer(['h4', 'p']))
+def extract_Anthropic(soup):
+    # Locate the abstract based on the <h4> tag using the 'string' argument instead of 'text'.
+    # Only <h4> and <p> tags are parsed, so the next <p> in the tree is the paragraph after the heading.
+    abstract_marker = soup.find('h4', string='Abstract')
+    abstract_paragraph = abstract_marker.find_next('p') if abstract_marker else None
+    return abstract_paragraph.text.strip() if abstract_paragraph else 'Abstract not found'
+
+#Note that the OAI pages are pretty inconsistent so this won't work for all of them.
+
+@extractor('openai.com')
+def extract_OAI(soup):
+    # Find the abstract. It's in the <div> following the <h2> tag containing "Abstract".
+    # This needs the whole tree because the <div> is found through its sibling.
+    abstract_heading = soup.find('h2', string='Abstract')
+    abstract_section = abstract_heading.find_next_sibling('div') if abstract_heading else None
+    return ' '.join(abstract_section.stripped_strings) if abstract_section else 'Abstract not found'
 
-        return abstract
-        
-    else:
-        return None
-    
-    #Note that the OAI pages are pretty inconsistent so this won't work for all of them.
-
-def extract_OAI(url):
-    response = requests.get(url)
-    if response.status_code == 200:
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        # Find the abstract. It's in the <div> following the <h2> tag containing "Abstract"
-        try:
-            abstract_section = soup.find('h2', string='Abstract').find_next_sibling('div')
-            abstract = ' '.join(abstract_section.stripped_strings) if abstract_section else 'Abstract not found'
-        except:
-            abstract = 'Abstract not found'
-        else:
-            abstract_section = soup.find('h2', string='Abstract').find_next_sibling('div')
-            abstract = ' '.join(abstract_section.stripped_strings) if abstract_section else 'Abstract not found'
-        
-        return abstract
-    else:
-        return None
-    
 # Function to extract the abstract from a given URL based on the domain
 def extract_abstract(url):
+    registered = find_extractor(url)
+    if registered is None:
+        return None  # Domain not recognized
+    function = registered['function']
     try:
-        # Check the domain and call the appropriate extraction function
-        domain = urlparse(url).netloc
-        if 'arxiv.org' in domain:
-            return extract_arXiv(url)
-        elif 'deepmind.google' in domain:
-            return extract_GDM(url)
-        elif 'anthropic.com' in domain:
-            return extract_Anthropic(url)
-        elif 'openai.com' in domain:
-            return extract_OAI(url)
-        elif 'openreview.net' in domain:
-            return extract_openreview(url)
-        else:
-            return None  # Domain not recognized
+        if registered['needs'] == 'url':
+            start = time.perf_counter()
+            abstract = function(url)
+            record_time(function, time.perf_counter() - start, 0.0)
+            return abstract
+
+        start = time.perf_counter()
+        content = fetch(url)
+        fetched = time.perf_counter()
+        if content is None:
+            record_time(function, fetched - start, 0.0)
+            return None
+        soup = BeautifulSoup(content, 'lxml', parse_only=registered['parse_only'])
+        abstract = function(soup)
+        record_time(function, fetched - start, time.perf_counter() - fetched)
+        return abstract
     except Exception as e:
         return None  # In case of an error, return None
 
-tqdm.pandas(desc="Extracting abstracts")
+# The columns of ODA_papers.csv that are saved to the paper store with each abstract
+STORE_COLUMNS = ['Company', 'Title', 'Date', 'URL', 'Safety_category']
+
+def extract_and_store(row, store):
+    """Extract the abstract of a row and save it to the paper store straight away."""
+    abstract = extract_abstract(row['URL_processed'])
+    # Keyed by the arXiv version of the paper where the page links to one; the store also remembers
+    # the company URL, so categorizing_papers.py finds the same row
+    store.upsert({**{column: row[column] for column in STORE_COLUMNS if column in row}, 'Abstract': abstract},
+                 url=row['URL_processed'])
+    return abstract
+
+def main():
+    #import dataframe from CSV. The CSV comes from exporting the "Export" sheet in the Google Sheet.
+    df = pd.read_csv('ODA_papers.csv')
+
+    df['URL_processed'] = process_urls(df['URL'].tolist())
+
+    # Save DataFrame
+    df.to_csv('ODA_papers_processed.csv', index=False)
+
+    prefetch_arXiv(df['URL_processed'].tolist())
+
+    # Fetch the abstracts concurrently, with a progress bar. Each one goes to the shared paper store as soon as it's found.
+    store = PaperStore()
+    df['Abstract'] = fetch_all(lambda row: extract_and_store(row, store), df.to_dict('records'), "Extracting abstracts")
+    arxiv_metadata.save_cache(arxiv_cache)
+    print_extractor_stats()
 
-# Use progress_apply instead of apply to see the progress bar
-df['Abstract'] = df['URL_processed'].progress_apply(extract_abstract)
+    # handle papers whose abstracts were added manually
+    manualDF  = pd.read_csv('Manually adding abstracts.csv',header=None,names=["URL","Abstract"])
 
-# handle papers whose abstracts were added manually
-manualDF  = pd.read_csv('Manually adding abstracts.csv',header=None,names=["URL","Abstract"])
+    # Merge the two DataFrames on the 'URL' column with a left join to keep all rows from `df`
+    combined_df = pd.merge(df, manualDF, on='URL', how='left', suffixes=('', '_manual'))
 
-# Merge the two DataFrames on the 'URL' column with a left join to keep all rows from `df`
-combined_df = pd.merge(df, manualDF, on='URL', how='left', suffixes=('', '_manual'))
+    # Where the 'Abstract_manual' is not null (meaning there is a manually added abstract),
+    # replace the 'Abstract' with the 'Abstract_manual' value
+    combined_df['Abstract'] = combined_df.apply(
+        lambda row: row['Abstract_manual'] if pd.notnull(row['Abstract_manual']) else row['Abstract'],
+        axis=1
+    )
+    # The manual abstracts replace the extracted ones in the paper store too
+    for row in combined_df[combined_df['Abstract_manual'].notnull()].to_dict('records'):
+        store.upsert({'URL': row['URL'], 'Abstract': row['Abstract']}, url=row['URL_processed'])
 
-# Where the 'Abstract_manual' is not null (meaning there is a manually added abstract), 
-# replace the 'Abstract' with the 'Abstract_manual' value
-combined_df['Abstract'] = combined_df.apply(
-    lambda row: row['Abstract_manual'] if pd.notnull(row['Abstract_manual']) else row['Abstract'],
-    axis=1
-)
+    # Drop the 'Abstract_manual' column as it's no longer needed
+    combined_df.drop(columns='Abstract_manual', inplace=True)
 
-# Drop the 'Abstract_manual' column as it's no longer needed
-combined_df.drop(columns='Abstract_manual', inplace=True)
+    # Write the updated DataFrame back to a CSV
+    combined_df.to_csv('ODA_papers_with_abstracts.csv', index=False)
 
-# Write the updated DataFrame back to a CSV
-combined_df.to_csv('ODA_papers_with_abstracts.csv', index=False)
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,375 @@
+# Finds the papers listed on the research pages of Anthropic, Google DeepMind and OpenAI, so that
+# ODA_papers.csv doesn't have to be put together by browsing the sites by hand.
+#
+# Each site is enumerated through its sitemap.xml and through its paginated listing pages, and every
+# candidate page is fetched (concurrently, a few at a time per site) for its title and date. What we
+# know about each URL is kept in crawl_state.json: the sitemap's <lastmod>, the ETag / Last-Modified
+# the server sent, and the row we made from the page. On the next run a page whose lastmod hasn't
+# changed isn't fetched at all, and the rest are fetched with If-None-Match / If-Modified-Since, so
+# only new or changed pages are downloaded. Listing pages are read until one has nothing new on it.
+#
+# The output has the columns of ODA_papers.csv, leaving out URLs that are already in it, and still
+# needs reviewing before the rows are added: it's a list of candidates.
+#
+# Usage:
+#   python crawl_listings.py                              # crawl all three sites
+#   python crawl_listings.py --sites Anthropic --record fixtures/   # and save every response
+#   python crawl_listings.py --fixtures fixtures/         # replay saved responses, no network
+#
+# tests/test_crawl_listings.py crawls the recorded pages in tests/fixtures/crawl twice.
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from urllib.parse import urljoin, urlparse
+
+import pandas as pd
+import requests
+from bs4 import BeautifulSoup, SoupStrainer
+from requests.adapters import HTTPAdapter
+from tqdm.auto import tqdm
+
+# Shared helpers live in the "Shared code" folder at the top of the repository
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Shared code'))
+from paper_store import canonical_url
+
+MAX_WORKERS = 16
+DOMAIN_LIMIT = 4  # Pages fetched at the same time from any one site
+TIMEOUT = 20  # seconds
+MAX_LISTING_PAGES = 200
+STATE_FILE = 'crawl_state.json'
+
+ODA_COLUMNS = ['Company', 'Title', 'Date', 'URL', 'Safety_category']
+
+# For each company: where its papers are listed, and which URLs are pages about a single paper.
+# Listing URLs have {page} for the page number; a listing without it is a single page.
+SITES = {
+    'Anthropic': {
+        'sitemaps': ['https://www.anthropic.com/sitemap.xml'],
+        'listings': ['https://www.anthropic.com/research'],
+        'paper_path': re.compile(r'^/research/[^/]+/?$'),
+        'title_suffixes': [' \\ Anthropic', ' | Anthropic'],
+    },
+    'Google DeepMind': {
+        'sitemaps': ['https://deepmind.google/sitemap.xml'],
+        'listings': ['https://deepmind.google/research/publications/?page={page}'],
+        'paper_path': re.compile(r'^/research/publications/\d+/?$'),
+        'title_suffixes': [' - Google DeepMind'],
+    },
+    'OpenAI': {
+        'sitemaps': ['https://openai.com/sitemap.xml'],
+        'listings': ['https://openai.com/research/index/?page={page}'],
+        # /research/index/ is the listing itself, not a paper
+        'paper_path': re.compile(r'^/(index|research)/(?!index/?$)[^/]+/?$'),
+        'title_suffixes': [' | OpenAI'],
+    },
+}
+
+# A page only counts as a paper if it links to one; the README's rule for leaving out blog posts
+PAPER_LINK_RE = re.compile(r'arxiv\.org/|openreview\.net/|doi\.org/|\.pdf($|\?)|proceedings\.|aclanthology\.org/', re.I)
+
+SITEMAP_NS = '{http://www.sitemaps.org/schemas/sitemap/0.9}'
+
+PAGE_STRAINER = SoupStrainer(['title', 'meta', 'h1', 'time', 'a'])
+
+class FixtureSession:
+    """Stands in for requests.Session, answering from responses saved with --record instead of the network."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, 'index.json'), 'r', encoding='utf-8') as f:
+            self.index = json.load(f)
+
+    def get(self, url, headers=None, timeout=None):
+        entry = self.index.get(url)
+        if entry is None:
+            return FixtureResponse(404, {}, b'')
+        response_headers = entry.get('headers', {})
+        etag = response_headers.get('ETag')
+        if etag and (headers or {}).get('If-None-Match') == etag:
+            return FixtureResponse(304, response_headers, b'')
+        with open(os.path.join(self.directory, entry['file']), 'rb') as f:
+            return FixtureResponse(entry.get('status', 200), response_headers, f.read())
+
+class FixtureResponse:
+    def __init__(self, status_code, headers, content):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+
+class Recorder:
+    """Saves every response to a directory in the layout FixtureSession reads."""
+
+    def __init__(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.path = os.path.join(directory, 'index.json')
+        self.lock = threading.Lock()
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.index = json.load(f)
+        except FileNotFoundError:
+            self.index = {}
+
+    def save(self, url, response):
+        if response.status_code != 200:
+            return
+        name = hashlib.sha256(url.encode('utf-8')).hexdigest()[:16] + '.html'
+        with open(os.path.join(self.directory, name), 'wb') as f:
+            f.write(response.content)
+        headers = {key: response.headers[key] for key in ('ETag', 'Last-Modified') if response.headers.get(key)}
+        with self.lock:
+            self.index[url] = {'file': name, 'status': response.status_code, 'headers': headers}
+            with open(self.path, 'w', encoding='utf-8') as f:
+                json.dump(self.index, f, indent=1)
+
+class Crawler:
+    def __init__(self, state, session, recorder=None):
+        self.state = state  # URL -> what we know about it, see the top of the file
+        self.session = session
+        self.recorder = recorder
+        self.semaphores = {}
+        self.lock = threading.Lock()
+        self.counts = {'fetched': 0, 'not_modified': 0, 'skipped': 0, 'failed': 0}
+
+    def count(self, what):
+        with self.lock:
+            self.counts[what] += 1
+
+    def semaphore(self, url):
+        domain = urlparse(url).netloc
+        with self.lock:
+            if domain not in self.semaphores:
+                self.semaphores[domain] = threading.BoundedSemaphore(DOMAIN_LIMIT)
+            return self.semaphores[domain]
+
+    def get(self, url, conditional=True):
+        """
+        Fetches a URL, with the validators from the last time it was fetched.
+
+        Returns:
+            bytes: The new content, or None if it hasn't changed (304) or couldn't be fetched.
+        """
+        entry = self.state.get(url, {})
+        headers = {}
+        if conditional and entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if conditional and entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        try:
+            with self.semaphore(url):
+                response = self.session.get(url, headers=headers, timeout=TIMEOUT)
+        except requests.exceptions.RequestException as e:
+            print(f"Error fetching {url}: {e}")
+            self.count('failed')
+            return None
+        if self.recorder is not None:
+            self.recorder.save(url, response)
+        if response.status_code == 304:
+            self.count('not_modified')
+            return None
+        if response.status_code != 200:
+            self.count('failed')
+            return None
+        self.count('fetched')
+        with self.lock:
+            entry = self.state.setdefault(url, {})
+            entry['etag'] = response.headers.get('ETag')
+            entry['last_modified'] = response.headers.get('Last-Modified')
+            entry['fetched_at'] = time.time()
+        return response.content
+
+    def sitemap_urls(self, sitemap_url, seen=None):
+        """Returns page URL -> lastmod (or None) from a sitemap, following sitemap indexes."""
+        seen = seen if seen is not None else set()
+        if sitemap_url in seen:
+            return {}
+        seen.add(sitemap_url)
+        # Sitemaps are small and change whenever a page is added, so always fetch them in full
+        content = self.get(sitemap_url, conditional=False)
+        if content is None:
+            return {}
+        try:
+            root = ET.fromstring(content)
+        except ET.ParseError as e:
+            print(f"Couldn't parse the sitemap {sitemap_url}: {e}")
+            return {}
+        pages = {}
+        if root.tag == SITEMAP_NS + 'sitemapindex':
+            for sitemap in root.iter(SITEMAP_NS + 'sitemap'):
+                pages.update(self.sitemap_urls(sitemap.findtext(SITEMAP_NS + 'loc', '').strip(), seen))
+        else:
+            for page in root.iter(SITEMAP_NS + 'url'):
+                pages[page.findtext(SITEMAP_NS + 'loc', '').strip()] = page.findtext(SITEMAP_NS + 'lastmod')
+        return pages
+
+    def listing_urls(self, listing, paper_path):
+        """Returns the paper URLs linked from a listing, page by page until a page has nothing we haven't seen."""
+        found = set()
+        for page in range(1, MAX_LISTING_PAGES + 1):
+            url = listing.format(page=page)
+            content = self.get(url, conditional=False)
+            if content is None:
+                break
+            soup = BeautifulSoup(content, 'lxml', parse_only=SoupStrainer('a'))
+            links = {urljoin(url, a['href']).split('#')[0] for a in soup.find_all('a', href=True)}
+            papers = {link for link in links if paper_path.match(urlparse(link).path)}
+            # Listings are newest first, so once a page has only papers from earlier runs, the rest will too
+            new = {link for link in papers if link not in found and 'row' not in self.state.get(link, {})}
+            found |= papers
+            if not new or '{page}' not in listing:
+                break
+        return found
+
+    def paper_row(self, url, company, lastmod, title_suffixes):
+        """Returns the candidate row for a paper page, fetching the page only if it may have changed."""
+        entry = self.state.get(url, {})
+        if 'row' in entry and lastmod is not None and entry.get('lastmod') == lastmod:
+            self.count('skipped')
+            return entry['row']
+        content = self.get(url)
+        if content is None:
+            return entry.get('row')  # Not modified, or failed this time: keep what we had
+        soup = BeautifulSoup(content, 'lxml', parse_only=PAGE_STRAINER)
+        row = {
+            'Company': company,
+            'Title': page_title(soup, title_suffixes),
+            'Date': page_date(soup),
+            'URL': url,
+            'Safety_category': '',
+            'links_to_paper': any(PAPER_LINK_RE.search(a['href']) for a in soup.find_all('a', href=True)),
+        }
+        with self.lock:
+            entry = self.state.setdefault(url, {})
+            entry['row'] = row
+            entry['lastmod'] = lastmod
+        return row
+
+    def crawl(self, company, site):
+        """Returns the candidate rows for one site."""
+        pages = {}
+        for sitemap in site['sitemaps']:
+            for url, lastmod in self.sitemap_urls(sitemap).items():
+                if site['paper_path'].match(urlparse(url).path):
+                    pages[url] = lastmod
+        for listing in site['listings']:
+            for url in self.listing_urls(listing, site['paper_path']):
+                pages.setdefault(url, None)
+        # Papers an earlier run found further down the listing than this run reads, revalidated with their ETag
+        for url, entry in list(self.state.items()):
+            if entry.get('row', {}).get('Company') == company:
+                pages.setdefault(url, None)
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            rows = list(tqdm(
+                executor.map(lambda item: self.paper_row(item[0], company, item[1], site['title_suffixes']),
+                             pages.items()),
+                total=len(pages), desc=company,
+            ))
+        return [row for row in rows if row is not None]
+
+def page_title(soup, suffixes):
+    meta = soup.find('meta', attrs={'property': 'og:title'}) or soup.find('meta', attrs={'name': 'citation_title'})
+    if meta is not None and meta.get('content'):
+        title = meta['content']
+    elif soup.find('h1') is not None:
+        title = soup.find('h1').get_text(' ', strip=True)
+    else:
+        title = soup.title.get_text(strip=True) if soup.title else ''
+    for suffix in suffixes:
+        if title.endswith(suffix):
+            title = title[:-len(suffix)]
+    return ' '.join(title.split())
+
+def page_date(soup):
+    """The publication date as in ODA_papers.csv (e.g. 17-Jun-24), or '' if the page doesn't give one."""
+    candidates = []
+    for name in ('article:published_time', 'citation_publication_date', 'citation_date', 'date'):
+        meta = soup.find('meta', attrs={'property': name}) or soup.find('meta', attrs={'name': name})
+        if meta is not None:
+            candidates.append(meta.get('content', ''))
+    candidates += [tag.get('datetime', '') or tag.get_text(strip=True) for tag in soup.find_all('time')]
+    for text in candidates:
+        parsed = parse_date(text)
+        if parsed is not None:
+            return f"{parsed.day}-{parsed:%b-%y}"
+    return ''
+
+def parse_date(text):
+    text = (text or '').strip()
+    for pattern in ('%Y-%m-%d', '%Y/%m/%d', '%b %d, %Y', '%B %d, %Y', '%d %b %Y', '%d %B %Y'):
+        try:
+            return datetime.strptime(text[:10] if pattern.startswith('%Y') else text, pattern).date()
+        except ValueError:
+            continue
+    return None
+
+def in_window(row, date_from, date_to):
+    # Rows without a date are kept for the manual review
+    if not row['Date']:
+        return True
+    day = datetime.strptime(row['Date'], '%d-%b-%y').date()
+    return date_from <= day <= date_to
+
+def load_state(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+def save_state(state, path):
+    # Write to a temporary file first so an interrupted run never leaves a half-written state
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+    os.replace(path + '.tmp', path)
+
+def main():
+    parser = argparse.ArgumentParser(description="Find candidate papers on the companies' research pages.")
+    parser.add_argument('--sites', nargs='+', choices=list(SITES), default=list(SITES))
+    parser.add_argument('--output', default='ODA_candidates.csv')
+    parser.add_argument('--known', default='ODA_papers.csv', help="Leave out URLs already in this file")
+    parser.add_argument('--state', default=STATE_FILE)
+    parser.add_argument('--date-from', type=date.fromisoformat, default=date(2022, 1, 1))
+    parser.add_argument('--date-to', type=date.fromisoformat, default=date(2024, 7, 31))
+    parser.add_argument('--all-pages', action='store_true', help="Include pages that don't link to a paper")
+    parser.add_argument('--fixtures', help="Directory of saved responses to crawl instead of the network")
+    parser.add_argument('--record', help="Directory to save every response to, for --fixtures")
+    args = parser.parse_args()
+
+    if args.fixtures:
+        session = FixtureSession(args.fixtures)
+    else:
+        session = requests.Session()
+        session.mount('https://', HTTPAdapter(pool_maxsize=MAX_WORKERS))
+    state = load_state(args.state)
+    crawler = Crawler(state, session, Recorder(args.record) if args.record else None)
+
+    rows = []
+    for company in args.sites:
+        rows += crawler.crawl(company, SITES[company])
+        save_state(state, args.state)
+    print(f"Pages fetched: {crawler.counts['fetched']}, unchanged (304): {crawler.counts['not_modified']}, "
+          f"skipped (same lastmod): {crawler.counts['skipped']}, failed: {crawler.counts['failed']}.")
+
+    known = set()
+    if os.path.exists(args.known):
+        known = {canonical_url(url) for url in pd.read_csv(args.known)['URL'].dropna()}
+    candidates = [
+        row for row in rows
+        if (args.all_pages or row['links_to_paper'])
+        and in_window(row, args.date_from, args.date_to)
+        and canonical_url(row['URL']) not in known
+    ]
+    pd.DataFrame(candidates, columns=ODA_COLUMNS).to_csv(args.output, index=False)
+    print(f"{len(rows)} paper pages found; {len(candidates)} candidates not in {args.known} written to {args.output}.")
+
+if __name__ == "__main__":
+    main()
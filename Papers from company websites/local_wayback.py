@@ -0,0 +1,132 @@
+# A local stand-in for the parts of the Wayback Machine that wayback_deepmind.py uses, for testing it offline.
+#
+# It serves a directory with captures.json, a list of captures such as
+#     {"original": "https://www.deepmind.com/publications/some-paper", "timestamp": "20220626233857",
+#      "statuscode": "200", "mimetype": "text/html", "file": "some-paper.html"}
+# and the HTML files they name. It answers:
+#     /cdx/search/cdx?url=<prefix>*&from=&to=&filter=&fl=&output=json&showNumPages=true&page=
+#         like the CDX API, with PAGE_SIZE captures per page so that paging is exercised too
+#     /web/<timestamp>id_/<original URL>
+#         with the file of that exact capture
+# Usage:
+#     python local_wayback.py captures/ --port 8766
+
+import argparse
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+PAGE_SIZE = 50
+FIELDS = ['urlkey', 'timestamp', 'original', 'mimetype', 'statuscode', 'digest', 'length']
+
+def strip_scheme(url):
+    # The CDX API matches on the URL without scheme or www.
+    url = url.split('://', 1)[-1]
+    return url[len('www.'):] if url.startswith('www.') else url
+
+class LocalWayback(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, directory):
+        super().__init__(address, WaybackHandler)
+        self.directory = directory
+        with open(os.path.join(directory, 'captures.json'), 'r', encoding='utf-8') as f:
+            self.captures = sorted(json.load(f), key=lambda capture: (strip_scheme(capture['original']), capture['timestamp']))
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def matching(self, params):
+        """The captures matching a CDX query, before paging."""
+        pattern = strip_scheme(params.get('url', [''])[0])
+        prefix = pattern.endswith('*')
+        pattern = pattern.rstrip('*')
+        # Timestamps are compared as strings, padded the way the CDX API pads partial dates
+        date_from = params.get('from', [''])[0].ljust(14, '0')
+        date_to = params.get('to', [''])[0].ljust(14, '9') if params.get('to') else '9' * 14
+        results = []
+        for capture in self.captures:
+            url = strip_scheme(capture['original'])
+            if not (url.startswith(pattern) if prefix else url.rstrip('/') == pattern.rstrip('/')):
+                continue
+            if not date_from <= capture['timestamp'] <= date_to:
+                continue
+            if all(matches_filter(capture, f) for f in params.get('filter', [])):
+                results.append(capture)
+        return results
+
+def matches_filter(capture, cdx_filter):
+    # e.g. statuscode:200, or !mimetype:text/css
+    negate = cdx_filter.startswith('!')
+    field, _, value = cdx_filter.lstrip('!').partition(':')
+    return (str(capture.get(field, '')) == value) != negate
+
+class WaybackHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def send(self, status, body, content_type):
+        data = body if isinstance(body, bytes) else body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        with self.server.lock:
+            self.server.requests += 1
+        parsed = urlparse(self.path)
+        if parsed.path == '/cdx/search/cdx':
+            self.cdx(parse_qs(parsed.query))
+        elif parsed.path.startswith('/web/'):
+            self.snapshot(self.path[len('/web/'):])
+        else:
+            self.send(404, 'Not found', 'text/plain')
+
+    def cdx(self, params):
+        results = self.server.matching(params)
+        pages = max(1, -(-len(results) // PAGE_SIZE))
+        if params.get('showNumPages', [''])[0] == 'true':
+            self.send(200, f"{pages}\n", 'text/plain')
+            return
+        if 'page' in params:
+            page = int(params['page'][0])
+            results = results[page * PAGE_SIZE:(page + 1) * PAGE_SIZE]
+        fields = params.get('fl', [','.join(FIELDS)])[0].split(',')
+        rows = [[str(capture.get(field, '')) for field in fields] for capture in results]
+        if params.get('output', [''])[0] == 'json':
+            self.send(200, json.dumps([fields] + rows if rows else []), 'application/json')
+        else:
+            self.send(200, ''.join(' '.join(row) + '\n' for row in rows), 'text/plain')
+
+    def snapshot(self, rest):
+        timestamp, _, original = rest.partition('/')
+        timestamp = timestamp.removesuffix('id_')
+        for capture in self.server.captures:
+            if capture['timestamp'] == timestamp and strip_scheme(capture['original']) == strip_scheme(original):
+                with open(os.path.join(self.server.directory, capture['file']), 'rb') as f:
+                    self.send(int(capture.get('statuscode', 200)), f.read(), capture.get('mimetype', 'text/html'))
+                return
+        self.send(404, 'No such capture', 'text/plain')
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve saved captures like the Wayback Machine's CDX API.")
+    parser.add_argument('directory', help="Directory with captures.json and the HTML files")
+    parser.add_argument('--port', type=int, default=8766)
+    args = parser.parse_args()
+    server = LocalWayback(('127.0.0.1', args.port), args.directory)
+    print(f"Serving {len(server.captures)} captures on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"{server.requests} requests served.")
+
+if __name__ == "__main__":
+    main()
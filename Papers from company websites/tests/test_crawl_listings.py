@@ -0,0 +1,80 @@
+# Crawls the saved Google DeepMind pages in fixtures/crawl twice, to check that the second run only
+# re-reads what it has to. Run with: python -m pytest tests
+#
+# The fixtures: a sitemap with papers 101 and 102 (and a page that isn't a paper), and two listing
+# pages, the second of which links to paper 103, which isn't in the sitemap. 102 is a blog post.
+
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from crawl_listings import Crawler, FixtureSession, SITES
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'crawl')
+LISTING = 'https://deepmind.google/research/publications/?page={page}'
+
+class CountingSession(FixtureSession):
+    """FixtureSession that remembers which URLs were asked for."""
+
+    def __init__(self, directory):
+        super().__init__(directory)
+        self.requested = []
+
+    def get(self, url, headers=None, timeout=None):
+        self.requested.append(url)
+        return super().get(url, headers=headers, timeout=timeout)
+
+def crawl(state):
+    session = CountingSession(FIXTURES)
+    crawler = Crawler(state, session)
+    rows = crawler.crawl('Google DeepMind', SITES['Google DeepMind'])
+    return crawler, session, {row['URL']: row for row in rows}
+
+def test_first_crawl_reads_everything():
+    crawler, session, rows = crawl({})
+    assert sorted(rows) == [f'https://deepmind.google/research/publications/{n}/' for n in (101, 102, 103)]
+    # The sitemap, listing pages 1 and 2, and the three papers; page 3 doesn't exist
+    assert crawler.counts == {'fetched': 6, 'not_modified': 0, 'skipped': 0, 'failed': 1}
+    assert LISTING.format(page=3) in session.requested
+
+    paper = rows['https://deepmind.google/research/publications/101/']
+    assert paper['Title'] == 'Scalable oversight with debate'
+    assert paper['Date'] == '30-Apr-24'
+    assert paper['links_to_paper']
+    blog_post = rows['https://deepmind.google/research/publications/102/']
+    assert blog_post['Date'] == '8-Mar-24'
+    assert not blog_post['links_to_paper']
+    assert rows['https://deepmind.google/research/publications/103/']['Date'] == '20-Mar-24'
+
+def test_second_crawl_only_revalidates():
+    state = {}
+    crawl(state)
+    crawler, session, rows = crawl(state)
+    assert len(rows) == 3
+    # 101 and 102 have the same lastmod in the sitemap, so they aren't requested at all
+    assert crawler.counts['skipped'] == 2
+    assert 'https://deepmind.google/research/publications/101/' not in session.requested
+    # 103 has no lastmod, so it is asked for with its ETag and comes back 304
+    assert crawler.counts['not_modified'] == 1
+    assert rows['https://deepmind.google/research/publications/103/']['Title'] == \
+        'Evaluating frontier models for dangerous capabilities'
+    # Listing page 1 has nothing new, so page 2 isn't read
+    assert LISTING.format(page=1) in session.requested
+    assert LISTING.format(page=2) not in session.requested
+    assert crawler.counts['fetched'] == 2  # The sitemap and listing page 1
+
+def test_changed_lastmod_is_fetched_again():
+    state = {}
+    crawl(state)
+    state['https://deepmind.google/research/publications/101/']['lastmod'] = '2024-01-01'
+    crawler, session, rows = crawl(state)
+    assert crawler.counts['skipped'] == 1
+    # Fetched with its ETag, and unchanged
+    assert crawler.counts['not_modified'] == 2
+
+def test_openai_listing_is_not_a_paper():
+    paper_path = SITES['OpenAI']['paper_path']
+    assert not paper_path.match('/research/index/')
+    assert not paper_path.match('/research/index')
+    assert paper_path.match('/index/weak-to-strong-generalization/')
+    assert paper_path.match('/research/language-models-can-explain-neurons-in-language-models')
@@ -0,0 +1,76 @@
+# Collects the archived DeepMind pages in fixtures/wayback through local_wayback.py, the stand-in for
+# the Wayback Machine. Run with: python -m pytest tests
+#
+# The fixtures: one paper captured three times (the last time with a 404), another paper, a
+# ?d907cb24_page=2 listing page, and enough images under the same prefix that the CDX results are paged.
+
+import functools
+import os
+import sys
+import threading
+
+import pandas as pd
+import pytest
+import requests
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import local_wayback
+import rate_limit
+import wayback_deepmind
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'wayback')
+DEBATE = 'deepmind.com/publications/ai-safety-via-debate'
+
+@pytest.fixture
+def wayback(tmp_path, monkeypatch):
+    monkeypatch.setattr(wayback_deepmind, 'CACHE_DIR', str(tmp_path / 'wayback_cache'))
+    # A rate limit database of its own, so the tests neither wait on nor use up the real one
+    db = str(tmp_path / 'rate_limits.sqlite')
+    monkeypatch.setattr(rate_limit, 'limited', functools.partial(rate_limit.limited, path=db))
+    rate_limit.set_limits('wayback', requests=1e9, path=db)
+    server = local_wayback.LocalWayback(('127.0.0.1', 0), FIXTURES)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+
+def test_cdx_query_reads_every_page(wayback):
+    captures = wayback_deepmind.cdx_query(requests.Session(), wayback.url, 'deepmind.com/research/', '20220101', '20240731')
+    # The tracr paper, the listing page and 55 images, over two pages of results
+    assert len(captures) == 57
+    requests_made = wayback.requests
+    # The second time it all comes from the cache
+    wayback_deepmind.cdx_query(requests.Session(), wayback.url, 'deepmind.com/research/', '20220101', '20240731')
+    assert wayback.requests == requests_made
+
+def test_best_snapshots():
+    captures = [
+        {'original': 'https://www.deepmind.com/publications/ai-safety-via-debate', 'timestamp': '20220301101500',
+         'statuscode': '200', 'mimetype': 'text/html'},
+        {'original': 'https://www.deepmind.com/publications/ai-safety-via-debate', 'timestamp': '20230615083000',
+         'statuscode': '200', 'mimetype': 'text/html'},
+        {'original': 'http://deepmind.com/publications/ai-safety-via-debate/', 'timestamp': '20240105120000',
+         'statuscode': '404', 'mimetype': 'text/html'},
+        {'original': 'https://www.deepmind.com/research/publications?d907cb24_page=2', 'timestamp': '20230510000000',
+         'statuscode': '200', 'mimetype': 'text/html'},
+        {'original': 'https://www.deepmind.com/research/figure-1.png', 'timestamp': '20230401000000',
+         'statuscode': '200', 'mimetype': 'image/png'},
+    ]
+    best = wayback_deepmind.best_snapshots(captures)
+    # The listing page is kept apart from the publications it lists, and the image is left out
+    assert sorted(best) == [DEBATE, 'deepmind.com/research/publications?d907cb24_page=2']
+    # The 404 is newer, but the latest successful capture is the one to use
+    assert best[DEBATE]['timestamp'] == '20230615083000'
+
+def test_abstracts_reach_the_csv(wayback, tmp_path, monkeypatch):
+    output = tmp_path / 'DeepMind_archive.csv'
+    monkeypatch.setattr(sys, 'argv', ['wayback_deepmind.py', '--wayback', wayback.url, '--output', str(output)])
+    wayback_deepmind.main()
+    papers = pd.read_csv(output).set_index('Title')
+    assert sorted(papers.index) == ['AI safety via debate',
+                                    'Tracr: compiled transformers as a laboratory for interpretability']
+    # From the 2023 capture, found by extract_GDM after the "Abstract" heading
+    assert papers.loc['AI safety via debate', 'Abstract'].startswith('We train agents to debate')
+    assert papers.loc['AI safety via debate', 'Date'] == '14-Feb-22'
+    assert papers.loc['AI safety via debate', 'Snapshot'] == \
+        'https://web.archive.org/web/20230615083000/https://www.deepmind.com/publications/ai-safety-via-debate'
+    assert papers['Company'].eq('Google DeepMind').all()
@@ -0,0 +1,198 @@
+# Collects the pre-merger DeepMind research pages from the Internet Archive, instead of opening
+# the archived deepmind.com/research snapshot from the README one page at a time.
+#
+# A few CDX index queries (one per URL prefix, paged if the index says the results span several
+# pages) list every capture of deepmind.com/research/* and deepmind.com/publications/* in the date
+# window. For each URL the latest successful HTML capture is taken, fetched in its original form
+# (the id_ flag, without the Wayback toolbar) a few at a time under the shared rate limiter, and
+# given to extract_GDM from collecting_abstracts.py.
+#
+# Snapshots never change, so everything fetched (CDX results too) is kept in wayback_cache/ and a
+# re-run is offline unless --refresh-index is given. For testing against local_wayback.py instead
+# of web.archive.org:
+#   python local_wayback.py captures/ --port 8766
+#   python wayback_deepmind.py --wayback http://localhost:8766
+# tests/test_wayback_deepmind.py does the same with the captures in tests/fixtures/wayback.
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import pandas as pd
+import requests
+from bs4 import BeautifulSoup, SoupStrainer
+from tqdm.auto import tqdm
+
+# Shared helpers live in the "Shared code" folder at the top of the repository
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Shared code'))
+import rate_limit
+from collecting_abstracts import extract_GDM
+from crawl_listings import ODA_COLUMNS, in_window, page_date, page_title
+
+WAYBACK = 'https://web.archive.org'
+PREFIXES = ['deepmind.com/research/', 'deepmind.com/publications/']
+CACHE_DIR = 'wayback_cache'
+MAX_WORKERS = 4
+TIMEOUT = 60  # seconds; the archive can be slow
+ATTEMPTS = 4
+TITLE_SUFFIXES = [' | DeepMind', ' - DeepMind']
+
+# The tags extract_GDM reads (h2, p) and the ones for the title and date
+PAGE_STRAINER = SoupStrainer(['title', 'meta', 'h1', 'h2', 'p', 'time'])
+
+def cache_path(*parts):
+    key = hashlib.sha256('\n'.join(parts).encode('utf-8')).hexdigest()
+    return os.path.join(CACHE_DIR, key)
+
+def cached(path, download):
+    """Returns the bytes at path, or downloads them with download() and saves them there first."""
+    try:
+        with open(path, 'rb') as f:
+            return f.read()
+    except FileNotFoundError:
+        pass
+    content = download()
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    with open(path + '.tmp', 'wb') as f:
+        f.write(content)
+    os.replace(path + '.tmp', path)
+    return content
+
+def get(session, url, params=None):
+    """GET under the shared 'wayback' rate limit, retrying with backoff when the archive is struggling."""
+    delay = 5
+    for attempt in range(ATTEMPTS):
+        with rate_limit.limited('wayback', 0):
+            try:
+                response = session.get(url, params=params, timeout=TIMEOUT)
+            except requests.exceptions.RequestException as e:
+                error = e
+            else:
+                if response.status_code == 200:
+                    return response.content
+                error = requests.exceptions.HTTPError(f"{response.status_code} for {response.url}", response=response)
+                if response.status_code not in (429, 502, 503, 504):
+                    raise error
+        if attempt < ATTEMPTS - 1:
+            time.sleep(delay)
+            delay *= 2
+    raise error
+
+def cdx_query(session, wayback, prefix, date_from, date_to, refresh=False):
+    """
+    Lists the captures of every URL under a prefix.
+
+    Parameters:
+        session (requests.Session): Session to query with.
+        wayback (str): Base URL of the archive.
+        prefix (str): e.g. 'deepmind.com/research/'.
+        date_from (str), date_to (str): Capture window, as YYYYMMDD.
+        refresh (bool): Query again even if the results are cached.
+
+    Returns:
+        list: Dicts with original, timestamp, statuscode and mimetype.
+    """
+    url = f"{wayback}/cdx/search/cdx"
+    params = {
+        'url': prefix + '*', 'from': date_from, 'to': date_to, 'output': 'json',
+        'fl': 'original,timestamp,statuscode,mimetype',
+        # Redirects and errors are no use; collapsing repeats isn't possible with paged results, so best_snapshots does that
+        'filter': 'statuscode:200',
+    }
+
+    def query(extra):
+        path = cache_path(url, json.dumps({**params, **extra}, sort_keys=True))
+        if refresh and os.path.exists(path):
+            os.remove(path)
+        return cached(path, lambda: get(session, url, {**params, **extra}))
+
+    # Large results are split into pages; ask how many first
+    pages = int(query({'showNumPages': 'true'}).decode().strip() or 1)
+    captures = []
+    for page in range(pages):
+        rows = json.loads(query({'page': str(page)}) or b'[]')
+        if not rows:
+            continue
+        header, rows = rows[0], rows[1:]
+        captures += [dict(zip(header, row)) for row in rows]
+    return captures
+
+def page_key(original):
+    # http/https, www. and fragments don't make a different page; the query string does (?d907cb24_page=2)
+    parsed = urlparse(original)
+    host = parsed.netloc.lower().split(':')[0]
+    if host.startswith('www.'):
+        host = host[len('www.'):]
+    return host + parsed.path.rstrip('/') + (f"?{parsed.query}" if parsed.query else '')
+
+def best_snapshots(captures):
+    """Picks the latest successful HTML capture of each page. Returns page key -> capture."""
+    best = {}
+    for capture in captures:
+        if capture.get('statuscode') != '200' or 'html' not in capture.get('mimetype', ''):
+            continue
+        key = page_key(capture['original'])
+        if key not in best or capture['timestamp'] > best[key]['timestamp']:
+            best[key] = capture
+    return best
+
+def fetch_snapshot(session, wayback, capture):
+    # id_ gives the page as it was archived, without the archive's toolbar and rewritten links
+    snapshot = f"{wayback}/web/{capture['timestamp']}id_/{capture['original']}"
+    return cached(cache_path(snapshot), lambda: get(session, snapshot))
+
+def snapshot_row(session, wayback, capture):
+    try:
+        content = fetch_snapshot(session, wayback, capture)
+    except requests.exceptions.RequestException as e:
+        print(f"Couldn't fetch {capture['original']} from {capture['timestamp']}: {e}")
+        return None
+    soup = BeautifulSoup(content, 'lxml', parse_only=PAGE_STRAINER)
+    return {
+        'Company': 'Google DeepMind',
+        'Title': page_title(soup, TITLE_SUFFIXES),
+        'Date': page_date(soup),
+        'URL': capture['original'],
+        'Safety_category': '',
+        'Abstract': extract_GDM(soup),
+        'Snapshot': f"{WAYBACK}/web/{capture['timestamp']}/{capture['original']}",
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Collect archived deepmind.com research pages from the Wayback Machine.")
+    parser.add_argument('--output', default='DeepMind_archive.csv')
+    parser.add_argument('--from', dest='date_from', default='20220101', help="Captures from this date (YYYYMMDD)")
+    parser.add_argument('--to', dest='date_to', default='20240731', help="Captures up to this date (YYYYMMDD)")
+    parser.add_argument('--wayback', default=WAYBACK, help="Base URL of the archive, e.g. a local_wayback.py server")
+    parser.add_argument('--refresh-index', action='store_true', help="Query the CDX index again instead of using the cache")
+    parser.add_argument('--all-pages', action='store_true', help="Include pages where extract_GDM found no abstract")
+    args = parser.parse_args()
+
+    session = requests.Session()
+    captures = []
+    for prefix in PREFIXES:
+        found = cdx_query(session, args.wayback, prefix, args.date_from, args.date_to, args.refresh_index)
+        print(f"{len(found)} captures under {prefix}")
+        captures += found
+    best = best_snapshots(captures)
+    print(f"{len(best)} pages with a successful capture.")
+
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        rows = list(tqdm(executor.map(lambda capture: snapshot_row(session, args.wayback, capture), best.values()),
+                         total=len(best), desc="Fetching snapshots"))
+    rows = [row for row in rows if row is not None]
+
+    window_from = pd.to_datetime(args.date_from).date()
+    window_to = pd.to_datetime(args.date_to).date()
+    papers = [row for row in rows
+              if (args.all_pages or row['Abstract'] != 'Abstract not found') and in_window(row, window_from, window_to)]
+    pd.DataFrame(papers, columns=ODA_COLUMNS + ['Abstract', 'Snapshot']).to_csv(args.output, index=False)
+    print(f"{len(papers)} papers with an abstract written to {args.output} ({len(rows) - len(papers)} other pages).")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Adaptive concurrency limits (additive increase, multiplicative decrease), as in TCP congestion control.
+
+Instead of guessing a fixed number of workers, wrap each request in a slot of a controller:
+
+    llm = AIMDController('llm', is_overload=lambda e: getattr(e, 'status_code', None) in (429, 529))
+    with llm.slot():
+        response = client.messages.create(...)
+
+While requests succeed and their latency stays near the fastest recent ones, the limit on
+requests in flight goes up by about one per limit's worth of requests. When a request fails
+with an error that is_overload says means "slow down" (429, 529, timeouts), the limit is
+halved, at most once per round of requests. Requests that fail for other reasons count
+towards the error rate, and the limit isn't raised while that is high.
+
+Every change is recorded, and export_trace() writes the limits over time to a CSV for tuning.
+"""
+
+import csv
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+class AIMDController:
+    def __init__(self, name, initial=4, minimum=1, maximum=64, decrease=0.5,
+                 latency_tolerance=2.0, max_error_rate=0.1, is_overload=None):
+        """
+        Parameters:
+            name (str): Name used in the trace, e.g. 'download' or 'llm'.
+            initial (int): Requests allowed in flight at the start.
+            minimum (int), maximum (int): Bounds on the limit.
+            decrease (float): Factor the limit is multiplied by on overload.
+            latency_tolerance (float): Latency above this multiple of the recent fast requests counts as unhealthy.
+            max_error_rate (float): Error rate over the recent requests above which the limit isn't raised.
+            is_overload (function): Takes an exception and returns True if it means the server wants us to slow down.
+        """
+        self.name = name
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.decrease = decrease
+        self.latency_tolerance = latency_tolerance
+        self.max_error_rate = max_error_rate
+        self.is_overload = is_overload or (lambda error: False)
+        self.in_flight = 0
+        self.condition = threading.Condition()
+        self.latencies = deque(maxlen=200)  # Latencies of recent successful requests
+        self.errors = deque(maxlen=50)      # Whether each recent request failed
+        self.last_cut = 0.0
+        self.start = time.monotonic()
+        self.trace = []
+
+    @contextmanager
+    def slot(self):
+        """Waits until there is room under the limit, and holds a place for the body of the with statement."""
+        with self.condition:
+            while self.in_flight >= int(self.limit):
+                self.condition.wait()
+            self.in_flight += 1
+        started = time.monotonic()
+        try:
+            yield
+        except Exception as e:
+            self.complete(started, error=e)
+            raise
+        except BaseException:
+            self.complete(started, error=None, count=False)
+            raise
+        else:
+            self.complete(started)
+
+    def baseline(self):
+        # What a request takes when the server isn't struggling: the 10th percentile of recent latencies
+        ordered = sorted(self.latencies)
+        return ordered[len(ordered) // 10]
+
+    def complete(self, started, error=None, count=True):
+        now = time.monotonic()
+        latency = now - started
+        with self.condition:
+            self.in_flight -= 1
+            if not count:
+                event = 'cancelled'
+            elif error is not None and self.is_overload(error):
+                self.errors.append(True)
+                # Requests that started before the last cut were sent at the old limit, so don't cut again for them
+                if started >= self.last_cut:
+                    self.limit = max(self.minimum, self.limit * self.decrease)
+                    self.last_cut = now
+                    event = 'decrease'
+                else:
+                    event = 'overload'
+            elif error is not None:
+                self.errors.append(True)
+                event = 'error'
+            else:
+                self.errors.append(False)
+                self.latencies.append(latency)
+                healthy_latency = latency <= self.latency_tolerance * self.baseline()
+                healthy_errors = sum(self.errors) <= self.max_error_rate * len(self.errors)
+                if healthy_latency and healthy_errors:
+                    self.limit = min(self.maximum, self.limit + 1 / self.limit)
+                    event = 'increase'
+                else:
+                    event = 'hold'
+            self.trace.append((now - self.start, self.name, round(self.limit, 3), self.in_flight, round(latency, 3), event))
+            self.condition.notify_all()
+
+    def summary(self):
+        limits = [record[2] for record in self.trace] or [self.limit]
+        decreases = sum(1 for record in self.trace if record[5] == 'decrease')
+        return (f"{self.name}: {len(self.trace)} requests, limit now {int(self.limit)}, "
+                f"between {int(min(limits))} and {int(max(limits))}, cut {decreases} times")
+
+def export_trace(path, controllers):
+    """Writes the trace of every controller to one CSV, in time order."""
+    records = sorted(record for controller in controllers for record in controller.trace)
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['seconds', 'controller', 'limit', 'in_flight', 'latency', 'event'])
+        writer.writerows(records)
@@ -0,0 +1,118 @@
+"""
+One way of writing arXiv IDs for every stage, so the same paper is recognised wherever it appears.
+
+arXiv IDs come in many forms in our files: '2401.01234v2' from the API, 'arXiv:2401.01234',
+https://arxiv.org/abs/2401.01234, https://arxiv.org/pdf/2401.01234v1.pdf, /html/ links,
+and old-style IDs such as cs/0112017v1 or math.GT/0309136. parse() understands all of them.
+Papers are compared on the base ID (without version); VersionIndex keeps track of the
+latest version seen of each, so that harvests that picked up different versions don't
+add the same paper twice.
+"""
+
+import re
+
+# Either a new-style ID (YYMM.NNNN or YYMM.NNNNN) or an old-style archive/YYMMNNN ID, with an optional version
+ID_RE = re.compile(
+    r'(?:^|arxiv:|arxiv\.org/(?:abs|pdf|html|format)/)'
+    r'(?P<base>\d{4}\.\d{4,5}|[a-z][a-z\-]*(?:\.[a-z]{2})?/\d{7})'
+    r'(?:v(?P<version>\d+))?'
+    r'(?:\.pdf)?/?(?:[?#].*)?$',
+    re.IGNORECASE,
+)
+
+def parse(text):
+    """
+    Finds the arXiv ID in an ID or URL.
+
+    Parameters:
+        text (str): e.g. '2401.01234v2', 'arXiv:2401.01234', 'https://arxiv.org/pdf/2401.01234v1.pdf'.
+
+    Returns:
+        tuple: (base ID, version number or None), or None if there's no arXiv ID in it.
+    """
+    if not isinstance(text, str):
+        return None
+    match = ID_RE.search(text.strip())
+    if not match:
+        return None
+    base = match.group('base')
+    if '/' in base:
+        # Old-style archive names are lowercase, apart from the subject class (math.GT)
+        archive, number = base.split('/')
+        name, _, subject = archive.partition('.')
+        base = name.lower() + ('.' + subject.upper() if subject else '') + '/' + number
+    version = match.group('version')
+    return base, int(version) if version else None
+
+def base_id(text):
+    """The ID without version, e.g. '2401.01234v2' -> '2401.01234'. Returns the text unchanged if it isn't an arXiv ID."""
+    parsed = parse(text)
+    return parsed[0] if parsed else text
+
+def arxiv_id_from_url(url):
+    """The arXiv ID in a URL, with its version if it has one, or None."""
+    parsed = parse(url)
+    if parsed is None:
+        return None
+    base, version = parsed
+    return base if version is None else f"{base}v{version}"
+
+def key(text):
+    """'arxiv:<base ID>', the key papers are stored and joined on, or None if there's no arXiv ID in the text."""
+    parsed = parse(text)
+    return 'arxiv:' + parsed[0] if parsed else None
+
+class VersionIndex:
+    """Base ID -> latest version seen."""
+
+    def __init__(self, ids=()):
+        self.latest = {}
+        for arxiv_id in ids:
+            self.add(arxiv_id)
+
+    def add(self, arxiv_id):
+        """Records an ID. Returns True if it's a paper not seen before or a newer version of one."""
+        parsed = parse(arxiv_id)
+        if parsed is None:
+            return False
+        base, version = parsed
+        if base in self.latest and (version or 0) <= (self.latest[base] or 0):
+            return False
+        self.latest[base] = version
+        return True
+
+    def __contains__(self, arxiv_id):
+        # Whether any version of the paper has been seen. To tell whether an ID is a newer version, use add()
+        parsed = parse(arxiv_id)
+        return parsed is not None and parsed[0] in self.latest
+
+    def latest_id(self, arxiv_id):
+        """The latest version seen of a paper, e.g. '2401.01234' -> '2401.01234v3'."""
+        base = base_id(arxiv_id)
+        version = self.latest.get(base)
+        return base if version is None else f"{base}v{version}"
+
+def latest_rows(rows, column='arXiv ID'):
+    """
+    Keeps one row per paper: the one with the latest version, in the place the paper first appeared.
+
+    Parameters:
+        rows (list): Dicts with an arXiv ID in column. Rows without one are all kept.
+        column (str): The column with the ID.
+
+    Returns:
+        list: The deduplicated rows.
+    """
+    index = VersionIndex()
+    chosen = {}
+    order = []
+    for row in rows:
+        parsed = parse(row.get(column))
+        if parsed is None:
+            order.append(row)
+            continue
+        if parsed[0] not in chosen:
+            order.append(parsed[0])
+        if index.add(row[column]) or parsed[0] not in chosen:
+            chosen[parsed[0]] = row
+    return [chosen[item] if isinstance(item, str) else item for item in order]
@@ -0,0 +1,178 @@
+"""
+Bulk lookups of arXiv metadata, shared by the arXiv harvest and the abstract collection.
+
+The arXiv API accepts many comma-separated IDs in a single id_list, so instead of
+one request per paper we ask for a few hundred at a time. Results are kept in a
+JSON cache (arXiv ID without version -> metadata) next to this file, which every
+stage can read from and add to. IDs that arXiv doesn't know (mistyped or withdrawn)
+are cached as None, so they are only asked for once. Requests are at least DELAY
+seconds apart across all calls in the process, not just within one.
+"""
+
+import json
+import os
+import threading
+import time
+import urllib.parse
+import urllib.request
+import xml.etree.ElementTree as ET
+
+from arxiv_ids import arxiv_id_from_url, base_id
+
+API_URL = 'http://export.arxiv.org/api/query'
+CACHE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'arxiv_metadata_cache.json')
+CHUNK_SIZE = 200  # IDs per request; keeps the request URL well below server limits
+DELAY = 3         # Seconds between requests, as asked for by the arXiv API terms
+TIMEOUT = 60      # Seconds
+
+NS = {'atom': 'http://www.w3.org/2005/Atom', 'arxiv': 'http://arxiv.org/schemas/atom'}
+
+# When the last request was sent, so that requests from separate calls are spaced out too
+last_request = {'time': 0.0}
+last_request_lock = threading.Lock()
+
+def wait_for_turn():
+    """Sleeps until DELAY seconds have passed since the last request to the API."""
+    with last_request_lock:
+        wait = last_request['time'] + DELAY - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        last_request['time'] = time.monotonic()
+
+def load_cache(path=CACHE_FILE):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+def save_cache(cache, path=CACHE_FILE):
+    # Write to a temporary file first so an interrupted run never corrupts the cache
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(cache, f)
+    os.replace(path + '.tmp', path)
+
+def parse_authors(entry):
+    """
+    Gets each author of an Atom entry with the affiliations arXiv has for them.
+
+    Parameters:
+        entry (xml.etree.ElementTree.Element): An <entry> element.
+
+    Returns:
+        list: {'name': ..., 'affiliations': [...]} per author, in order. Most authors have no affiliations.
+    """
+    return [
+        {
+            'name': author.findtext('atom:name', '', NS),
+            'affiliations': [
+                affiliation.text.strip() for affiliation in author.findall('arxiv:affiliation', NS)
+                if affiliation.text and affiliation.text.strip()
+            ],
+        }
+        for author in entry.findall('atom:author', NS)
+    ]
+
+def authors_by_id(content):
+    """Parses the authors of every entry in an Atom feed. Returns arXiv ID (with version) -> parse_authors list."""
+    return {
+        arxiv_id_from_url(entry.findtext('atom:id', '', NS)): parse_authors(entry)
+        for entry in ET.fromstring(content).findall('atom:entry', NS)
+    }
+
+def first_author_affiliations(author_affiliations):
+    """
+    Gets the first author's affiliations from the Author_affiliations column of the harvest CSV.
+
+    Parameters:
+        author_affiliations (str): JSON list as written by from_arxiv.py, or empty/NaN for older harvests.
+
+    Returns:
+        list: The first author's affiliations, or an empty list if there are none.
+    """
+    if not isinstance(author_affiliations, str) or not author_affiliations:
+        return []
+    authors = json.loads(author_affiliations)
+    return authors[0]['affiliations'] if authors else []
+
+def parse_feed(content):
+    """
+    Parses an arXiv API Atom feed.
+
+    Parameters:
+        content (bytes): The response body.
+
+    Returns:
+        dict: arXiv ID without version -> record with the same columns as the harvest CSV.
+    """
+    records = {}
+    root = ET.fromstring(content)
+    for entry in root.findall('atom:entry', NS):
+        entry_id = entry.findtext('atom:id', '', NS)
+        arxiv_id = arxiv_id_from_url(entry_id)
+        if arxiv_id is None:
+            continue  # arXiv returns an "Error" entry for IDs it doesn't know
+        authors = parse_authors(entry)
+        records[base_id(arxiv_id)] = {
+            'Title': ' '.join(entry.findtext('atom:title', '', NS).split()),
+            'Authors': ', '.join(author['name'] for author in authors),
+            'Abstract': entry.findtext('atom:summary', '', NS).strip().replace('\n', ' '),
+            'arXiv ID': arxiv_id,
+            'PDF_Link': f"https://arxiv.org/pdf/{arxiv_id}",
+            'Submitted': entry.findtext('atom:published', '', NS)[:10],
+            'Author_affiliations': json.dumps(authors),
+        }
+    return records
+
+def fetch_chunk(arxiv_ids, max_attempts=5):
+    """Fetches one id_list request, retrying with exponential backoff. Returns None if every attempt failed."""
+    query = urllib.parse.urlencode({
+        'id_list': ','.join(arxiv_ids),
+        'max_results': len(arxiv_ids),
+    })
+    delay = DELAY
+    for attempt in range(max_attempts):
+        wait_for_turn()
+        try:
+            with urllib.request.urlopen(f"{API_URL}?{query}", timeout=TIMEOUT) as response:
+                return parse_feed(response.read())
+        except Exception as e:
+            print(f"Attempt {attempt + 1} failed: {str(e)}. Retrying...")
+            time.sleep(delay)
+            delay = min(delay * 2, 60)
+    print(f"Failed to fetch {len(arxiv_ids)} IDs after {max_attempts} attempts.")
+    return None
+
+def fetch_metadata(arxiv_ids, cache=None, chunk_size=CHUNK_SIZE, cache_file=CACHE_FILE):
+    """
+    Resolves many arXiv IDs with as few API requests as possible.
+
+    Parameters:
+        arxiv_ids (iterable): arXiv IDs, with or without versions.
+        cache (dict): Cache to read from and add to. Loaded from cache_file if not given.
+        chunk_size (int): The maximum number of IDs per request.
+        cache_file (str): Where the cache is saved after each request. None to not save it.
+
+    Returns:
+        dict: arXiv ID without version -> record, for every ID that arXiv knows about. Unknown IDs are
+            cached as None.
+    """
+    if cache is None:
+        cache = load_cache(cache_file)
+    wanted = list(dict.fromkeys(base_id(arxiv_id) for arxiv_id in arxiv_ids))
+    missing = [arxiv_id for arxiv_id in wanted if arxiv_id not in cache]
+    if missing:
+        print(f"{len(wanted) - len(missing)} of {len(wanted)} arXiv IDs already cached; "
+              f"fetching {len(missing)} in {-(-len(missing) // chunk_size)} requests.")
+
+    for i in range(0, len(missing), chunk_size):
+        chunk = missing[i:i + chunk_size]
+        records = fetch_chunk(chunk)
+        if records is None:
+            continue  # Failed: try these again next time rather than caching them as unknown
+        # arXiv answered, so the IDs it left out don't exist (or were withdrawn)
+        cache.update({arxiv_id: records.get(arxiv_id) for arxiv_id in chunk})
+        if cache_file is not None:
+            save_cache(cache, cache_file)
+
+    return {arxiv_id: cache[arxiv_id] for arxiv_id in wanted if cache.get(arxiv_id) is not None}
@@ -0,0 +1,105 @@
+"""
+Token/dollar budgets and a cheap prior for which papers to spend them on first.
+
+The LLM stages record the usage of every API response in a Budget and stop starting
+new papers once it is spent; whatever is left stays in the queue for the next run.
+Papers are taken in order of prior(): papers by authors we already know to be at
+OpenAI, Google DeepMind or Anthropic first, then papers that mention those companies
+or their models, with newer papers before older ones.
+"""
+
+import threading
+from datetime import date
+
+# Dollars per million input and output tokens
+PRICES = {
+    'claude-3-5-sonnet-20240620': (3.00, 15.00),
+    'claude-3-haiku-20240307': (0.25, 1.25),
+    'gpt-4o': (2.50, 10.00),
+    'gpt-4o-mini': (0.15, 0.60),
+}
+
+COMPANIES = ['openai', 'anthropic', 'deepmind']
+# Words in a title or abstract that make it more likely that a paper is from one of the companies
+KEYWORDS = COMPANIES + [
+    'google', 'gpt-3', 'gpt-4', 'chatgpt', 'claude', 'gemini', 'palm', 'chinchilla', 'gopher',
+    'sparrow', 'constitutional ai', 'rlhf', 'scalable oversight', 'interpretability',
+]
+
+class Budget:
+    """Thread-safe running total of tokens and dollars spent, with optional limits."""
+
+    def __init__(self, tokens=None, dollars=None):
+        self.token_limit = tokens
+        self.dollar_limit = dollars
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.dollars = 0.0
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def record(self, model, input_tokens, output_tokens):
+        input_price, output_price = PRICES.get(model, (0.0, 0.0))
+        with self.lock:
+            self.calls += 1
+            self.input_tokens += input_tokens
+            self.output_tokens += output_tokens
+            self.dollars += (input_tokens * input_price + output_tokens * output_price) / 1e6
+
+    def exhausted(self):
+        with self.lock:
+            if self.token_limit is not None and self.input_tokens + self.output_tokens >= self.token_limit:
+                return True
+            return self.dollar_limit is not None and self.dollars >= self.dollar_limit
+
+    def summary(self):
+        limits = [f"{self.token_limit:,} tokens" if self.token_limit is not None else None,
+                  f"${self.dollar_limit:.2f}" if self.dollar_limit is not None else None]
+        limits = ' and '.join(limit for limit in limits if limit) or 'no limit'
+        return (f"Spent {self.input_tokens + self.output_tokens:,} tokens ({self.input_tokens:,} in, "
+                f"{self.output_tokens:,} out) and ${self.dollars:.2f} in {self.calls} calls; budget: {limits}.")
+
+def author_names(authors):
+    if not isinstance(authors, str):
+        return set()
+    return {name.strip().lower() for name in authors.split(',') if name.strip()}
+
+def known_company_authors(rows):
+    """
+    Names of the authors of papers already found to be from one of the companies.
+
+    Parameters:
+        rows (iterable): Dicts with 'Authors' and 'Institution'.
+
+    Returns:
+        set: Lowercased author names.
+    """
+    names = set()
+    for row in rows:
+        institution = row.get('Institution')
+        if isinstance(institution, str) and any(company in institution.lower() for company in COMPANIES):
+            names |= author_names(row.get('Authors'))
+    return names
+
+def prior(row, known_authors=frozenset(), today=None):
+    """
+    A cheap score for how likely a paper is to be from one of the companies. Higher goes first.
+
+    Parameters:
+        row (dict): Paper with any of 'Authors', 'Title', 'Abstract' and 'Submitted' or 'Date'.
+        known_authors (set): From known_company_authors.
+        today (date): For recency. Defaults to today.
+
+    Returns:
+        float: 5 per known author (up to two), 2 per keyword found, plus up to 1 for recency.
+    """
+    score = 5 * min(2, len(author_names(row.get('Authors')) & known_authors))
+    text = ' '.join(str(row.get(column) or '') for column in ('Title', 'Abstract')).lower()
+    score += 2 * sum(keyword in text for keyword in KEYWORDS)
+    submitted = str(row.get('Submitted') or row.get('Date') or '')[:10]
+    try:
+        age_years = ((today or date.today()) - date.fromisoformat(submitted)).days / 365
+        score += 1 / (1 + max(0.0, age_years))
+    except ValueError:
+        pass
+    return score
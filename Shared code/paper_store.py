@@ -0,0 +1,475 @@
+"""
+SQLite store with one row per paper, shared by all stages of the pipeline.
+
+Instead of each stage reloading a whole CSV and writing it back to change a few
+cells, stages upsert the rows they have worked on. Papers are keyed by a canonical
+ID: 'arxiv:<ID without version>' for arXiv papers and, for everything else, the URL
+without scheme, 'www.', trailing slash or tracking parameters (utm_* and the like),
+with the rest of the query string sorted: openreview.net/forum?id=... is one paper
+per id. A company page that
+turned out to link to an arXiv paper is remembered in paper_urls, so a later stage
+that only has the company URL still finds the paper under its arXiv ID.
+
+The database uses WAL mode, so the thread pools in the stages (and several stages
+at once) can write to it while others read. Each thread gets its own connection.
+
+Titles, abstracts, authors, institutions and both categorizations are also indexed
+for full-text search (SQLite FTS5, kept up to date by triggers as the stages upsert):
+    python paper_store.py search "interpretability AND company=GDM AND disagree"
+The index refers to papers by rowid, which papers gives an explicit id column for so
+that VACUUM can't renumber it. Databases made before that column was added should
+run "python paper_store.py rebuild" after a VACUUM.
+
+The CSVs we use today can be reproduced from the store:
+    python paper_store.py export final_output final_output.csv
+and existing CSVs can be loaded into it:
+    python paper_store.py import "../Automated categorization/final_output.csv"
+"""
+
+import argparse
+import csv
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+from urllib.parse import parse_qsl, urlencode, urlparse
+
+import arxiv_ids
+
+DB_FILE = os.getenv('PAPER_STORE_DB', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'papers.sqlite'))
+
+# CSV column name -> database column
+COLUMNS = {
+    'Title': 'title',
+    'Authors': 'authors',
+    'Abstract': 'abstract',
+    'arXiv ID': 'arxiv_id',
+    'PDF_Link': 'pdf_link',
+    'URL': 'url',
+    'Submitted': 'submitted',
+    'Author_affiliations': 'author_affiliations',
+    'Date': 'date',
+    'Affiliation_step_1': 'affiliation_step_1',
+    'Institution': 'institution',
+    'Affiliation_status': 'affiliation_status',
+    'Affiliation_attempts': 'affiliation_attempts',
+    'Affiliation_last_attempt': 'affiliation_last_attempt',
+    'Affiliation_error': 'affiliation_error',
+    'Company': 'company',
+    'Safety_category': 'safety_category',
+    'GPT4o_Safety_focus': 'gpt4o_safety_focus',
+    'GPT4o_Explanation': 'gpt4o_explanation',
+    'GPT4o_Votes': 'gpt4o_votes',
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS papers (
+    id INTEGER PRIMARY KEY,
+    paper_id TEXT NOT NULL UNIQUE,
+    {columns},
+    updated_at REAL
+);
+""".format(columns=',\n    '.join(f'{column} TEXT' for column in COLUMNS.values()))
+
+INDEXES = """
+CREATE INDEX IF NOT EXISTS papers_submitted ON papers (submitted);
+CREATE INDEX IF NOT EXISTS papers_institution ON papers (institution);
+CREATE INDEX IF NOT EXISTS papers_safety_category ON papers (safety_category);
+CREATE INDEX IF NOT EXISTS papers_affiliation_status ON papers (affiliation_status);
+CREATE TABLE IF NOT EXISTS paper_urls (
+    url TEXT PRIMARY KEY,
+    paper_id TEXT NOT NULL
+);
+"""
+
+# Full-text index over the columns we search when reviewing papers. It reads the text from the papers
+# table (external content), and the triggers update it whenever one of these columns changes.
+FTS_COLUMNS = ['title', 'abstract', 'authors', 'institution', 'company', 'safety_category', 'gpt4o_safety_focus']
+FTS_WEIGHTS = [10.0, 1.0, 2.0, 2.0, 2.0, 5.0, 5.0]  # For bm25: matches in the title count most
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS papers_fts USING fts5(
+    {columns}, content='papers', content_rowid='rowid', tokenize='porter unicode61'
+);
+CREATE TRIGGER IF NOT EXISTS papers_fts_insert AFTER INSERT ON papers BEGIN
+    INSERT INTO papers_fts (rowid, {columns}) VALUES (new.rowid, {new});
+END;
+CREATE TRIGGER IF NOT EXISTS papers_fts_delete AFTER DELETE ON papers BEGIN
+    INSERT INTO papers_fts (papers_fts, rowid, {columns}) VALUES ('delete', old.rowid, {old});
+END;
+CREATE TRIGGER IF NOT EXISTS papers_fts_update AFTER UPDATE OF {columns} ON papers BEGIN
+    INSERT INTO papers_fts (papers_fts, rowid, {columns}) VALUES ('delete', old.rowid, {old});
+    INSERT INTO papers_fts (rowid, {columns}) VALUES (new.rowid, {new});
+END;
+""".format(
+    columns=', '.join(FTS_COLUMNS),
+    new=', '.join('new.' + column for column in FTS_COLUMNS),
+    old=', '.join('old.' + column for column in FTS_COLUMNS),
+)
+
+# Filters for search(), written as name=value in the query
+SEARCH_FILTERS = {
+    'company': "(papers.company LIKE :{key} OR papers.institution LIKE :{key})",
+    'category': "papers.safety_category LIKE :{key}",
+    'gpt': "papers.gpt4o_safety_focus LIKE :{key}",
+    'status': "papers.affiliation_status LIKE :{key}",
+}
+# The names we use for the companies in file names, and what they're called in the data
+COMPANY_ALIASES = {'GDM': 'DeepMind', 'OAI': 'OpenAI'}
+# Filters written as a single word
+HAS_BOTH_CATEGORIES = (
+    "TRIM(COALESCE(papers.safety_category, '')) != '' "
+    "AND COALESCE(papers.gpt4o_safety_focus, '') NOT IN ('', 'error')"
+)
+SEARCH_FLAGS = {
+    # Where GPT-4o-mini and the human categorization differ, as reviewed for the README
+    'disagree': HAS_BOTH_CATEGORIES + " AND LOWER(TRIM(papers.safety_category)) != LOWER(TRIM(papers.gpt4o_safety_focus))",
+    'agree': HAS_BOTH_CATEGORIES + " AND LOWER(TRIM(papers.safety_category)) = LOWER(TRIM(papers.gpt4o_safety_focus))",
+}
+
+# Queries that reproduce the CSVs written by each stage, in the order the papers were first added
+COMPANY_QUERY = """
+SELECT institution AS "Company", title AS "Title", pdf_link AS "URL",
+       COALESCE(safety_category, '') AS "Safety_category", abstract AS "Abstract"
+FROM papers WHERE institution LIKE '%{name}%' ORDER BY rowid
+"""
+VIEWS = {
+    # data_<date>.csv from from_arxiv.py
+    'harvest': """
+        SELECT title AS "Title", authors AS "Authors", abstract AS "Abstract", arxiv_id AS "arXiv ID",
+               pdf_link AS "PDF_Link", submitted AS "Submitted", author_affiliations AS "Author_affiliations"
+        FROM papers WHERE submitted IS NOT NULL ORDER BY rowid
+    """,
+    # The same file after Find affiliation thread.py has added its columns
+    'affiliations': """
+        SELECT title AS "Title", authors AS "Authors", abstract AS "Abstract", arxiv_id AS "arXiv ID",
+               pdf_link AS "PDF_Link", submitted AS "Submitted", author_affiliations AS "Author_affiliations",
+               affiliation_step_1 AS "Affiliation_step_1", institution AS "Institution",
+               affiliation_status AS "Affiliation_status", affiliation_attempts AS "Affiliation_attempts",
+               affiliation_last_attempt AS "Affiliation_last_attempt", affiliation_error AS "Affiliation_error"
+        FROM papers WHERE submitted IS NOT NULL ORDER BY rowid
+    """,
+    # Anthropic.csv, OpenAI.csv and GDM.csv from group_by_company.py
+    'Anthropic': COMPANY_QUERY.format(name='Anthropic'),
+    'OpenAI': COMPANY_QUERY.format(name='OpenAI'),
+    'GDM': COMPANY_QUERY.format(name='DeepMind'),
+    # The input of categorizing_papers.py: the papers from the company websites, and those from arXiv
+    # once they have been reviewed and given a company
+    'categorize': """
+        SELECT company AS "Company", title AS "Title", date AS "Date", COALESCE(url, pdf_link) AS "URL",
+               safety_category AS "Safety_category", abstract AS "Abstract"
+        FROM papers WHERE company IS NOT NULL ORDER BY rowid
+    """,
+    # final_output.csv from categorizing_papers.py
+    'final_output': """
+        SELECT company AS "Company", title AS "Title", date AS "Date", url AS "URL",
+               safety_category AS "Safety_category", abstract AS "Abstract",
+               gpt4o_safety_focus AS "GPT4o_Safety_focus", gpt4o_explanation AS "GPT4o_Explanation"
+        FROM papers WHERE gpt4o_safety_focus IS NOT NULL ORDER BY rowid
+    """,
+}
+
+def query_parts(query):
+    """Splits a search query on AND (in any case), leaving quoted phrases whole."""
+    parts, current = [], []
+    for token in re.findall(r'"[^"]*"?|[^\s"]+', query):
+        if token.upper() == 'AND':
+            parts.append(' '.join(current))
+            current = []
+        else:
+            current.append(token)
+    parts.append(' '.join(current))
+    return [part for part in parts if part]
+
+def fts_text(part):
+    """
+    Turns free text into an FTS5 query.
+
+    Words, "phrases", prefixes (align*), parentheses and OR / NOT / NEAR are passed on as they are.
+    Other terms are quoted, so that e.g. GPT-4 is searched for rather than read as a column filter.
+    """
+    tokens = []
+    for token in re.findall(r'"[^"]*"?|[()]|[^\s"()]+', part):
+        if token.startswith('"'):
+            tokens.append(token if len(token) > 1 and token.endswith('"') else token + '"')
+        elif token in ('(', ')', 'OR', 'NOT', 'NEAR') or re.fullmatch(r'\w+\*?', token):
+            tokens.append(token)
+        else:
+            tokens.append('"' + token + '"')
+    return ' '.join(tokens)
+
+# Query parameters that only say where a link was shared, not which page it is
+TRACKING_PARAMS = {'fbclid', 'gclid', 'mc_cid', 'mc_eid', 'ref', 'source'}
+
+def canonical_url(url):
+    parsed = urlparse(url.strip())
+    host = parsed.netloc.lower()
+    if host.startswith('www.'):
+        host = host[len('www.'):]
+    params = sorted(
+        (name, value) for name, value in parse_qsl(parsed.query, keep_blank_values=True)
+        if not name.lower().startswith('utm_') and name.lower() not in TRACKING_PARAMS
+    )
+    query = urlencode(params)
+    return host + parsed.path.rstrip('/') + (f"?{query}" if query else '')
+
+def paper_id(arxiv_id=None, url=None):
+    """
+    Returns the canonical ID of a paper.
+
+    Parameters:
+        arxiv_id (str): The arXiv ID, if known.
+        url (str): Any URL for the paper. arXiv URLs are turned into arXiv IDs.
+
+    Returns:
+        str: 'arxiv:<ID without version>', or the canonical URL for papers that aren't on arXiv.
+    """
+    key = arxiv_ids.key(arxiv_id) or arxiv_ids.key(url)
+    if key:
+        return key
+    if arxiv_id and not url:
+        return 'arxiv:' + arxiv_id
+    return canonical_url(url or '')
+
+def clean(value):
+    # pandas uses NaN for empty cells
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+class PaperStore:
+    def __init__(self, path=DB_FILE):
+        self.path = path
+        self.local = threading.local()
+        with self.connection() as conn:
+            conn.executescript(SCHEMA)
+            # Databases made before a column was added to COLUMNS get it added here
+            existing = {row['name'] for row in conn.execute('PRAGMA table_info(papers)')}
+            for column in COLUMNS.values():
+                if column not in existing:
+                    conn.execute(f'ALTER TABLE papers ADD COLUMN {column} TEXT')
+            conn.executescript(INDEXES)
+            self.fts = self.create_fts(conn)
+
+    def create_fts(self, conn):
+        """Creates the full-text index if needed, filling it from the existing papers. Returns False without FTS5."""
+        exists = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'papers_fts'").fetchone() is not None
+        try:
+            conn.executescript(FTS_SCHEMA)
+        except sqlite3.OperationalError as e:
+            # SQLite built without FTS5: everything but search() still works
+            print(f"Full-text search is not available: {e}")
+            return False
+        if not exists:
+            conn.execute("INSERT INTO papers_fts (papers_fts) VALUES ('rebuild')")
+        return True
+
+    def connection(self):
+        """Returns this thread's connection, opening it the first time."""
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.row_factory = sqlite3.Row
+            self.local.conn = conn
+        return conn
+
+    def key_for(self, row, arxiv_id=None, url=None, conn=None):
+        """
+        Returns the paper ID a row is stored under, the same whichever stage has the row.
+
+        Parameters:
+            row (dict): CSV column name -> value.
+            arxiv_id (str): Defaults to row['arXiv ID'].
+            url (str): Defaults to row['URL'] or row['PDF_Link'].
+
+        Returns:
+            str: The arXiv key if the row has an arXiv ID or URL, or its company URL was resolved to one by
+            an earlier stage; otherwise the canonical company URL.
+        """
+        urls = [value for value in (url, clean(row.get('URL')), clean(row.get('PDF_Link'))) if value]
+        key = paper_id(arxiv_id or clean(row.get('arXiv ID')), urls[0] if urls else None)
+        if key.startswith('arxiv:'):
+            return key
+        conn = conn or self.connection()
+        for value in urls:
+            found = conn.execute('SELECT paper_id FROM paper_urls WHERE url = ?', (canonical_url(value),)).fetchone()
+            if found is not None:
+                return found['paper_id']
+        return key
+
+    def upsert(self, row, arxiv_id=None, url=None):
+        """
+        Inserts a paper or updates the given columns of an existing one.
+
+        Parameters:
+            row (dict): CSV column name -> value. Columns that aren't given are left as they are.
+            arxiv_id (str): Used for the paper ID. Defaults to row['arXiv ID'].
+            url (str): Used for the paper ID if there is no arXiv ID. Defaults to row['URL'] or row['PDF_Link'].
+
+        Returns:
+            str: The paper ID.
+        """
+        return self.upsert_many([row], arxiv_id=arxiv_id, url=url)[0]
+
+    def upsert_many(self, rows, arxiv_id=None, url=None):
+        """Upserts several rows in one transaction. Returns their paper IDs. See upsert."""
+        conn = self.connection()
+        keys = []
+        with conn:
+            for row in rows:
+                key = self.key_for(row, arxiv_id, url, conn)
+                keys.append(key)
+                if key.startswith('arxiv:'):
+                    # Remember the company page of the paper, for stages that only have that
+                    for value in (clean(row.get('URL')), clean(row.get('PDF_Link'))):
+                        if value and not arxiv_ids.key(value):
+                            conn.execute('INSERT OR REPLACE INTO paper_urls (url, paper_id) VALUES (?, ?)',
+                                         (canonical_url(value), key))
+                values = {COLUMNS[name]: clean(value) for name, value in row.items() if name in COLUMNS}
+                values['updated_at'] = time.time()
+                columns = ', '.join(values)
+                placeholders = ', '.join('?' for _ in values)
+                updates = ', '.join(f'{column} = excluded.{column}' for column in values)
+                conn.execute(
+                    f'INSERT INTO papers (paper_id, {columns}) VALUES (?, {placeholders}) '
+                    f'ON CONFLICT (paper_id) DO UPDATE SET {updates}',
+                    [key] + list(values.values()),
+                )
+        return keys
+
+    def get(self, key):
+        """Returns a paper as a dict of CSV column name -> value, or None."""
+        row = self.connection().execute('SELECT * FROM papers WHERE paper_id = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        return {name: row[column] for name, column in COLUMNS.items()}
+
+    def rows(self, view):
+        """Returns one of the VIEWS as a list of dicts of CSV column name -> value."""
+        cursor = self.connection().execute(VIEWS[view])
+        names = [column[0] for column in cursor.description]
+        return [dict(zip(names, row)) for row in cursor]
+
+    def export_csv(self, view, path):
+        """Writes one of the VIEWS to a CSV file and returns the number of rows."""
+        cursor = self.connection().execute(VIEWS[view])
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow([column[0] for column in cursor.description])
+            count = 0
+            for row in cursor:
+                writer.writerow(['' if value is None else value for value in row])
+                count += 1
+        return count
+
+    def import_csv(self, path):
+        """Upserts every row of a CSV file written by one of the stages and returns the number of rows."""
+        with open(path, 'r', newline='', encoding='utf-8') as f:
+            # Empty cells are skipped so they don't overwrite what other stages have filled in
+            rows = [
+                {name: value for name, value in row.items() if value != ''}
+                for row in csv.DictReader(f)
+            ]
+        self.upsert_many(rows)
+        return len(rows)
+
+    def search(self, query, limit=20):
+        """
+        Ranked full-text search, with filters.
+
+        Parameters:
+            query (str): Parts joined with AND. A part can be a filter (company=GDM, category=..., gpt=...,
+                status=...), one of the words disagree or agree, or FTS5 query text such as
+                interpretability or "reward model" OR rlhf. Filters match any part of the value.
+            limit (int): Most results to return.
+
+        Returns:
+            list: Dicts of CSV column name -> value, plus 'paper_id' and 'Snippet' (the matching part of the
+            abstract), best match first. Without any query text, the papers are in the order they were added.
+        """
+        text, conditions, params = [], [], {}
+        for i, part in enumerate(query_parts(query)):
+            name, equals, value = part.partition('=')
+            name = name.strip().lower()
+            if equals and name in SEARCH_FILTERS:
+                value = value.strip().strip('"\'')
+                value = COMPANY_ALIASES.get(value.upper(), value) if name == 'company' else value
+                conditions.append(SEARCH_FILTERS[name].format(key=f'filter{i}'))
+                params[f'filter{i}'] = f'%{value}%'
+            elif part.strip().lower() in SEARCH_FLAGS:
+                conditions.append(SEARCH_FLAGS[part.strip().lower()])
+            elif part.strip():
+                text.append(fts_text(part.strip()))
+
+        if text:
+            if not self.fts:
+                raise RuntimeError("This SQLite has no FTS5, so there is no full-text search.")
+            weights = ', '.join(str(weight) for weight in FTS_WEIGHTS)
+            sql = (f"SELECT papers.*, snippet(papers_fts, 1, '[', ']', '...', 16) AS snippet "
+                   f"FROM papers_fts JOIN papers ON papers.rowid = papers_fts.rowid "
+                   f"WHERE papers_fts MATCH :match {''.join(' AND ' + c for c in conditions)} "
+                   f"ORDER BY bm25(papers_fts, {weights}) LIMIT :limit")
+            params['match'] = ' AND '.join(f'({part})' for part in text)
+        else:
+            sql = (f"SELECT papers.*, substr(papers.abstract, 1, 120) AS snippet FROM papers "
+                   f"WHERE {' AND '.join(conditions) or '1'} ORDER BY papers.rowid LIMIT :limit")
+        params['limit'] = limit
+        results = []
+        for row in self.connection().execute(sql, params):
+            result = {name: row[column] for name, column in COLUMNS.items()}
+            result['paper_id'] = row['paper_id']
+            result['Snippet'] = row['snippet']
+            results.append(result)
+        return results
+
+def print_results(results):
+    for result in results:
+        company = result['Company'] or result['Institution'] or '?'
+        print(f"{result['paper_id']}  [{company}]  human: {result['Safety_category'] or '-'}  "
+              f"GPT: {result['GPT4o_Safety_focus'] or '-'}")
+        print(f"    {result['Title']}")
+        if result['Snippet']:
+            print(f"    {' '.join(result['Snippet'].split())}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Load CSVs into the paper store, export them from it, or search it.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    import_parser = subparsers.add_parser('import', help="Upsert the rows of CSVs written by the stages")
+    import_parser.add_argument('files', nargs='+')
+    export_parser = subparsers.add_parser('export', help="Write a CSV in the format of one of the stages")
+    export_parser.add_argument('view', choices=list(VIEWS))
+    export_parser.add_argument('file')
+    search_parser = subparsers.add_parser('search', help="Full-text search, e.g. \"interpretability AND company=GDM AND disagree\"")
+    search_parser.add_argument('query')
+    search_parser.add_argument('--limit', type=int, default=20)
+    subparsers.add_parser('rebuild', help="Rebuild the full-text index, e.g. after a VACUUM")
+    parser.add_argument('--db', default=DB_FILE)
+    args = parser.parse_args()
+
+    store = PaperStore(args.db)
+    if args.command == 'import':
+        for path in args.files:
+            print(f"Imported {store.import_csv(path)} rows from {path}.")
+    elif args.command == 'export':
+        print(f"Exported {store.export_csv(args.view, args.file)} rows to {args.file}.")
+    elif args.command == 'rebuild':
+        with store.connection() as conn:
+            conn.execute("INSERT INTO papers_fts (papers_fts) VALUES ('rebuild')")
+        print("Rebuilt the full-text index.")
+    else:
+        start = time.perf_counter()
+        try:
+            results = store.search(args.query, args.limit)
+        except sqlite3.OperationalError as e:
+            print(f"Couldn't search for {args.query!r}: {e}. Put terms with punctuation in double quotes, "
+                  f"e.g. \"GPT-4\", and join filters with AND, e.g. \"debate AND company=GDM\".")
+            return
+        elapsed = time.perf_counter() - start
+        print_results(results)
+        print(f"{len(results)} results in {1000 * elapsed:.1f} ms.")
+
+if __name__ == "__main__":
+    main()
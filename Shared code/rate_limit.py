@@ -0,0 +1,179 @@
+"""
+Rate limits shared by every process on this machine, as token buckets in a SQLite file.
+
+Our API limits are per organisation, so when Find affiliation thread.py and
+categorizing_papers.py run at the same time (or several workers of one stage), each
+enforcing its own limits isn't enough. Every API call goes through limited() instead:
+
+    with rate_limit.limited('anthropic', tokens=estimate) as usage:
+        response = client.messages.create(...)
+        usage['tokens'] = response.usage.input_tokens + response.usage.output_tokens
+
+which waits until both the requests-per-minute and the tokens-per-minute bucket of that
+API have room, takes the estimate from the tokens bucket, and corrects it once the
+real number is known. The limits are stored in the file, so they can be changed while
+things are running, and the current headroom can be checked:
+    python rate_limit.py status
+    python rate_limit.py set anthropic --rpm 1000 --tpm 80000
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+DB_FILE = os.getenv('RATE_LIMIT_DB', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'rate_limits.sqlite'))
+
+# Per minute, until changed with "python rate_limit.py set"
+DEFAULT_LIMITS = {
+    'anthropic': {'requests': 50, 'tokens': 40000},
+    'openai': {'requests': 500, 'tokens': 200000},
+    # The Internet Archive only limits requests; its requests are made with 0 tokens
+    'wayback': {'requests': 15, 'tokens': 1},
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS buckets (
+    api TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    per_minute REAL NOT NULL,
+    level REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (api, kind)
+);
+"""
+
+local = threading.local()
+
+def connect(path=DB_FILE):
+    """Returns this thread's connection to the file, opening it the first time (as PaperStore does)."""
+    connections = local.__dict__.setdefault('connections', {})
+    conn = connections.get(path)
+    if conn is None:
+        conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.executescript(SCHEMA)
+        connections[path] = conn
+    return conn
+
+@contextmanager
+def immediate(conn):
+    """A write transaction, rolled back if anything in it fails so that the connection can be used again."""
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        yield
+    except BaseException:
+        conn.execute('ROLLBACK')
+        raise
+    conn.execute('COMMIT')
+
+def refill(conn, api, now):
+    """Returns kind -> (per_minute, level) for an API's buckets, topped up for the time since they were last used."""
+    buckets = {}
+    for kind, limit in DEFAULT_LIMITS.get(api, {'requests': 60, 'tokens': 100000}).items():
+        conn.execute(
+            'INSERT OR IGNORE INTO buckets (api, kind, per_minute, level, updated_at) VALUES (?, ?, ?, ?, ?)',
+            (api, kind, limit, limit, now),
+        )
+    for kind, per_minute, level, updated_at in conn.execute(
+        'SELECT kind, per_minute, level, updated_at FROM buckets WHERE api = ?', (api,)
+    ):
+        # A bucket holds at most a minute's worth, so an idle API can't build up a burst beyond its limit
+        buckets[kind] = (per_minute, min(per_minute, level + (now - updated_at) * per_minute / 60))
+    return buckets
+
+def acquire(api, tokens, path=DB_FILE):
+    """Waits until there is room for one request of about this many tokens, and takes it from the buckets."""
+    conn = connect(path)
+    while True:
+        with immediate(conn):
+            now = time.time()
+            buckets = refill(conn, api, now)
+            requests_limit, requests_level = buckets['requests']
+            tokens_limit, tokens_level = buckets['tokens']
+            needed = min(tokens, tokens_limit)  # A request bigger than the whole bucket only waits for a full one
+            granted = requests_level >= 1 and tokens_level >= needed
+            if granted:
+                conn.execute('UPDATE buckets SET level = ?, updated_at = ? WHERE api = ? AND kind = ?',
+                             (requests_level - 1, now, api, 'requests'))
+                conn.execute('UPDATE buckets SET level = ?, updated_at = ? WHERE api = ? AND kind = ?',
+                             (tokens_level - tokens, now, api, 'tokens'))
+        if granted:
+            return
+        wait = max((1 - requests_level) * 60 / requests_limit, (needed - tokens_level) * 60 / tokens_limit)
+        # A little jitter so waiting processes don't all retry at the same moment
+        time.sleep(min(wait, 5) + random.uniform(0, 0.05))
+
+def adjust(api, tokens, path=DB_FILE):
+    """Adds tokens back to the bucket (or takes more, if negative) once the real usage is known."""
+    connect(path).execute('UPDATE buckets SET level = level + ? WHERE api = ? AND kind = ?', (tokens, api, 'tokens'))
+
+@contextmanager
+def limited(api, tokens, path=DB_FILE):
+    """
+    Waits for room under the API's limits for the body of the with statement.
+
+    Parameters:
+        api (str): 'anthropic' or 'openai'.
+        tokens (int): Estimated input plus output tokens for the request.
+        path (str): The shared SQLite file.
+
+    Yields:
+        dict: Set 'tokens' in it to the real usage, so the estimate can be corrected.
+            If it isn't set (e.g. the request failed), the estimate is given back.
+    """
+    acquire(api, tokens, path)
+    usage = {}
+    try:
+        yield usage
+    finally:
+        adjust(api, tokens - usage.get('tokens', 0), path)
+
+def estimate_tokens(*texts, max_tokens=0):
+    # About four characters per token for English, plus the most the response can use
+    return sum(len(text) for text in texts) // 4 + max_tokens
+
+def headroom(path=DB_FILE):
+    """Returns (api, kind) -> (current level, per-minute limit)."""
+    conn = connect(path)
+    apis = set(DEFAULT_LIMITS) | {row[0] for row in conn.execute('SELECT DISTINCT api FROM buckets')}
+    levels = {}
+    with immediate(conn):
+        for api in sorted(apis):
+            for kind, (per_minute, level) in refill(conn, api, time.time()).items():
+                levels[(api, kind)] = (level, per_minute)
+    return levels
+
+def set_limits(api, requests=None, tokens=None, path=DB_FILE):
+    """Changes the per-minute limits of an API. Limits given as None are left as they are."""
+    conn = connect(path)
+    with immediate(conn):
+        refill(conn, api, time.time())
+        for kind, value in (('requests', requests), ('tokens', tokens)):
+            if value is not None:
+                conn.execute('UPDATE buckets SET per_minute = ?, level = MIN(level, ?) WHERE api = ? AND kind = ?',
+                             (value, value, api, kind))
+
+def main():
+    parser = argparse.ArgumentParser(description="Show or change the shared API rate limits.")
+    parser.add_argument('--db', default=DB_FILE)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('status', help="Show how much of each limit is available right now")
+    set_parser = subparsers.add_parser('set', help="Change the per-minute limits of an API")
+    set_parser.add_argument('api')
+    set_parser.add_argument('--rpm', type=float, help="Requests per minute")
+    set_parser.add_argument('--tpm', type=float, help="Tokens per minute")
+    args = parser.parse_args()
+
+    if args.command == 'set':
+        set_limits(args.api, requests=args.rpm, tokens=args.tpm, path=args.db)
+
+    print(f"{'api':<12}{'kind':<10}{'available':>12}{'per minute':>12}")
+    for (api, kind), (level, per_minute) in headroom(args.db).items():
+        print(f"{api:<12}{kind:<10}{level:>12,.0f}{per_minute:>12,.0f}")
+
+if __name__ == "__main__":
+    main()
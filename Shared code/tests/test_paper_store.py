@@ -0,0 +1,25 @@
+# Run with: python -m pytest tests
+
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from paper_store import PaperStore, canonical_url, paper_id
+
+def test_openreview_forums_are_different_papers():
+    first = paper_id(url='https://openreview.net/forum?id=abc123')
+    second = paper_id(url='https://openreview.net/forum?id=xyz789')
+    assert first != second
+    assert first == 'openreview.net/forum?id=abc123'
+
+def test_canonical_url_ignores_tracking_and_order():
+    assert canonical_url('https://www.openreview.net/forum/?utm_source=x&id=abc&noteId=abc') == \
+        canonical_url('http://openreview.net/forum?noteId=abc&id=abc')
+    assert canonical_url('https://www.anthropic.com/research/foo/?utm_campaign=y') == 'anthropic.com/research/foo'
+
+def test_openreview_rows_are_kept_apart(tmp_path):
+    store = PaperStore(str(tmp_path / 'papers.sqlite'))
+    store.upsert({'Title': 'First', 'URL': 'https://openreview.net/forum?id=abc123'})
+    store.upsert({'Title': 'Second', 'URL': 'https://openreview.net/forum?id=xyz789'})
+    assert store.get('openreview.net/forum?id=abc123')['Title'] == 'First'
+    assert store.get('openreview.net/forum?id=xyz789')['Title'] == 'Second'
@@ -0,0 +1,175 @@
+"""
+Lightweight tracing for the pipeline scripts.
+
+Wrap a step in a span to record how long it took, which paper it was for and any
+attributes such as bytes downloaded or tokens used:
+
+    with tracing.span('download_pdf', url=url) as attributes:
+        response = session.get(url)
+        attributes['bytes'] = len(response.content)
+
+or decorate a function with @tracing.traced() and call tracing.annotate(bytes=...)
+inside it. Spans opened inside
+another span on the same thread become its children and inherit its paper. Each
+finished span is appended as one JSON line to trace.jsonl (or $TRACE_FILE), and
+print_summary() shows p50/p95/p99 latencies per step and the critical path of
+each top-level stage. A saved trace can be summarised with:
+    python tracing.py trace.jsonl
+"""
+
+import functools
+import itertools
+import json
+import math
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+
+TRACE_FILE = os.getenv('TRACE_FILE', 'trace.jsonl')
+
+run_id = uuid.uuid4().hex[:12]
+span_ids = itertools.count(1)
+local = threading.local()
+write_lock = threading.Lock()
+finished_spans = []  # Spans from this run, for print_summary
+
+def current_stack():
+    if not hasattr(local, 'stack'):
+        local.stack = []
+    return local.stack
+
+@contextmanager
+def span(name, paper=None, **attributes):
+    """Records a span around the body of the with statement. Yields the attributes dict, which can be added to."""
+    stack = current_stack()
+    parent = stack[-1] if stack else None
+    record = {
+        'trace': run_id,
+        'id': next(span_ids),
+        'parent': parent['id'] if parent else None,
+        'name': name,
+        'paper': paper if paper is not None else (parent['paper'] if parent else None),
+        'thread': threading.current_thread().name,
+        'start': time.time(),
+        'attributes': attributes,
+    }
+    stack.append(record)
+    start = time.perf_counter()
+    try:
+        yield attributes
+    except BaseException as e:
+        record['error'] = repr(e)
+        raise
+    finally:
+        record['duration'] = time.perf_counter() - start
+        stack.pop()
+        write(record)
+
+def traced(name=None):
+    """Decorator that wraps every call of a function in a span."""
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(name or function.__name__):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def annotate(paper=None, **attributes):
+    """Adds attributes to the innermost open span on this thread (and sets its paper, if given)."""
+    stack = current_stack()
+    if not stack:
+        return
+    if paper is not None:
+        stack[-1]['paper'] = paper
+    stack[-1]['attributes'].update(attributes)
+
+def write(record):
+    line = json.dumps(record, default=str)
+    with write_lock:
+        finished_spans.append(record)
+        with open(TRACE_FILE, 'a', encoding='utf-8') as f:
+            f.write(line + '\n')
+
+def percentile(sorted_values, p):
+    # Nearest-rank percentile
+    index = max(0, min(len(sorted_values) - 1, math.ceil(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+def critical_path(root, children):
+    """
+    The steps directly under root that determined how long it took.
+
+    Starting from the step that finished last, repeatedly takes the step that finished
+    last before the current one started. For steps that ran one after the other this is
+    all of them; for steps that overlapped it is the longest chain.
+    """
+    path = []
+    limit = float('inf')
+    for child in sorted(children.get(root['id'], []), key=lambda c: -(c['start'] + c['duration'])):
+        if child['start'] + child['duration'] <= limit:
+            path.append(child)
+            limit = child['start']
+    return path[::-1]
+
+def print_summary(spans=None):
+    """Prints latency percentiles per step and the critical path per top-level stage."""
+    spans = finished_spans if spans is None else spans
+    if not spans:
+        return
+    by_name = defaultdict(list)
+    children = defaultdict(list)
+    for record in spans:
+        by_name[record['name']].append(record)
+        if record['parent'] is not None:
+            children[record['parent']].append(record)
+
+    print("\nLatency per step (seconds):")
+    print(f"  {'step':<28}{'count':>7}{'p50':>9}{'p95':>9}{'p99':>9}{'total':>10}{'errors':>8}")
+    for name, records in sorted(by_name.items(), key=lambda item: -sum(r['duration'] for r in item[1])):
+        durations = sorted(record['duration'] for record in records)
+        errors = sum(1 for record in records if 'error' in record)
+        print(f"  {name:<28}{len(durations):>7}{percentile(durations, 50):>9.2f}{percentile(durations, 95):>9.2f}"
+              f"{percentile(durations, 99):>9.2f}{sum(durations):>10.1f}{errors:>8}")
+        totals = defaultdict(int)
+        for record in records:
+            for key, value in record['attributes'].items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    totals[key] += value
+        if totals:
+            print('      ' + ', '.join(f"{key}: {value:,}" for key, value in sorted(totals.items())))
+
+    # For each top-level stage, how much of its time was spent on each step of its critical path
+    print("\nCritical path per stage (share of the stage's total time):")
+    roots = defaultdict(list)
+    for record in spans:
+        if record['parent'] is None:
+            roots[record['name']].append(record)
+    for name, records in roots.items():
+        total = sum(record['duration'] for record in records)
+        on_path = defaultdict(float)
+        for record in records:
+            for step in critical_path(record, children):
+                on_path[step['name']] += step['duration']
+        if not on_path or total == 0:
+            continue
+        steps = ', '.join(f"{step} {100 * duration / total:.0f}%"
+                          for step, duration in sorted(on_path.items(), key=lambda item: -item[1]))
+        slowest = max(records, key=lambda record: record['duration'])
+        print(f"  {name} ({len(records)} runs): {steps}")
+        print(f"      slowest: {slowest['duration']:.2f}s" + (f" for {slowest['paper']}" if slowest['paper'] else ''))
+
+def load(path, run=None):
+    """Reads the spans from a trace file, by default only those from the last run in it."""
+    with open(path, 'r', encoding='utf-8') as f:
+        spans = [json.loads(line) for line in f if line.strip()]
+    if spans and run is None:
+        run = spans[-1]['trace']
+    return [record for record in spans if run == 'all' or record['trace'] == run]
+
+if __name__ == "__main__":
+    print_summary(load(sys.argv[1] if len(sys.argv) > 1 else TRACE_FILE))
@@ -0,0 +1,254 @@
+"""
+Lease-based work queue in a SQLite file, for running a stage on several machines at once.
+
+The queue lives in a directory that every machine can reach (e.g. an NFS share):
+queue.sqlite holds the shards of work, and results/<kind>/ holds one CSV per finished
+shard. A stage is run in three steps:
+
+    plan   - one process adds the shards (e.g. search term and year, or a range of arXiv IDs)
+    work   - any number of processes, on any number of machines, claim shards one at a time,
+             process them and write their results
+    merge  - one process combines the results, keeping one row per arXiv ID
+
+A claimed shard is leased to its worker for LEASE_SECONDS, and the worker renews the
+lease while it works. If the worker dies, the lease runs out and another worker
+reclaims the shard. A shard can then be finished twice, which is why merging
+removes duplicates. Shards that fail MAX_ATTEMPTS times are marked failed.
+
+The queue uses SQLite's rollback journal rather than WAL, because WAL doesn't work on
+network filesystems. Lease times come from each machine's clock, so clocks should
+agree to well within LEASE_SECONDS. To see how far along a queue is:
+    python work_queue.py status work_queue
+"""
+
+import argparse
+import glob
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import closing
+
+LEASE_SECONDS = 300
+MAX_ATTEMPTS = 3
+POLL_SECONDS = 10  # How often an idle worker checks for expired leases while others are still working
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS shards (
+    kind TEXT NOT NULL,
+    shard_id TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    worker TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    updated_at REAL,
+    PRIMARY KEY (kind, shard_id)
+);
+"""
+
+def worker_name():
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+class WorkQueue:
+    def __init__(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.path = os.path.join(directory, 'queue.sqlite')
+        with closing(self.connect()) as conn:
+            conn.executescript(SCHEMA)
+
+    def connect(self):
+        # A connection per operation: they are rare, and this is safe from any thread
+        conn = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def results_dir(self, kind):
+        path = os.path.join(self.directory, 'results', kind)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def result_path(self, kind, shard_id):
+        safe = ''.join(c if c.isalnum() or c in '-_.' else '_' for c in shard_id)
+        return os.path.join(self.results_dir(kind), safe + '.csv')
+
+    def result_files(self, kind):
+        return sorted(glob.glob(os.path.join(self.results_dir(kind), '*.csv')))
+
+    def add(self, kind, shards):
+        """
+        Adds shards that aren't in the queue yet.
+
+        Parameters:
+            kind (str): Which stage the shards are for, e.g. 'harvest'.
+            shards (dict): shard ID -> payload (anything that can be saved as JSON).
+
+        Returns:
+            int: The number of shards added.
+        """
+        now = time.time()
+        with closing(self.connect()) as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            added = 0
+            for shard_id, payload in shards.items():
+                cursor = conn.execute(
+                    'INSERT OR IGNORE INTO shards (kind, shard_id, payload, updated_at) VALUES (?, ?, ?, ?)',
+                    (kind, shard_id, json.dumps(payload), now),
+                )
+                added += cursor.rowcount
+            conn.execute('COMMIT')
+        return added
+
+    def claim(self, kind, worker, lease_seconds=LEASE_SECONDS):
+        """Leases the next queued shard, or one whose lease has run out. Returns (shard ID, payload) or None."""
+        with closing(self.connect()) as conn:
+            conn.execute('BEGIN IMMEDIATE')  # Take the write lock first, so two workers can't claim the same shard
+            now = time.time()
+            while True:
+                row = conn.execute(
+                    "SELECT shard_id, payload, attempts FROM shards WHERE kind = ? "
+                    "AND (status = 'queued' OR (status = 'leased' AND lease_expires < ?)) "
+                    "ORDER BY shard_id LIMIT 1",
+                    (kind, now),
+                ).fetchone()
+                if row is None:
+                    conn.execute('COMMIT')
+                    return None
+                if row['attempts'] >= MAX_ATTEMPTS:
+                    # Its workers keep dying (or it keeps failing), so stop handing it out
+                    conn.execute(
+                        "UPDATE shards SET status = 'failed', worker = NULL, updated_at = ?, "
+                        "error = COALESCE(error, 'Lease expired too many times') WHERE kind = ? AND shard_id = ?",
+                        (now, kind, row['shard_id']),
+                    )
+                    continue
+                conn.execute(
+                    "UPDATE shards SET status = 'leased', worker = ?, lease_expires = ?, attempts = attempts + 1, "
+                    "updated_at = ? WHERE kind = ? AND shard_id = ?",
+                    (worker, now + lease_seconds, now, kind, row['shard_id']),
+                )
+                conn.execute('COMMIT')
+                return row['shard_id'], json.loads(row['payload'])
+
+    def renew(self, kind, shard_id, worker, lease_seconds=LEASE_SECONDS):
+        """Extends a lease. Returns False if the worker no longer holds it."""
+        with closing(self.connect()) as conn:
+            cursor = conn.execute(
+                "UPDATE shards SET lease_expires = ?, updated_at = ? "
+                "WHERE kind = ? AND shard_id = ? AND worker = ? AND status = 'leased'",
+                (time.time() + lease_seconds, time.time(), kind, shard_id, worker),
+            )
+            return cursor.rowcount == 1
+
+    def complete(self, kind, shard_id, worker):
+        """Marks a shard done. Returns False if the lease had been lost (the results are kept anyway)."""
+        with closing(self.connect()) as conn:
+            cursor = conn.execute(
+                "UPDATE shards SET status = 'done', lease_expires = NULL, error = NULL, updated_at = ? "
+                "WHERE kind = ? AND shard_id = ? AND worker = ? AND status = 'leased'",
+                (time.time(), kind, shard_id, worker),
+            )
+            return cursor.rowcount == 1
+
+    def release(self, kind, shard_id, worker, error):
+        """Gives a shard back after an error, or marks it failed after MAX_ATTEMPTS."""
+        with closing(self.connect()) as conn:
+            conn.execute(
+                "UPDATE shards SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'queued' END, "
+                "worker = NULL, lease_expires = NULL, error = ?, updated_at = ? "
+                "WHERE kind = ? AND shard_id = ? AND worker = ? AND status = 'leased'",
+                (MAX_ATTEMPTS, error, time.time(), kind, shard_id, worker),
+            )
+
+    def counts(self, kind=None):
+        """Returns (kind, status) -> number of shards."""
+        with closing(self.connect()) as conn:
+            rows = conn.execute(
+                'SELECT kind, status, COUNT(*) AS n FROM shards' + (' WHERE kind = ?' if kind else '') +
+                ' GROUP BY kind, status', (kind,) if kind else (),
+            ).fetchall()
+        return {(row['kind'], row['status']): row['n'] for row in rows}
+
+    def unfinished(self, kind):
+        counts = self.counts(kind)
+        return counts.get((kind, 'queued'), 0) + counts.get((kind, 'leased'), 0)
+
+    def run(self, kind, function, worker=None, lease_seconds=LEASE_SECONDS):
+        """
+        Works through the shards of one kind until none are left unfinished.
+
+        Parameters:
+            kind (str): Which shards to work on.
+            function (function): Called with (shard ID, payload, result path). Should write its results
+                to the result path.
+            worker (str): Name of this worker. Defaults to host, process ID and a random suffix.
+            lease_seconds (float): Lease length. The lease is renewed every third of this while working.
+
+        Returns:
+            int: The number of shards this worker finished.
+        """
+        worker = worker or worker_name()
+        finished = 0
+        while True:
+            claimed = self.claim(kind, worker, lease_seconds)
+            if claimed is None:
+                if self.unfinished(kind) == 0:
+                    return finished
+                time.sleep(POLL_SECONDS)  # Others are still working; take over if one of them dies
+                continue
+            shard_id, payload = claimed
+            print(f"[{worker}] Working on {kind} shard {shard_id}")
+
+            stop = threading.Event()
+            def heartbeat():
+                while not stop.wait(lease_seconds / 3):
+                    if not self.renew(kind, shard_id, worker, lease_seconds):
+                        print(f"[{worker}] Lost the lease on {shard_id}")
+                        return
+            renewer = threading.Thread(target=heartbeat, daemon=True)
+            renewer.start()
+            try:
+                function(shard_id, payload, self.result_path(kind, shard_id))
+            except Exception as e:
+                print(f"[{worker}] Shard {shard_id} failed: {e}")
+                self.release(kind, shard_id, worker, repr(e))
+            else:
+                self.complete(kind, shard_id, worker)
+                finished += 1
+            finally:
+                stop.set()
+                renewer.join()
+
+def main():
+    parser = argparse.ArgumentParser(description="Show or reset the shards in a work queue.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    status_parser = subparsers.add_parser('status', help="Count the shards of each kind by status")
+    status_parser.add_argument('directory')
+    requeue_parser = subparsers.add_parser('requeue', help="Put failed shards back in the queue")
+    requeue_parser.add_argument('directory')
+    requeue_parser.add_argument('kind')
+    args = parser.parse_args()
+
+    queue = WorkQueue(args.directory)
+    if args.command == 'status':
+        for (kind, status), n in sorted(queue.counts().items()):
+            print(f"{kind:<15}{status:<10}{n:>7}")
+        with closing(queue.connect()) as conn:
+            for row in conn.execute("SELECT kind, shard_id, worker, lease_expires FROM shards WHERE status = 'leased'"):
+                print(f"  {row['kind']} {row['shard_id']}: {row['worker']}, "
+                      f"lease ends in {row['lease_expires'] - time.time():.0f}s")
+    else:
+        with closing(queue.connect()) as conn:
+            cursor = conn.execute(
+                "UPDATE shards SET status = 'queued', attempts = 0, error = NULL WHERE kind = ? AND status = 'failed'",
+                (args.kind,),
+            )
+        print(f"Requeued {cursor.rowcount} shards.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+"""
+Runs the whole data collection pipeline, redoing only the stages whose inputs have changed.
+
+The stages are the existing scripts, run in their own folders:
+
+    from_arxiv.py -> Find affiliation thread.py -> group_by_company.py --\
+                                                                        +--> categorizing_papers.py
+    collecting_abstracts.py --------------------------------------------/
+
+Stages that don't depend on each other (the arXiv branch and the company website
+branch) run at the same time. After each stage finishes, the content hashes of its
+inputs (including the script itself) and outputs are saved in pipeline_state.json.
+On the next run a stage is skipped if none of those have changed since, so a
+stage only runs after the one before it if that stage actually changed its output.
+The harvesting stages have no input files apart from their script, so use --force
+to fetch new papers.
+
+Note that categorizing_papers.py reads all_papers_with_abstracts.csv, which we put
+together by hand from the outputs of the two branches after reviewing them. It is
+tracked like any other input, so categorization reruns once that file is updated.
+
+Usage:
+    python run_pipeline.py                       # run everything that is out of date
+    python run_pipeline.py --dry-run             # only show what would run
+    python run_pipeline.py --force harvest_arxiv # rerun a stage even if it is up to date
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+STATE_FILE = os.path.join(ROOT, 'pipeline_state.json')
+
+# Paths in inputs and outputs are relative to the stage's folder, which is also where its script is run.
+STAGES = {
+    'harvest_arxiv': {
+        'dir': 'Papers from arXiv/1 From arXiv',
+        'script': 'from_arxiv.py',
+        'args': ['--output', 'data_arxiv.csv'],
+        'inputs': [],
+        'outputs': ['data_arxiv.csv'],
+        'deps': [],
+    },
+    'find_affiliation': {
+        'dir': 'Papers from arXiv/2 Find affiliation on arXiv',
+        'script': 'Find affiliation thread.py',
+        'args': ['--input', '../1 From arXiv/data_arxiv.csv', '--output', 'data_arxiv.csv'],
+        'inputs': ['../1 From arXiv/data_arxiv.csv'],
+        'outputs': ['data_arxiv.csv'],
+        'deps': ['harvest_arxiv'],
+    },
+    'group_by_company': {
+        'dir': 'Papers from arXiv/3 Group by company',
+        'script': 'group_by_company.py',
+        'args': ['--input', '../2 Find affiliation on arXiv/data_arxiv.csv'],
+        'inputs': ['../2 Find affiliation on arXiv/data_arxiv.csv'],
+        'outputs': ['Anthropic.csv', 'OpenAI.csv', 'GDM.csv'],
+        'deps': ['find_affiliation'],
+    },
+    'collect_abstracts': {
+        'dir': 'Papers from company websites',
+        'script': 'collecting_abstracts.py',
+        'args': [],
+        'inputs': ['ODA_papers.csv', 'Manually adding abstracts.csv'],
+        'outputs': ['ODA_papers_processed.csv', 'ODA_papers_with_abstracts.csv'],
+        'deps': [],
+    },
+    'categorize': {
+        'dir': 'Automated categorization',
+        'script': 'categorizing_papers.py',
+        'args': ['--input', 'all_papers_with_abstracts.csv', '--output', 'final_output.csv'],
+        'inputs': ['all_papers_with_abstracts.csv', 'prompt.txt'],
+        'outputs': ['final_output.csv'],
+        'deps': ['group_by_company', 'collect_abstracts'],
+    },
+}
+
+def file_hash(path):
+    """Returns the SHA-256 of a file, or None if it doesn't exist."""
+    if not os.path.exists(path):
+        return None
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def stage_hashes(stage, kind):
+    """Hashes of a stage's inputs (plus its script) or outputs, keyed by path relative to the repository."""
+    paths = stage[kind] + ([stage['script']] if kind == 'inputs' else [])
+    hashes = {}
+    for path in paths:
+        full_path = os.path.normpath(os.path.join(ROOT, stage['dir'], path))
+        hashes[os.path.relpath(full_path, ROOT)] = file_hash(full_path)
+    return hashes
+
+def load_state():
+    try:
+        with open(STATE_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+def save_state(state):
+    with open(STATE_FILE + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=2)
+    os.replace(STATE_FILE + '.tmp', STATE_FILE)
+
+def stale_reason(name, state, forced):
+    """Returns why a stage has to run, or None if its last run is still up to date."""
+    stage = STAGES[name]
+    if name in forced:
+        return "forced"
+    previous = state.get(name)
+    if previous is None:
+        return "never run"
+    for path, digest in stage_hashes(stage, 'inputs').items():
+        if previous['inputs'].get(path) != digest:
+            return f"{path} changed"
+    for path, digest in stage_hashes(stage, 'outputs').items():
+        if digest is None:
+            return f"{path} missing"
+        if previous['outputs'].get(path) != digest:
+            return f"{path} was modified after the last run"
+    return None
+
+def run_stage(name):
+    stage = STAGES[name]
+    print(f"[{name}] Running {stage['script']}")
+    result = subprocess.run(
+        [sys.executable, stage['script']] + stage['args'],
+        cwd=os.path.join(ROOT, stage['dir']),
+    )
+    return result.returncode == 0
+
+def run_pipeline(forced=(), dry_run=False, max_parallel=2):
+    state = load_state()
+    state_lock = threading.Lock()
+    forced = set(forced)
+    ran = set()       # Stages that ran (or would run, in a dry run) successfully
+    failed = set()
+    done = set()
+    pending = set(STAGES)
+
+    def process(name):
+        reason = stale_reason(name, state, forced)
+        # In a dry run nothing before this stage has actually changed its outputs yet
+        upstream_ran = [dep for dep in STAGES[name]['deps'] if dep in ran]
+        if reason is None and dry_run and upstream_ran:
+            reason = f"{upstream_ran[0]} would run first"
+        if reason is None:
+            print(f"[{name}] Up to date, skipping")
+            return name, False
+        print(f"[{name}] Out of date: {reason}")
+        if dry_run:
+            return name, True
+        if not run_stage(name):
+            raise RuntimeError(f"{STAGES[name]['script']} failed")
+        with state_lock:
+            state[name] = {
+                'inputs': stage_hashes(STAGES[name], 'inputs'),
+                'outputs': stage_hashes(STAGES[name], 'outputs'),
+            }
+            save_state(state)
+        return name, True
+
+    with ThreadPoolExecutor(max_workers=max_parallel) as executor:
+        running = {}
+        while pending or running:
+            # Start every stage whose dependencies have all finished
+            for name in sorted(pending):
+                deps = STAGES[name]['deps']
+                if any(dep in failed for dep in deps):
+                    print(f"[{name}] Not run because a stage before it failed")
+                    failed.add(name)
+                    pending.discard(name)
+                elif all(dep in done for dep in deps):
+                    running[executor.submit(process, name)] = name
+                    pending.discard(name)
+            if not running:
+                continue
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                try:
+                    _, did_run = future.result()
+                    done.add(name)
+                    if did_run:
+                        ran.add(name)
+                except Exception as e:
+                    print(f"[{name}] {e}")
+                    failed.add(name)
+
+    print(f"\nRan: {', '.join(sorted(ran)) or 'nothing'}")
+    if failed:
+        print(f"Failed or not run: {', '.join(sorted(failed))}")
+    return not failed
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the pipeline, skipping stages that are up to date.")
+    parser.add_argument('--force', nargs='+', default=[], choices=list(STAGES), metavar='STAGE',
+                        help=f"Stages to rerun even if they are up to date: {', '.join(STAGES)}")
+    parser.add_argument('--dry-run', action='store_true', help="Only show which stages would run")
+    parser.add_argument('--max-parallel', type=int, default=2, help="Stages to run at the same time")
+    args = parser.parse_args()
+    success = run_pipeline(args.force, args.dry_run, args.max_parallel)
+    sys.exit(0 if success else 1)
+
+if __name__ == "__main__":
+    main()